@@ -0,0 +1,123 @@
+"""
+Import time gate for the package: `import simple_ledger` has to stay fast and side effect free.
+
+Every round runs `python -X importtime -c "import <module>"` in a fresh interpreter (with a
+throwaway HOME, so that nothing the import might create on disk is left behind) and reads the
+cumulative import time of the module from its report. The median over the rounds is compared with
+the budget; the check also fails if the import pulls in any of the heavy modules that must only be
+loaded on first use, or creates anything under HOME.
+
+The budget only covers the module's own line of the report. Summing the whole report also counts
+the interpreter's startup imports (`site` and whatever the installed `.pth` files import), which
+`python -X importtime -c pass` pays as well; both totals are printed next to the module's time so
+that the numbers can be compared with a report read by hand.
+
+Usage:
+    python benchmarks/bench_import.py [--module simple_ledger] [--budget-ms 50] [--rounds 7]
+
+Exits with status 1 when the import is over budget or has side effects, so it can gate CI.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+# modules `import simple_ledger` must not load
+LAZY_MODULES: tuple[str, ...] = ("sqlmodel", "sqlalchemy", "rich", "flet", "numpy")
+
+
+def import_times_ms(code: str, home: str) -> dict[str, float]:
+    """
+    Runs `code` under `-X importtime` in a fresh interpreter and returns the cumulative import time
+    of each top level import of its report, in milliseconds.
+    """
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        env={**os.environ, "HOME": home},
+        check=True,
+    )
+    times: dict[str, float] = {}
+    for line in completed.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package (indented by depth)
+        fields = line.split("|")
+        if (len(fields) == 3) and fields[1].strip().isdigit():
+            name = fields[2][1:]
+            if not name.startswith(" "):
+                times[name] = int(fields[1]) / 1000
+    return times
+
+
+def import_time_ms(module: str, home: str) -> tuple[float, float]:
+    """
+    Returns the cumulative import time of `module` in a fresh interpreter and the total of the whole
+    `-X importtime` report, in milliseconds.
+    """
+    times: dict[str, float] = import_times_ms(f"import {module}", home)
+    if module not in times:
+        raise RuntimeError(f"{module} is missing from the -X importtime report")
+    return times[module], sum(times.values())
+
+
+def loaded_lazy_modules(module: str, home: str) -> list[str]:
+    """Returns the modules of `LAZY_MODULES` that importing `module` loads."""
+    completed = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            f"import sys, {module}; "
+            f"print(' '.join(name for name in {LAZY_MODULES!r} if name in sys.modules))",
+        ],
+        capture_output=True,
+        text=True,
+        env={**os.environ, "HOME": home},
+        check=True,
+    )
+    return completed.stdout.split()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--module", default="simple_ledger")
+    parser.add_argument("--budget-ms", type=float, default=50.0)
+    parser.add_argument("--rounds", type=int, default=7)
+    arguments = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as home:
+        rounds: list[tuple[float, float]] = [
+            import_time_ms(arguments.module, home) for _ in range(arguments.rounds)
+        ]
+        startup: list[float] = [
+            sum(import_times_ms("pass", home).values()) for _ in range(arguments.rounds)
+        ]
+        lazy: list[str] = loaded_lazy_modules(arguments.module, home)
+        created: list[str] = [str(path) for path in Path(home).rglob("*")]
+
+    times: list[float] = [module_time for module_time, _ in rounds]
+    median: float = statistics.median(times)
+    print(
+        f"import {arguments.module}: median {median:.1f} ms, min {min(times):.1f} ms, "
+        f"max {max(times):.1f} ms over {arguments.rounds} rounds (budget {arguments.budget_ms:.0f} ms)"
+    )
+    print(
+        f"whole -X importtime report: median {statistics.median(total for _, total in rounds):.1f} ms, "
+        f"of which interpreter startup (-c pass): median {statistics.median(startup):.1f} ms"
+    )
+    failures: list[str] = []
+    if median > arguments.budget_ms:
+        failures.append(f"over budget by {median - arguments.budget_ms:.1f} ms")
+    if len(lazy) > 0:
+        failures.append(f"eagerly imports {', '.join(lazy)}")
+    if len(created) > 0:
+        failures.append(f"creates {', '.join(created)}")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if len(failures) > 0 else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,148 @@
+"""
+Measures what logging costs the `DB` hot paths: point reads through `read_records` and single entry
+commits through `insert_records`, per log level.
+
+The same workload runs with the package loggers at DEBUG, with DEBUG off (INFO, and SQLAlchemy's
+loggers at WARNING as `setup_logging` sets them), and with logging disabled altogether, which is the
+baseline the overhead is measured against. The console handlers write to os.devnull and the log
+files go to a temporary directory, so the numbers are the cost of producing the records rather than
+of a terminal.
+
+Usage:
+    python benchmarks/bench_logging.py [--rows 5000] [--reads 2000] [--inserts 300] [--rounds 3]
+"""
+import argparse
+import datetime
+import logging
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Optional
+
+from simple_ledger._config import app_config
+
+MODES: tuple[str, ...] = ("DEBUG", "INFO", "disabled")
+
+
+def set_mode(loggers: list[Any], mode: str) -> None:
+    """Sets the levels of the package loggers (or disables logging) for a benchmark mode."""
+    logging.disable(logging.CRITICAL if mode == "disabled" else logging.NOTSET)
+    for logger in loggers:
+        if mode == "DEBUG":
+            logger.logger.setLevel(logging.DEBUG)
+        elif logger.logger_name.startswith("sqlalchemy"):
+            logger.logger.setLevel(logging.WARNING)
+        else:
+            logger.logger.setLevel(logging.INFO)
+
+
+def run_workload(database: Any, model_class: Any, reads: int, inserts: int, rows: int):
+    """Returns the microseconds per point read and per single entry commit."""
+    start = time.perf_counter()
+    for position in range(reads):
+        database.read_records(
+            model_class=model_class,
+            where_and_to={"id": position % rows + 1},
+            fetch_mode="one",
+        )
+    read_us: float = (time.perf_counter() - start) / reads * 1e6
+
+    start = time.perf_counter()
+    for _ in range(inserts):
+        database.insert_records(
+            model_object=model_class(
+                transaction_noted_on=datetime.date(2023, 1, 1),
+                from_person="bench",
+                to_person="bench",
+                description="benchmark entry",
+                amount=1.0,
+                tag="DEBIT",
+            )
+        )
+    insert_us: float = (time.perf_counter() - start) / inserts * 1e6
+    return read_us, insert_us
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--reads", type=int, default=2000)
+    parser.add_argument("--inserts", type=int, default=300)
+    parser.add_argument("--rounds", type=int, default=3)
+    arguments = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        # the loggers are created when `simple_ledger._db` is imported, so the log directory has to
+        # point to the temporary directory first
+        app_config().update_config({"APP_LOG_DIR": Path(directory) / "logs"})
+        from simple_ledger import setup_logging
+        from simple_ledger._db import DB, logger
+        from simple_ledger.db import Ledger
+
+        loggers: list[Any] = [*setup_logging().values(), logger]
+        # left open: the log listener may still write to it at exit
+        devnull = open(os.devnull, "w")
+        for package_logger in loggers:
+            package_logger.console_handler.setStream(devnull)
+
+        set_mode(loggers, "disabled")
+        database = DB(
+            db_api="sqlite",
+            db_name="bench.db",
+            db_dir=directory,
+            echo=False,
+            hide_parameters=True,
+            profile="balanced",
+        )
+        database.bulk_insert_records(
+            model_class=Ledger,
+            rows=[
+                {
+                    "transaction_noted_on": datetime.date(2023, 1, 1),
+                    "from_person": "bench",
+                    "to_person": "bench",
+                    "description": "benchmark entry",
+                    "amount": 1.0,
+                    "tag": "DEBIT",
+                }
+            ]
+            * arguments.rows,
+        )
+        run_workload(
+            database, Ledger, arguments.reads, arguments.inserts, arguments.rows
+        )
+
+        # the best of the rounds, the modes taking turns so that drift affects them alike
+        best: dict[str, Optional[tuple[float, float]]] = {mode: None for mode in MODES}
+        for _ in range(arguments.rounds):
+            for mode in MODES:
+                set_mode(loggers, mode)
+                timings = run_workload(
+                    database, Ledger, arguments.reads, arguments.inserts, arguments.rows
+                )
+                best[mode] = (
+                    timings
+                    if best[mode] == None
+                    else (
+                        min(best[mode][0], timings[0]),
+                        min(best[mode][1], timings[1]),
+                    )
+                )
+        set_mode(loggers, "disabled")
+        database.dispose()
+
+    baseline_read, baseline_insert = best["disabled"]
+    print(
+        f"{'mode':<10}{'read us':>10}{'overhead':>10}{'insert us':>12}{'overhead':>10}"
+    )
+    for mode in MODES:
+        read_us, insert_us = best[mode]
+        print(
+            f"{mode:<10}{read_us:>10.1f}{read_us - baseline_read:>+10.1f}"
+            f"{insert_us:>12.1f}{insert_us - baseline_insert:>+10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Compares the SQLite performance profiles of `AppConfig.APP_DB_PROFILES` (and the plain SQLAlchemy /
+SQLite defaults) on insert and read throughput.
+
+Every profile gets a fresh database in a temporary directory, which is filled and queried with the
+same workload:
+    - single entry commits through `insert_records` (what adding an entry from the UI does)
+    - a bulk insert through `bulk_insert_records`
+    - point lookups by id through `read_records`
+    - a full `GROUP BY` over the table through `aggregate_records`
+
+Usage:
+    python benchmarks/bench_profiles.py [--rows 200000] [--commits 500] [--lookups 5000]
+"""
+import argparse
+import datetime
+import logging
+import random
+import tempfile
+import time
+from typing import Any, Optional
+
+from simple_ledger._config import AppConfig as config
+from simple_ledger._db import DB
+from simple_ledger.db import Ledger
+
+
+def make_rows(count: int, seed: int = 0) -> list[dict[str, Any]]:
+    """Returns `count` random ledger entries as dictionaries."""
+    generator = random.Random(seed)
+    first_day = datetime.date(2020, 1, 1)
+    return [
+        {
+            "transaction_noted_on": first_day
+            + datetime.timedelta(days=generator.randrange(1500)),
+            "from_person": f"person-{generator.randrange(200)}",
+            "to_person": f"person-{generator.randrange(200)}",
+            "description": "benchmark entry",
+            "amount": round(generator.uniform(1, 1000), 2),
+            "tag": generator.choice(["CREDIT", "DEBIT"]),
+        }
+        for _ in range(count)
+    ]
+
+
+def run_profile(
+    profile: Optional[str], rows: list[dict[str, Any]], commits: int, lookups: int
+) -> dict[str, float]:
+    """Runs the workload against a fresh database with the given profile, returns rates per second."""
+    with tempfile.TemporaryDirectory() as directory:
+        database = DB(
+            db_api="sqlite",
+            db_name="bench.db",
+            db_dir=directory,
+            echo=False,
+            hide_parameters=True,
+            profile=profile,
+        )
+        results: dict[str, float] = {}
+
+        start = time.perf_counter()
+        for row in rows[:commits]:
+            database.insert_records(model_object=Ledger(**row))
+        results["commits/s"] = commits / (time.perf_counter() - start)
+
+        start = time.perf_counter()
+        database.bulk_insert_records(model_class=Ledger, rows=rows[commits:])
+        results["bulk rows/s"] = (len(rows) - commits) / (time.perf_counter() - start)
+
+        generator = random.Random(1)
+        start = time.perf_counter()
+        for _ in range(lookups):
+            database.read_records(
+                model_class=Ledger,
+                where_and_to={"id": generator.randrange(1, len(rows) + 1)},
+                fetch_mode="one",
+            )
+        results["lookups/s"] = lookups / (time.perf_counter() - start)
+
+        start = time.perf_counter()
+        for _ in range(3):
+            database.aggregate_records(
+                model_class=Ledger, group_by=["from_person", "tag"], sum_of="amount"
+            )
+        results["group-bys/s"] = 3 / (time.perf_counter() - start)
+
+        database.engine.dispose()
+        return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--commits", type=int, default=500)
+    parser.add_argument("--lookups", type=int, default=5000)
+    arguments = parser.parse_args()
+    logging.disable(logging.CRITICAL)
+
+    rows = make_rows(arguments.rows)
+    profiles: list[Optional[str]] = [None, *config.APP_DB_PROFILES]
+    table: dict[str, dict[str, float]] = {
+        str(profile or "defaults"): run_profile(
+            profile, rows, arguments.commits, arguments.lookups
+        )
+        for profile in profiles
+    }
+
+    metrics: list[str] = list(next(iter(table.values())))
+    print(f"{'profile':<12}" + "".join(f"{metric:>16}" for metric in metrics))
+    for profile, results in table.items():
+        print(
+            f"{profile:<12}"
+            + "".join(f"{results[metric]:>16,.0f}" for metric in metrics)
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,413 @@
+"""
+Benchmarks the hot paths of the ledger at scale and compares the results with a saved baseline.
+
+For every table size (10k, 100k, 1M and 10M entries by default) a fresh SQLite database is created in
+a temporary directory, by a fresh interpreter (started from the repository root, which is put on its
+PYTHONPATH) so that the peak RSS and the caches of one size do not leak into the next, and filled with
+`LedgerDB.bulk_add_ledger_infos`. The workload then runs against
+it, through the same `LedgerDB` (so the rollup table is maintained as in the app):
+    - insert: single entry commits through `insert_records`
+    - read_one: point lookups by id through `read_records`
+    - read_day: the entries of a day (at most 100) through `read_records`
+    - update: single entry updates by id through `update_records`
+    - summary: `LedgerDB.summary` over the whole ledger, and by month (summary_month)
+    - delete: single entry deletes by id through `delete_records`
+
+The phases run `--rounds` times against the loaded database, and every measure of a phase is the
+median over the rounds: its throughput and its latency percentiles (p50 / p95 / p99 / max, in ms).
+The peak RSS is only known for the whole process (`ru_maxrss` never goes down), so a single peak is
+reported per size. The results are written to a JSON file, which can be passed back as the
+`--baseline` of a later run: the phases whose throughput dropped, or whose p95 latency grew, by more
+than the tolerance, and by more than the noise floor in absolute time, are reported as regressions,
+as is a peak RSS grown by more than the tolerance. The baseline gate needs at least 3 rounds.
+
+Usage:
+    python benchmarks/bench_suite.py [--sizes 10k,100k,1M,10M] [--ops 1000] [--rounds 5]
+        [--output bench_suite.json] [--baseline previous.json] [--tolerance 0.1]
+        [--noise-floor-ms 1.0]
+
+Exits with status 1 when a phase regressed against the baseline, so it can gate CI.
+
+The 1M and 10M sizes take a while (minutes to hours): `--sizes 10k,100k` is the quick check.
+"""
+import argparse
+import datetime
+import json
+import logging
+import platform
+import random
+import os
+import resource
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+REPO_ROOT: Path = Path(__file__).resolve().parent.parent
+SIZE_SUFFIXES: dict[str, int] = {"k": 1000, "M": 1000 * 1000}
+# filled in chunks, so that the ids and rows of a chunk are all that is held in memory
+LOAD_CHUNK: int = 100000
+FIRST_DAY: datetime.date = datetime.date(2020, 1, 1)
+DAYS: int = 1500
+# the counterparties of the entries: a ledger has a few of them, which is what keeps the rollup table
+# (one row per day, counterparties and tag) smaller than the ledger
+PEOPLE: int = 20
+# the values of a phase compared with the baseline, and whether higher is better
+COMPARED: dict[str, bool] = {
+    "ops_per_second": True,
+    "p95_ms": False,
+}
+# the fewest rounds whose medians are compared with a baseline
+MIN_BASELINE_ROUNDS: int = 3
+
+
+def parse_size(size: str) -> int:
+    """Returns the number of entries of a size like "10k" or "1M"."""
+    if size[-1] in SIZE_SUFFIXES:
+        return int(float(size[:-1]) * SIZE_SUFFIXES[size[-1]])
+    return int(size)
+
+
+def make_rows(count: int, generator: random.Random) -> list[dict[str, Any]]:
+    """Returns `count` random ledger entries as dictionaries."""
+    return [
+        {
+            "transaction_noted_on": FIRST_DAY
+            + datetime.timedelta(days=generator.randrange(DAYS)),
+            "from_person": f"person-{generator.randrange(PEOPLE)}",
+            "to_person": f"person-{generator.randrange(PEOPLE)}",
+            "description": "benchmark entry",
+            "amount": round(generator.uniform(1, 1000), 2),
+            "tag": generator.choice(["CREDIT", "DEBIT"]),
+        }
+        for _ in range(count)
+    ]
+
+
+def peak_rss_mb() -> float:
+    """The peak resident set size of the process so far, in MiB."""
+    peak: int = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def run_phase(operation: Callable[[int], Any], ops: int) -> dict[str, float]:
+    """Runs `operation(0)` ... `operation(ops - 1)`, timing every call."""
+    latencies: list[float] = []
+    started: float = time.perf_counter()
+    for position in range(ops):
+        start: float = time.perf_counter()
+        operation(position)
+        latencies.append(time.perf_counter() - start)
+    seconds: float = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "ops": ops,
+        "seconds": seconds,
+        "ops_per_second": ops / seconds,
+        **{
+            f"p{percent}_ms": latencies[min(ops * percent // 100, ops - 1)] * 1000
+            for percent in (50, 95, 99)
+        },
+        "max_ms": latencies[-1] * 1000,
+    }
+
+
+def run_phases(
+    database: Any, model_class: Any, ids: list[int], ops: int, generator: random.Random
+) -> dict[str, dict[str, float]]:
+    """Runs one round of the phases; the entries of `ids` are read, updated and then deleted."""
+    new_rows: list[dict[str, Any]] = make_rows(ops, generator)
+    days: list[datetime.date] = [
+        FIRST_DAY + datetime.timedelta(days=generator.randrange(DAYS))
+        for _ in range(ops)
+    ]
+    return {
+        "insert": run_phase(
+            lambda position: database.insert_records(
+                model_object=model_class(**new_rows[position])
+            ),
+            ops,
+        ),
+        "read_one": run_phase(
+            lambda position: database.read_records(
+                model_class=model_class,
+                where_and_to={"id": ids[position % len(ids)]},
+                fetch_mode="one",
+            ),
+            ops,
+        ),
+        "read_day": run_phase(
+            lambda position: database.read_records(
+                model_class=model_class,
+                where_and_to={"transaction_noted_on": days[position]},
+                fetch_mode="many",
+                how_many=100,
+            ),
+            ops,
+        ),
+        "update": run_phase(
+            lambda position: database.update_records(
+                model_class=model_class,
+                where_and_to={"id": ids[position % len(ids)]},
+                with_what={"description": f"updated {position}"},
+            ),
+            ops,
+        ),
+        "summary": run_phase(lambda position: database.summary(), max(ops // 50, 1)),
+        "summary_month": run_phase(
+            lambda position: database.summary(bucket="month"), max(ops // 50, 1)
+        ),
+        "delete": run_phase(
+            lambda position: database.delete_records(
+                model_class=model_class, where_and_to={"id": ids[position]}
+            ),
+            len(ids),
+        ),
+    }
+
+
+def median_of(rounds: list[dict[str, float]]) -> dict[str, float]:
+    """The median of each measure of a phase over the rounds."""
+    return {
+        key: statistics.median(results[key] for results in rounds) for key in rounds[0]
+    }
+
+
+def run_size(rows: int, ops: int, rounds: int, seed: int) -> dict[str, Any]:
+    """Fills a fresh database with `rows` entries and runs the phases against it (in this process)."""
+    with tempfile.TemporaryDirectory() as directory:
+        # logs, the database and the metrics snapshot all stay in the temporary directory
+        from simple_ledger._config import AppConfig as config, app_config
+
+        app_config().update_config({"APP_LOG_DIR": Path(directory) / "logs"})
+        config.APP_DB_METRICS["snapshot_file"] = None
+        app_config().APP_DB_CONFIG.update(
+            {"db_dir": Path(directory) / "db", "echo": False, "hide_parameters": True}
+        )
+        logging.disable(logging.CRITICAL)
+        from simple_ledger.db import Ledger, LedgerDB
+
+        database = LedgerDB()
+        generator = random.Random(seed)
+        phases: dict[str, dict[str, float]] = {}
+
+        started: float = time.perf_counter()
+        for loaded in range(0, rows, LOAD_CHUNK):
+            database.bulk_add_ledger_infos(
+                rows=make_rows(min(LOAD_CHUNK, rows - loaded), generator)
+            )
+        seconds: float = time.perf_counter() - started
+        phases["load"] = {
+            "ops": rows,
+            "seconds": seconds,
+            "ops_per_second": rows / seconds,
+        }
+
+        # every round reads, updates and deletes entries of its own
+        per_round: int = max(min(ops, rows // rounds), 1)
+        ids: list[int] = generator.sample(
+            range(1, rows + 1), min(per_round * rounds, rows)
+        )
+        rounds_of: dict[str, list[dict[str, float]]] = {}
+        for round_ in range(rounds):
+            results = run_phases(
+                database,
+                Ledger,
+                ids[round_ * per_round : (round_ + 1) * per_round],
+                ops,
+                generator,
+            )
+            for phase, values in results.items():
+                rounds_of.setdefault(phase, []).append(values)
+        for phase, values in rounds_of.items():
+            phases[phase] = median_of(values)
+        database.dispose()
+        return {"rows": rows, "phases": phases, "peak_rss_mb": peak_rss_mb()}
+
+
+def absolute_ms(
+    value: str, values: dict[str, float], before: dict[str, float]
+) -> float:
+    """
+    The absolute change of a compared value in ms: of the latency itself, or of the mean time of an
+    operation for a throughput.
+    """
+    if value == "ops_per_second":
+        return abs(1 / values[value] - 1 / before[value]) * 1000
+    return abs(values[value] - before[value])
+
+
+def compare(
+    results: dict[str, Any],
+    baseline: dict[str, Any],
+    tolerance: float,
+    noise_floor_ms: float,
+) -> list[str]:
+    """
+    Prints the changes against the baseline and returns the regressions: the changes beyond the
+    tolerance, except for the phase values that moved by less than `noise_floor_ms` in absolute time.
+    """
+    regressions: list[str] = []
+    print(
+        f"\n{'size':<8}{'phase':<16}{'value':<16}{'baseline':>12}{'now':>12}{'change':>9}"
+    )
+    for size, result in results["sizes"].items():
+        if size not in baseline["sizes"]:
+            continue
+        before_rss: float = baseline["sizes"][size].get("peak_rss_mb", 0)
+        if before_rss != 0:
+            change: float = result["peak_rss_mb"] / before_rss - 1
+            print(
+                f"{size:<8}{'(run)':<16}{'peak_rss_mb':<16}{before_rss:>12.2f}"
+                f"{result['peak_rss_mb']:>12.2f}{change:>+9.1%}"
+                + ("  REGRESSION" if change > tolerance else "")
+            )
+            if change > tolerance:
+                regressions.append(f"{size} peak_rss_mb {change:+.1%}")
+        for phase, values in result["phases"].items():
+            before: Optional[dict[str, float]] = baseline["sizes"][size]["phases"].get(
+                phase
+            )
+            if before == None:
+                continue
+            for value, higher_is_better in COMPARED.items():
+                if (
+                    (value not in values)
+                    or (value not in before)
+                    or (before[value] == 0)
+                ):
+                    continue
+                change: float = values[value] / before[value] - 1
+                regressed: bool = (
+                    change < -tolerance if higher_is_better else change > tolerance
+                ) and (absolute_ms(value, values, before) >= noise_floor_ms)
+                print(
+                    f"{size:<8}{phase:<16}{value:<16}{before[value]:>12.2f}"
+                    f"{values[value]:>12.2f}{change:>+9.1%}"
+                    + ("  REGRESSION" if regressed else "")
+                )
+                if regressed:
+                    regressions.append(f"{size} {phase} {value} {change:+.1%}")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", default="10k,100k,1M,10M")
+    parser.add_argument("--ops", type=int, default=1000, help="Calls per phase")
+    parser.add_argument(
+        "--rounds",
+        type=int,
+        default=5,
+        help="Rounds of the phases, the medians are kept",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, default=Path("bench_suite.json"))
+    parser.add_argument("--baseline", type=Path, default=None)
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.1,
+        help="The relative change reported as a regression",
+    )
+    parser.add_argument(
+        "--noise-floor-ms",
+        type=float,
+        default=1.0,
+        help="Changes smaller than this (in ms) are never a regression",
+    )
+    # runs one size in this process and prints its results as JSON, see `run_size`
+    parser.add_argument("--worker", type=int, default=None, help=argparse.SUPPRESS)
+    arguments = parser.parse_args()
+    if (arguments.baseline != None) and (arguments.rounds < MIN_BASELINE_ROUNDS):
+        parser.error(
+            f"--baseline compares medians, which needs --rounds {MIN_BASELINE_ROUNDS} or more"
+        )
+
+    if arguments.worker != None:
+        print(
+            json.dumps(
+                run_size(
+                    arguments.worker, arguments.ops, arguments.rounds, arguments.seed
+                )
+            )
+        )
+        return
+
+    results: dict[str, Any] = {
+        "created_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "ops": arguments.ops,
+        "rounds": arguments.rounds,
+        "seed": arguments.seed,
+        "sizes": {},
+    }
+    # the worker imports `simple_ledger` from this checkout, whatever directory the suite is run from
+    environment: dict[str, str] = dict(os.environ)
+    environment["PYTHONPATH"] = os.pathsep.join(
+        [str(REPO_ROOT)]
+        + ([environment["PYTHONPATH"]] if environment.get("PYTHONPATH") else [])
+    )
+    for size in arguments.sizes.split(","):
+        completed = subprocess.run(
+            [
+                sys.executable,
+                str(Path(__file__).resolve()),
+                "--worker",
+                str(parse_size(size)),
+                "--ops",
+                str(arguments.ops),
+                "--rounds",
+                str(arguments.rounds),
+                "--seed",
+                str(arguments.seed),
+            ],
+            capture_output=True,
+            text=True,
+            cwd=REPO_ROOT,
+            env=environment,
+        )
+        if completed.returncode != 0:
+            print(completed.stderr, file=sys.stderr)
+            sys.exit(f"The {size} run failed")
+        result: dict[str, Any] = json.loads(completed.stdout.splitlines()[-1])
+        results["sizes"][size] = result
+
+        print(f"\n{size} entries, peak RSS {result['peak_rss_mb']:.0f} MiB")
+        print(
+            f"{'phase':<16}{'ops/s':>12}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}"
+        )
+        for phase, values in result["phases"].items():
+            print(
+                f"{phase:<16}{values['ops_per_second']:>12,.1f}"
+                + "".join(
+                    f"{values[key]:>10.3f}" if key in values else f"{'':>10}"
+                    for key in ("p50_ms", "p95_ms", "p99_ms", "max_ms")
+                )
+            )
+
+    arguments.output.write_text(json.dumps(results, indent=1))
+    print(f"\nWrote the results to {arguments.output}")
+
+    if arguments.baseline != None:
+        regressions: list[str] = compare(
+            results,
+            json.loads(arguments.baseline.read_text()),
+            arguments.tolerance,
+            arguments.noise_floor_ms,
+        )
+        if len(regressions) > 0:
+            print(f"\n{len(regressions)} regression(s) against {arguments.baseline}")
+            sys.exit(1)
+        print(f"\nNo regression against {arguments.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,53 @@
-from simple_ledger._log import Logger
+import functools
+import logging
 from simple_ledger._config import AppConfig as config
 
-ledger_logger = Logger(name="PyLedger", custom_name_to_message="PyLedger@Core")
+# The package loggers, created on first use (each one attaches a console and a file handler) rather
+# than at import: by `setup_logging`, by the first `DB`, or by importing one of them by name. So is
+# `Logger` itself, which would otherwise load `logging.handlers` and the log rotation on import.
+_PACKAGE_LOGGERS: dict[str, tuple[str, str]] = {
+    "ledger_logger": ("PyLedger", "PyLedger@Core"),
+    "flet_core_logger": ("flet_core", "PyLedger@FletCore"),
+    "flet_logger": ("flet", "PyLedger@Flet"),
+    "sqlalchemy_orm_logger": ("sqlalchemy.orm", "PyLedger@SQLAlchemy.ORM"),
+    "sqlalchemy_dialects_logger": (
+        "sqlalchemy.dialects",
+        "PyLedger@SQLAlchemy.DIALECT",
+    ),
+    "sqlalchemy_pool_logger": ("sqlalchemy.pool", "PyLedger@SQLAlchemy.POOL"),
+    "sqlalchemy_engine_logger": ("sqlalchemy.engine", "PyLedger@SQLAlchemy.ENGINE"),
+}
 
 
-flet_core_logger: Logger = Logger(
-    name="flet_core", custom_name_to_message="PyLedger@FletCore"
-)
-flet_logger: Logger = Logger(name="flet", custom_name_to_message="PyLedger@Flet")
+@functools.cache
+def setup_logging() -> dict[str, "Logger"]:
+    """
+    Creates the package loggers (once) and returns them by name.
+    """
+    from simple_ledger._log import Logger
 
-sqlalchemy_orm_logger: Logger = Logger(
-    name="sqlalchemy.orm", custom_name_to_message="PyLedger@SQLAlchemy.ORM"
-)
-sqlalchemy_dialects_logger: Logger = Logger(
-    name="sqlalchemy.dialects", custom_name_to_message="PyLedger@SQLAlchemy.DIALECT"
-)
-sqlalchemy_pool_logger: Logger = Logger(
-    name="sqlalchemy.pool", custom_name_to_message="PyLedger@SQLAlchemy.POOL"
-)
-sqlalchemy_engine_logger: Logger = Logger(
-    name="sqlalchemy.engine", custom_name_to_message="PyLedger@SQLAlchemy.ENGINE"
-)
+    # SQLAlchemy logs every statement at INFO (and every row at DEBUG), which is debugging output
+    # for this app: its loggers stay at WARNING unless the app logs at DEBUG
+    debugging: bool = config.APP_LOG_LEVEL in ("DEBUG", logging.DEBUG)
+    return {
+        attribute: Logger(
+            name=name,
+            custom_name_to_message=custom_name_to_message,
+            level=(
+                config.APP_LOG_LEVEL
+                if debugging or not name.startswith("sqlalchemy")
+                else logging.WARNING
+            ),
+        )
+        for attribute, (name, custom_name_to_message) in _PACKAGE_LOGGERS.items()
+    }
+
+
+def __getattr__(name: str) -> "Logger":
+    if name == "Logger":
+        from simple_ledger._log import Logger
+
+        return Logger
+    if name in _PACKAGE_LOGGERS:
+        return setup_logging()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,50 +1,99 @@
+import functools
+import os
 from dataclasses import dataclass, field
 from datetime import date, datetime
 from pathlib import Path
-from typing import Any
+from typing import Any, ClassVar, Optional
 
 
 @dataclass
 class AppConfig:
-    __count__: int = 0
     APP_NAME: str = "PyLedger"
     APP_VERSION: str = "0.0.1"
     APP_HOME: Path = Path().home() / str(APP_NAME + "_" + APP_VERSION)
+    APP_LOG_ROOT: Path = APP_HOME / "LEDGER_LOGS"
     APP_LOG_DIR: Path = (
-        APP_HOME
-        / "LEDGER_LOGS"
+        APP_LOG_ROOT
         / datetime.now().strftime("%Y")
         / datetime.now().strftime("%B").upper()
         / str(str("DAY::") + str(datetime.now().day))
         / str(str("HOUR::") + str(datetime.now().hour))
     )
-    APP_LOG_DIR.mkdir(parents=True, exist_ok=True)
-    mtimes = []
-    for file_name in Path(APP_LOG_DIR).glob(
-        "*.log"
-    ):  # finding all log files and their mtimes
-        mtimes.append(file_name.lstat().st_mtime)
-    __count__ = 0
-
-    if len(mtimes) != 0:
-        max_time = max(mtimes)
-        for file_name in Path(APP_LOG_DIR).glob("*.log"):
-            if max_time == file_name.lstat().st_mtime:
-                __count__ = (
-                    int(str(file_name).replace(".log", "").split("_")[-1]) + 1
-                )  # increasing the count
-
-    APP_LOG_FILE_NAME: str = (
-        APP_NAME
-        + "__"
-        + str(date.today()).replace(" ", "_")
-        + "_"
-        + str(__count__)
-        + ".log"
-    )
     APP_LOG_LEVEL: str | int = "DEBUG"
+    # write the logs from a background thread instead of the thread logging them, see `_log.Logger`
+    APP_LOG_ASYNC: bool = True
+    # a log file is rotated at APP_LOG_MAX_FILE_SIZE bytes; the rotated segment is compressed
+    # ("gzip", "zstd" if the zstandard package is installed, or None) in the background
+    APP_LOG_MAX_FILE_SIZE: int = 64 * 1024 * 1024
+    APP_LOG_COMPRESSION: Optional[str] = "gzip"
+    # the whole APP_LOG_ROOT tree is kept within these bounds, the oldest files going first; files
+    # and directories modified within the last `grace_seconds` are kept, they may belong to another
+    # running process
+    APP_LOG_RETENTION: ClassVar[dict[str, Any]] = {
+        "max_bytes": 1024 * 1024 * 1024,
+        "max_age_days": 30,
+        "grace_seconds": 60 * 60,
+    }
     APP_DB_DIR: Path = APP_HOME / "LEDGER_DB" / datetime.now().strftime("%Y")
 
+    # SQLite performance profiles, applied to every new connection (PRAGMAs) and to the pool:
+    # - durable: every commit is fsynced (synchronous=FULL), small caches
+    # - balanced: WAL + synchronous=NORMAL, a commit can only be lost on power failure, never corrupt
+    # - bulk-load: no fsync at all and large caches, for imports that can simply be re-run
+    APP_DB_PROFILES: ClassVar[dict[str, dict[str, Any]]] = {
+        "durable": {
+            "journal_mode": "WAL",
+            "synchronous": "FULL",
+            "mmap_size": 0,
+            "cache_size": -8 * 1024,  # KiB
+            "temp_store": "DEFAULT",
+            "busy_timeout": 5000,  # ms
+            "pool_size": 5,
+            "max_overflow": 10,
+        },
+        "balanced": {
+            "journal_mode": "WAL",
+            "synchronous": "NORMAL",
+            "mmap_size": 256 * 1024 * 1024,
+            "cache_size": -64 * 1024,
+            "temp_store": "MEMORY",
+            "busy_timeout": 5000,
+            "pool_size": 5,
+            "max_overflow": 10,
+        },
+        "bulk-load": {
+            "journal_mode": "WAL",
+            "synchronous": "OFF",
+            "mmap_size": 1024 * 1024 * 1024,
+            "cache_size": -256 * 1024,
+            "temp_store": "MEMORY",
+            "busy_timeout": 30000,
+            "pool_size": 2,
+            "max_overflow": 0,
+        },
+    }
+    # None keeps SQLite's own settings (rollback journal, synchronous=FULL); a profile is opt-in, by
+    # setting APP_DB_PROFILE (`update_config`) or the PYLEDGER_DB_PROFILE environment variable
+    APP_DB_PROFILE: Optional[str] = os.environ.get("PYLEDGER_DB_PROFILE") or None
+    # write-behind mode of `LedgerDB` (`LedgerDB(write_behind=True)`): single entries are queued and
+    # committed in batches of up to `batch_size`, at most `flush_interval` seconds after they were
+    # added; adding blocks while `max_pending` entries are waiting
+    APP_DB_WRITE_BEHIND: ClassVar[dict[str, Any]] = {
+        "batch_size": 256,
+        "flush_interval": 0.02,  # seconds
+        "max_pending": 10000,
+    }
+    # DB metrics (see `simple_ledger._metrics`): every process writes a snapshot to `snapshot_file`
+    # with its pid inserted (e.g. "metrics.1234.json", shown by the `stats` command) every
+    # `dump_interval` seconds and at exit, and in Prometheus' text format to `prometheus_file` too when
+    # it is set; only the `keep_snapshots` most recent snapshot files are kept
+    APP_DB_METRICS: ClassVar[dict[str, Any]] = {
+        "enabled": True,
+        "snapshot_file": APP_HOME / "LEDGER_METRICS" / "metrics.json",
+        "prometheus_file": None,
+        "dump_interval": 60.0,  # seconds
+        "keep_snapshots": 20,
+    }
     APP_DB_CONFIG: dict[str, Any] = field(default_factory=dict)
 
     def __init__(self):
@@ -54,8 +103,41 @@ class AppConfig:
             "db_dir": self.APP_DB_DIR,
             "echo": True,
             "hide_parameters": False,
+            "profile": self.APP_DB_PROFILE,
         }
 
+    @functools.cached_property
+    def APP_LOG_FILE_NAME(self) -> str:
+        """
+        The name of the log file of this run: the day followed by a counter one past the one of the
+        most recent log file of this hour, e.g. "PyLedger__2023-05-01_3.log".
+        """
+        count: int = 0
+        log_files: list[Path] = list(Path(self.APP_LOG_DIR).glob("*.log"))
+        if len(log_files) != 0:
+            latest: Path = max(
+                log_files, key=lambda file_name: file_name.lstat().st_mtime
+            )
+            count = int(str(latest).replace(".log", "").split("_")[-1]) + 1
+        return (
+            self.APP_NAME
+            + "__"
+            + str(date.today()).replace(" ", "_")
+            + "_"
+            + str(count)
+            + ".log"
+        )
+
     def update_config(self, updation_dict: dict[str, Any]):
         for name, attribute in list(updation_dict.items()):
             setattr(AppConfig, name, attribute)
+        app_config.cache_clear()
+
+
+@functools.cache
+def app_config() -> AppConfig:
+    """
+    Returns the configuration of the app, resolved once and cached (`update_config` clears it).
+    Nothing is created on disk until a logger or a database actually needs it.
+    """
+    return AppConfig()
@@ -1,8 +1,42 @@
+import itertools
 import os
+import threading
+import time
+from collections import OrderedDict
 from pathlib import Path
-from typing import Any, Literal, Optional, Type, Union
-from sqlmodel import SQLModel, Session, create_engine, select
-from pprint import pformat
+from typing import (
+    Any,
+    Callable,
+    Iterable,
+    Iterator,
+    Literal,
+    Optional,
+    Sequence,
+    Type,
+    Union,
+)
+from sqlalchemy import inspect, tuple_
+from sqlmodel import (
+    SQLModel,
+    Session,
+    bindparam,
+    delete,
+    func,
+    insert,
+    select,
+    update,
+)
+from simple_ledger import setup_logging
+from simple_ledger._engine import engines
+from simple_ledger._metrics import DBMetrics, Measurement, metrics
+from simple_ledger._filters import (
+    OR_KEY,
+    compile_filter,
+    compile_filter_shape,
+    compile_order_by,
+    filter_shape,
+    split_key,
+)
 from simple_ledger._log import Logger
 from simple_ledger._config import AppConfig as config
 
@@ -15,6 +49,9 @@ class DB:
     using SQLAlchemy.
     """
 
+    # the number of compiled read statements kept, see `read_records`
+    STATEMENT_CACHE_SIZE: int = 256
+
     def __init__(
         self,
         *,
@@ -23,6 +60,7 @@ class DB:
         db_dir: Union[str, Path],
         echo: Union[bool, str],
         hide_parameters: bool,
+        profile: Optional[str] = None,
     ) -> None:
         """
         This is a constructor function that initializes a database connection and creates tables in the
@@ -42,7 +80,12 @@ class DB:
           hide_parameters (bool): A boolean parameter that determines whether or not to hide the parameters
         in the SQL queries executed by the engine. If set to True, the parameters will be replaced with
         question marks in the query.
+          profile (Optional[str]): The name of a performance profile of `AppConfig.APP_DB_PROFILES`
+        ("durable", "balanced" or "bulk-load"). For SQLite its PRAGMAs are applied to every new
+        connection and its pool settings to the engine. Defaults to None, which keeps the SQLAlchemy
+        and SQLite defaults.
         """
+        setup_logging()
         self.db_api: str = db_api
         self.db_name: str = db_name
         self.db_dir: str | Path = db_dir
@@ -58,7 +101,10 @@ class DB:
             """
             logger.info("DB@Init: Creating the DB Directory")
             logger.debug(
-                f"DB@Init: DB Directory - {self.db_dir} | DB API - {self.db_api} | DB Name - {self.db_name}"
+                "DB@Init: DB Directory - %s | DB API - %s | DB Name - %s",
+                self.db_dir,
+                self.db_api,
+                self.db_name,
             )
             if Path(self.db_dir).exists() == False:
                 Path(self.db_dir).mkdir(parents=True, exist_ok=True)
@@ -66,19 +112,39 @@ class DB:
         except Exception as e:
             logger.error(e)
             logger.critical(
-                f"Unable to Create DB File: {str(self.db_dir)}{os.path.sep}{self.db_name}"
+                "Unable to Create DB File: %s%s%s",
+                self.db_dir,
+                os.path.sep,
+                self.db_name,
             )
 
         self.engine_url: str = (
             f"{self.db_api}:///{str(self.db_dir)}{os.path.sep}{self.db_name}"
         )
         logger.info("DB@Init: Created Engine URL")
-        logger.debug(f"DB@Init: Engine URL - {self.engine_url}")
-        self.engine: Any = create_engine(
-            self.engine_url, echo=False, hide_parameters=hide_parameters
+        logger.debug("DB@Init: Engine URL - %s", self.engine_url)
+        self.profile: Optional[str] = profile
+        # the process wide statistics of the operations and statements, see `metrics_info`
+        self.metrics: DBMetrics = metrics
+        # engines (and their pools) are shared by every DB of the same database in the process
+        self.engine: Any = engines.get_engine(
+            self.engine_url, profile=profile, hide_parameters=hide_parameters
         )
+        self._statement_cache: OrderedDict[tuple, Any] = OrderedDict()
+        self._statement_cache_lock: threading.Lock = threading.Lock()
+        self.statement_cache_hits: int = 0
+        self.statement_cache_misses: int = 0
         logger.info("DB@Init: Creating tables in the DB")
-        self.create_table_metadata()
+        engines.ensure_schema(self.engine_url, self.create_table_metadata)
+
+    def dispose(self) -> None:
+        """
+        Closes the pooled connections of this database, for every `DB` of the process sharing them.
+        The engines stay usable and simply open new connections when needed; `DB`s created afterwards
+        get a new engine.
+        """
+        logger.info("DB@Dispose: Disposing of the engine")
+        engines.dispose(self.engine_url)
 
     def create_table_metadata(self) -> bool:
         """
@@ -91,9 +157,15 @@ class DB:
         """
         try:
             logger.debug(
-                f"DB@MetaDataCreation: Creating metadata with binded Engine - {self.engine}"
+                "DB@MetaDataCreation: Creating metadata with binded Engine - %s",
+                self.engine,
             )
             SQLModel.metadata.create_all(self.engine)
+            # `create_all` only creates indexes together with new tables, so indexes added to an
+            # existing table (e.g. in a newer release) are created here.
+            for table in SQLModel.metadata.sorted_tables:
+                for index in table.indexes:
+                    index.create(self.engine, checkfirst=True)
             return True
         except Exception as e:
             print(e)
@@ -115,22 +187,158 @@ class DB:
         If there is an exception during the insertion process, it returns False.
         """
         try:
-            logger.info("DB@INSERT: CREATE Working")
-            with Session(self.engine) as session:
+            logger.debug("DB@INSERT: CREATE Working")
+            measurement: Measurement = self.metrics.measure("insert")
+            with measurement, Session(self.engine) as session:
                 if type(model_object) == list:
                     session.add_all(model_object)
-                    logger.info("Session@INSERT: Added list of SQLModel Objects")
-                    logger.debug(f"Session@INSERT: Added Objects - {model_object}")
+                    logger.debug("Session@INSERT: Added list of SQLModel Objects")
+                    logger.debug("Session@INSERT: Added %s Objects", len(model_object))
                 else:
                     session.add(model_object)
-                    logger.info("Session@INSERT: Added SQLModel Object")
-                    logger.debug(f"Session@INSERT: Added Object - {model_object}")
+                    logger.debug("Session@INSERT: Added SQLModel Object")
+                    logger.debug("Session@INSERT: Added Object - %s", model_object)
+                model_objects = (
+                    model_object if type(model_object) == list else [model_object]
+                )
+                for model_class in {type(record) for record in model_objects}:
+                    self._track_insert(
+                        session,
+                        model_class,
+                        [
+                            record.dict()
+                            for record in model_objects
+                            if type(record) == model_class
+                        ],
+                    )
                 session.commit()
                 logger.debug("Session@INSERT: Committed Session ")
+                measurement.rows = len(model_objects)
                 return True
         except Exception as e:
             return False
 
+    def bulk_insert_records(
+        self,
+        *,
+        model_class: SQLModel,
+        rows: Union[Iterable[Union[dict[str, Any], tuple]], dict[str, Sequence[Any]]],
+        columns: Optional[list[str]] = None,
+        batch_size: int = 10000,
+        merge_records: Optional[list[SQLModel]] = None,
+    ) -> Optional[dict[str, Any]]:
+        """
+        The function inserts many records at once without building a SQLModel object per record: the
+        rows are sent in batches of `batch_size` with `executemany` Core `INSERT` statements, all in a
+        single transaction.
+
+        Missing attributes are filled with the defaults of the model (including `default_factory`s)
+        and missing integer primary keys are assigned upfront, so the ids of the inserted rows can be
+        returned. On SQLite the transaction takes the write lock before it reads the highest id, so
+        concurrent writers cannot be given the same ids.
+
+        Args:
+          model_class (SQLModel): The SQLModel class representing the database table to insert into.
+          rows (Union[Iterable[Union[dict[str, Any], tuple]], dict[str, Sequence[Any]]]): The rows to be
+        inserted, either as dictionaries, as tuples whose values follow `columns`, or column-wise as a
+        dictionary mapping each attribute name to the sequence of its values.
+          columns (Optional[list[str]]): The attribute names of the values in tuple rows. Required when
+        `rows` holds tuples. Defaults to None
+          batch_size (int): The number of rows sent to the database per `executemany`. Defaults to 10000
+          merge_records (Optional[list[SQLModel]]): Records (of any model) saved in the same
+        transaction, replacing the ones with the same primary key, e.g. the progress of an import.
+        Defaults to None
+
+        Returns:
+          a dictionary with the `ids` of the inserted rows (None if the model has no single integer
+        primary key), the number of `rows` inserted, the `seconds` taken and the `rows_per_second`. If
+        there is an exception during the insertion, nothing is inserted and None is returned.
+        """
+        started: float = time.perf_counter()
+        if type(rows) == dict:
+            columns = list(rows.keys())
+            rows = zip(*rows.values())
+
+        defaults: dict[str, Any] = {
+            name: field
+            for name, field in model_class.__fields__.items()
+            if not field.required
+        }
+        primary_key: list[Any] = list(inspect(model_class).primary_key)
+        id_name: Optional[str] = (
+            primary_key[0].key
+            if (len(primary_key) == 1) and (primary_key[0].type.python_type == int)
+            else None
+        )
+        if id_name != None:
+            defaults.pop(id_name, None)
+
+        ids: Optional[list[int]] = [] if id_name != None else None
+        inserted: int = 0
+        statement = insert(model_class)
+        try:
+            logger.info("DB@BULK_INSERT: Bulk insert Working")
+            with Session(self.engine) as session:
+                next_id: int = 0
+                if (id_name != None) and (self.engine.dialect.name == "sqlite"):
+                    # takes the write lock before reading the max id, so that concurrent writers
+                    # wait for this transaction instead of inserting the same ids
+                    session.connection().exec_driver_sql("BEGIN IMMEDIATE")
+                if id_name != None:
+                    next_id = (
+                        session.exec(
+                            select(func.max(getattr(model_class, id_name)))
+                        ).one()
+                        or 0
+                    ) + 1
+
+                batch: list[dict[str, Any]] = []
+                for row in itertools.chain(rows, [None]):
+                    if row != None:
+                        row = (
+                            dict(row) if type(row) == dict else dict(zip(columns, row))
+                        )
+                        for name, field in defaults.items():
+                            if name not in row:
+                                row[name] = field.get_default()
+                        if id_name != None:
+                            if row.get(id_name) == None:
+                                row[id_name] = next_id
+                            next_id = max(next_id, row[id_name]) + 1
+                            ids.append(row[id_name])
+                        batch.append(row)
+                    if (len(batch) >= batch_size) or ((row == None) and batch):
+                        session.execute(statement, batch)
+                        self._track_insert(session, model_class, batch)
+                        inserted += len(batch)
+                        logger.debug(
+                            "Session@BULK_INSERT: Inserted a batch of %s rows",
+                            len(batch),
+                        )
+                        batch = []
+                for record in merge_records or []:
+                    session.merge(record)
+                session.commit()
+        except Exception as e:
+            logger.error("Session@BULK_INSERT: Unable to insert the rows: %s", e)
+            self.metrics.record(
+                "operations",
+                "bulk_insert",
+                time.perf_counter() - started,
+                failed=True,
+            )
+            return None
+
+        seconds: float = time.perf_counter() - started
+        self.metrics.record("operations", "bulk_insert", seconds, inserted)
+        logger.info("DB@BULK_INSERT: Inserted %s rows in %.3fs", inserted, seconds)
+        return {
+            "ids": ids,
+            "rows": inserted,
+            "seconds": seconds,
+            "rows_per_second": inserted / seconds if seconds > 0 else float(inserted),
+        }
+
     def read_records(
         self,
         *,
@@ -138,6 +346,8 @@ class DB:
         where_and_to: Optional[dict[str, Any]] = None,
         fetch_mode: Optional[Literal["all", "one", "many"]] = "many",
         how_many: Optional[int] = 10,
+        order_by: Optional[Union[str, list[str]]] = None,
+        offset: Optional[int] = None,
     ) -> list[Type[SQLModel]] | Type[SQLModel] | None:
         """
         This function reads records from a SQL database based on specified parameters and returns the
@@ -149,14 +359,19 @@ class DB:
           where_and_to (Optional[dict[str, Any]]): `where_and_to` is a dictionary that contains the
         conditions to filter the records to be fetched. The keys of the dictionary represent the
         attributes of the model class and the values represent the values that the attributes should
-        have. If `where_and_to` is None, all records will be fetched.
+        have. Ranges, `IN` lists, prefixes and `$or` groups are supported too, see `simple_ledger._filters`.
+        If `where_and_to` is None, all records will be fetched.
           fetch_mode (Optional[Literal["all", "one", "many"]]): `fetch_mode` is an optional parameter
         that specifies how the records should be fetched from the database. It can take one of three
         values: "all", "one", or "many". If "all" is specified, all the records that match the query
         will be fetched. If "one". Defaults to many
           how_many (Optional[int]): `how_many` is an optional integer parameter that specifies the
         number of records to fetch when `fetch_mode` is set to "many". If `how_many` is not specified or
-        is set to None, the default value of 10 will be used. If `fetch_mode` is not set. Defaults to 10
+        is set to None, the default value of 10 will be used. It is pushed down into the query as its
+        `LIMIT`. Defaults to 10
+          order_by (Optional[Union[str, list[str]]]): The attribute name(s) to sort the records on,
+        prefixed with "-" for a descending order. Defaults to None, which means the table order
+          offset (Optional[int]): The number of matching records to skip. Defaults to None
 
         Returns:
           The function `read_records` returns the result of executing a SQL query on a database using
@@ -165,53 +380,339 @@ class DB:
         any depending on the `fetch_mode` and the fetched data.
         """
 
-        with Session(self.engine) as session:
-            logger.info("Session@READ: READ Work")
-            if where_and_to != None:
-                if len(list(where_and_to.keys())) == 1:
-                    statement: Type[select] = select(model_class).where(
-                        getattr(model_class, list(where_and_to.keys())[0])
-                        == list(where_and_to.values())[0]
-                    )
-                    logger.info(
-                        "Session@READ: Reading records with the given where info"
-                    )
-                    logger.debug(
-                        f"Session@READ: Exec - {statement} \nwhere: {pformat(where_and_to, indent=2)}"
-                    )
-                if len(list(where_and_to.keys())) > 1:
-                    statement: Type[select] = select(model_class)
-                    logger.info("Session@READ: Multiple where and to keys are given")
-                    for attribute, value in list(where_and_to.items()):
-                        statement = statement.where(
-                            getattr(model_class, attribute) == value
-                        )
-                        logger.info(
-                            "Session@READ: Reading records with the given where info"
-                        )
-                        logger.debug(
-                            f"Session@READ: Exec - {statement} \nwhere: {pformat(where_and_to, indent=2)}"
-                        )
+        statement, parameters = self._read_statement(
+            model_class=model_class,
+            where_and_to=where_and_to,
+            fetch_mode=fetch_mode,
+            how_many=how_many,
+            order_by=order_by,
+            offset=offset,
+        )
 
-            else:
-                statement: Type[select] = select(model_class)
-            result = session.exec(statement)
-            logger.info("DB@READ: Fetching data")
-            logger.debug(f"DB@READ: Fetch Mode - {fetch_mode}")
+        measurement: Measurement = self.metrics.measure("read")
+        with measurement, Session(self.engine) as session:
+            logger.debug("Session@READ: READ Work")
+            if where_and_to != None:
+                logger.debug("Session@READ: Reading records with the given where info")
+            logger.debug(
+                "Session@READ: Exec - %s | Parameters - %s", statement, parameters
+            )
+            result = session.exec(statement, params=parameters)
+            logger.debug("DB@READ: Fetching data")
+            logger.debug("DB@READ: Fetch Mode - %s", fetch_mode)
             if fetch_mode == "all":
-                return result.all()
+                records = result.all()
             elif fetch_mode == "one":
                 try:
-                    return result.one()  # handle error
+                    records = result.one()  # handle error
                 except Exception:
-                    pass
+                    records = None
                     # return result[
                     #     0
                     # ]  # not the best way need to handle the exception here
             elif (fetch_mode == "many") and (how_many != None) and (how_many > 0):
-                return result.fetchmany(how_many)
+                records = result.fetchmany(how_many)
             else:  # if no fetch_mode specified
-                return result.all()
+                records = result.all()
+            measurement.rows = (
+                len(records) if type(records) == list else int(records != None)
+            )
+            return records
+
+    def iter_records(
+        self,
+        *,
+        model_class: SQLModel,
+        where_and_to: Optional[dict[str, Any]] = None,
+        chunk_size: int = 1000,
+    ) -> Iterator[SQLModel]:
+        """
+        This function streams records from a SQL database instead of materialising them into a list.
+        Rows are pulled from an open cursor `chunk_size` at a time, so scanning the whole table uses
+        memory proportional to `chunk_size` and not to the size of the table.
+
+        The session (and the cursor) stay open while the generator is being consumed and are closed
+        as soon as it is exhausted, closed or garbage collected; stop iterating early with `break` or
+        `close()` instead of keeping a half consumed generator around.
+
+        Args:
+          model_class (SQLModel): The SQLModel class representing the database table to read records
+        from.
+          where_and_to (Optional[dict[str, Any]]): A dictionary of equality conditions, the same as in
+        `read_records`. If `where_and_to` is None, all records will be streamed.
+          chunk_size (int): The number of rows fetched from the cursor at a time. Defaults to 1000
+
+        Yields:
+          the matching records of `model_class`, one at a time.
+        """
+        statement = select(model_class)
+        statement = statement.where(*compile_filter(model_class, where_and_to))
+        statement = statement.execution_options(yield_per=chunk_size)
+
+        with Session(self.engine) as session:
+            logger.info("Session@STREAM: Streaming records")
+            logger.debug(
+                "Session@STREAM: Exec - %s | Chunk Size - %s", statement, chunk_size
+            )
+            for chunk in session.exec(statement).partitions(chunk_size):
+                # the identity map only holds weak references, so records dropped by the caller
+                # are freed while the stream goes on
+                yield from chunk
+
+    def iter_rows(
+        self,
+        *,
+        model_class: SQLModel,
+        columns: Optional[list[Any]] = None,
+        where_and_to: Optional[dict[str, Any]] = None,
+        where_clauses: Optional[list[Any]] = None,
+        chunk_size: int = 10000,
+    ) -> Iterator[list[tuple]]:
+        """
+        This function streams plain rows (tuple-like rows of column values, no SQLModel objects) from
+        an open cursor, `chunk_size` rows at a time. It is the cheapest way to scan a table, e.g. to
+        export it.
+
+        Args:
+          model_class (SQLModel): The SQLModel class representing the database table to read from.
+          columns (Optional[list[Any]]): The columns to select, in order. Each item is either the name
+        of an attribute of the model class or a SQL expression. Defaults to None, which means every
+        column of the table.
+          where_and_to (Optional[dict[str, Any]]): A dictionary of equality conditions, the same as in
+        `read_records`. Defaults to None
+          where_clauses (Optional[list[Any]]): Extra SQL expressions pushed down into the `WHERE`
+        clause. Defaults to None
+          chunk_size (int): The number of rows fetched and yielded at a time. Defaults to 10000
+
+        Yields:
+          lists of up to `chunk_size` rows, in primary key order.
+        """
+        selected: list[Any] = (
+            [
+                getattr(model_class, column) if type(column) == str else column
+                for column in columns
+            ]
+            if columns != None
+            else list(model_class.__table__.columns)
+        )
+        statement = select(*selected)
+        statement = statement.where(*compile_filter(model_class, where_and_to))
+        for clause in where_clauses or []:
+            statement = statement.where(clause)
+        statement = statement.order_by(
+            *[column for column in model_class.__table__.primary_key.columns]
+        )
+
+        # a plain Core connection: going through the ORM would cost more than the query itself
+        with self.engine.connect() as connection:
+            logger.info("Connection@STREAM: Streaming rows")
+            logger.debug(
+                "Connection@STREAM: Exec - %s | Chunk Size - %s", statement, chunk_size
+            )
+            result = connection.execution_options(stream_results=True).execute(
+                statement
+            )
+            yield from result.partitions(chunk_size)
+
+    def read_page(
+        self,
+        *,
+        model_class: SQLModel,
+        after_key: Optional[tuple] = None,
+        before_key: Optional[tuple] = None,
+        limit: int = 10,
+        order_by: str = "id",
+        where_and_to: Optional[dict[str, Any]] = None,
+        with_total: bool = False,
+    ) -> dict[str, Any]:
+        """
+        This function reads one page of records using keyset (seek) pagination: instead of skipping
+        `OFFSET` rows, the page starts right after (or before) the key of a known row, so the cost of a
+        page does not depend on how deep into the table it is.
+
+        Records are ordered by `order_by` followed by the primary key, which makes every key unique.
+        Keys are tuples of those values, e.g. `(id,)` or `(transaction_noted_on, id)`; pass back the
+        `next_key` / `prev_key` returned by the previous call to move forward / backward.
+
+        Args:
+          model_class (SQLModel): The SQLModel class representing the database table to read records
+        from.
+          after_key (Optional[tuple]): Start the page right after the row with this key. Defaults to
+        None, which means the first page.
+          before_key (Optional[tuple]): End the page right before the row with this key (used to move
+        backward). Ignored if `after_key` is given. Defaults to None
+          limit (int): The maximum number of records in the page. Defaults to 10
+          order_by (str): The attribute the pages are ordered by. It should be indexed. Defaults to id
+          where_and_to (Optional[dict[str, Any]]): A dictionary of equality conditions, the same as in
+        `read_records`. Defaults to None
+          with_total (bool): Whether to also return an estimate of the total number of records. Without
+        conditions it is read from the largest primary key (exact when no record was ever deleted),
+        otherwise the matching records are counted. Defaults to False
+
+        Returns:
+          a dictionary with the `records` of the page, the `next_key` and `prev_key` cursors (None
+        when there is no next / previous page) and the `total_estimate` (None unless `with_total`).
+        """
+        primary_key: list[str] = [
+            column.key for column in inspect(model_class).primary_key
+        ]
+        columns: list[Any] = [getattr(model_class, order_by)] + [
+            getattr(model_class, key) for key in primary_key if key != order_by
+        ]
+
+        def key_of(record: SQLModel) -> tuple:
+            return tuple(getattr(record, column.key) for column in columns)
+
+        def seek(key: tuple, forward: bool) -> Any:
+            if len(columns) == 1:
+                return columns[0] > key[0] if forward else columns[0] < key[0]
+            if forward:
+                return tuple_(*columns) > tuple_(*key)
+            return tuple_(*columns) < tuple_(*key)
+
+        backward: bool = (after_key == None) and (before_key != None)
+        statement = select(model_class)
+        statement = statement.where(*compile_filter(model_class, where_and_to))
+        if after_key != None:
+            statement = statement.where(seek(tuple(after_key), forward=True))
+        elif before_key != None:
+            statement = statement.where(seek(tuple(before_key), forward=False))
+        statement = statement.order_by(
+            *[column.desc() if backward else column.asc() for column in columns]
+        ).limit(limit + 1)
+
+        total_estimate: Optional[int] = None
+        measurement: Measurement = self.metrics.measure("page")
+        with measurement, Session(self.engine) as session:
+            logger.debug("Session@PAGE: Reading a page of records")
+            logger.debug("Session@PAGE: Exec - %s", statement)
+            records: list[SQLModel] = session.exec(statement).all()
+            measurement.rows = len(records)
+            if with_total:
+                if (where_and_to == None) and (len(primary_key) == 1):
+                    total_estimate = session.exec(
+                        select(func.max(getattr(model_class, primary_key[0])))
+                    ).one()
+                else:
+                    count_statement = (
+                        select(func.count())
+                        .select_from(model_class)
+                        .where(*compile_filter(model_class, where_and_to))
+                    )
+                    total_estimate = session.exec(count_statement).one()
+                total_estimate = total_estimate or 0
+
+        has_more: bool = len(records) > limit
+        records = records[:limit]
+        if backward:
+            records.reverse()
+        next_key: Optional[tuple] = None
+        prev_key: Optional[tuple] = None
+        if len(records) > 0:
+            if backward:
+                next_key = key_of(records[-1])
+                prev_key = key_of(records[0]) if has_more else None
+            else:
+                next_key = key_of(records[-1]) if has_more else None
+                prev_key = key_of(records[0]) if after_key != None else None
+
+        return {
+            "records": records,
+            "next_key": next_key,
+            "prev_key": prev_key,
+            "total_estimate": total_estimate,
+        }
+
+    def key_at(
+        self,
+        *,
+        model_class: SQLModel,
+        position: int,
+        order_by: str = "id",
+        where_and_to: Optional[dict[str, Any]] = None,
+    ) -> Optional[tuple]:
+        """
+        This function returns the `read_page` key of the record at the given (0 based) position, so a
+        page deep into the table can be reached without reading the records before it. Only the key
+        columns are selected, which lets the database skip through the index alone.
+
+        Args:
+          model_class (SQLModel): The SQLModel class representing the database table.
+          position (int): The position of the record in the `order_by` order.
+          order_by (str): The attribute the pages are ordered by. Defaults to id
+          where_and_to (Optional[dict[str, Any]]): A dictionary of equality conditions, the same as in
+        `read_records`. Defaults to None
+
+        Returns:
+          the key of the record, to be used as `after_key` / `before_key` of `read_page`, or None if
+        there is no record at that position.
+        """
+        columns: list[Any] = [getattr(model_class, order_by)] + [
+            getattr(model_class, column.key)
+            for column in inspect(model_class).primary_key
+            if column.key != order_by
+        ]
+        statement = select(*columns)
+        statement = statement.where(*compile_filter(model_class, where_and_to))
+        statement = statement.order_by(*columns).offset(position).limit(1)
+
+        with Session(self.engine) as session:
+            logger.debug("Session@PAGE: Seeking the key of a record")
+            logger.debug("Session@PAGE: Exec - %s", statement)
+            row = session.exec(statement).first()
+        if row == None:
+            return None
+        # a single selected column comes back as a scalar
+        return tuple(row) if len(columns) > 1 else (row,)
+
+    def aggregate_records(
+        self,
+        *,
+        model_class: SQLModel,
+        group_by: list[Any],
+        sum_of: str,
+        count_of: Optional[str] = None,
+        where_and_to: Optional[dict[str, Any]] = None,
+        where_clauses: Optional[list[Any]] = None,
+    ) -> list[tuple]:
+        """
+        This function runs a single `GROUP BY` query over a table and returns one row per group with
+        the number of records and the sum of a numeric column, so callers never have to pull the
+        records into Python to aggregate them.
+
+        Args:
+          model_class (SQLModel): The SQLModel class representing the database table to aggregate.
+          group_by (list[Any]): The grouping keys. Each item is either the name of an attribute of
+        the model class or a SQL expression (e.g. a date bucket).
+          sum_of (str): The name of the numeric attribute to be summed for each group.
+          count_of (Optional[str]): The name of an attribute holding pre-aggregated counts (e.g. in a
+        rollup table). When given, the group count is the sum of that attribute instead of the number
+        of records. Defaults to None
+          where_and_to (Optional[dict[str, Any]]): A dictionary of equality conditions applied before
+        grouping, the same as in `read_records`. Defaults to None
+          where_clauses (Optional[list[Any]]): Extra SQL expressions (e.g. date range predicates) that
+        are pushed down into the `WHERE` clause. Defaults to None
+
+        Returns:
+          a list of rows, each holding the group keys (in the order of `group_by`) followed by the
+        record count and the summed value of the group.
+        """
+        statement = self._aggregate_statement(
+            model_class=model_class,
+            group_by=group_by,
+            sum_of=sum_of,
+            count_of=count_of,
+            where_and_to=where_and_to,
+            where_clauses=where_clauses,
+        )
+
+        measurement: Measurement = self.metrics.measure("aggregate")
+        with measurement, Session(self.engine) as session:
+            logger.debug("Session@AGGREGATE: Aggregating records")
+            logger.debug("Session@AGGREGATE: Exec - %s", statement)
+            groups: list[tuple] = session.exec(statement).all()
+            measurement.rows = len(groups)
+            return groups
 
     def update_records(
         self,
@@ -219,51 +720,67 @@ class DB:
         model_class: SQLModel,
         where_and_to: dict[str, Any],
         with_what: dict[str, Any],
-    ) -> None:
+        where_clauses: Optional[list[Any]] = None,
+    ) -> Optional[int]:
         """
-        This function updates records in a database using SQLAlchemy ORM.
+        This function updates every record matching the given conditions with a single set-based
+        `UPDATE ... SET ... WHERE ...` statement, so the records are never loaded into Python and
+        re-categorising thousands of entries is one round trip.
 
         Args:
           model_class (SQLModel): The SQLModel class that represents the database table to be updated.
           where_and_to (dict[str, Any]): `where_and_to` is a dictionary that specifies the conditions to
         locate the record(s) to be updated in the database table. The keys of the dictionary represent
-        the column names and the values represent the values to be matched. For example, if the table
-        has columns "id", "name", and
+        the column names and the values represent the values to be matched; any filter of
+        `simple_ledger._filters` works.
           with_what (dict[str, Any]): `with_what` is a dictionary containing the attributes and their
         updated values that you want to update in the database table. The keys of the dictionary
         represent the attribute names and the values represent the updated values for those attributes.
+          where_clauses (Optional[list[Any]]): Extra SQL expressions (e.g. date range predicates) that
+        are pushed down into the `WHERE` clause. Defaults to None
+
+        Returns:
+          the number of records updated, or None if the update failed (nothing is changed then). An
+        update without any condition is refused, like in `delete_records`.
         """
-        with Session(self.engine) as session:
+        if (len(where_and_to) == 0) and (len(where_clauses or []) == 0):
+            logger.error("Session@UPDATE: Refusing to update without any condition")
+            return None
+
+        measurement: Measurement = self.metrics.measure("update")
+        with measurement, Session(self.engine) as session:
             logger.info(
-                "Session@UPDATE: Update Work - Refreshing and committing to the database"
+                "Session@UPDATE: Update Work - Updating and committing to the database"
             )
 
             try:
-                result = self.read_records(
-                    model_class=model_class,
-                    where_and_to=where_and_to,
-                    fetch_mode="one",
+                clauses: list[Any] = compile_filter(model_class, where_and_to) + list(
+                    where_clauses or []
                 )
-                logger.debug(f"DB@UPDATE: result - \n{result}")
-
-                for attribute, value in with_what.items():
-                    setattr(
-                        result,
-                        attribute,
-                        value,
-                    )
-                    # locals()[f"result.{attribute}"] = value
-                    logger.info("DB@UPDATE: Updating Records")
-                    logger.debug(
-                        f"DB@UPDATE: Updating {result} with {attribute} being changed to {value}"
+                statement = (
+                    update(model_class)
+                    .where(*clauses)
+                    .values(
+                        {
+                            getattr(model_class, attribute): value
+                            for attribute, value in with_what.items()
+                        }
                     )
-            except Exception as e:
-                logger.error(f"DB@UPDATE: {e}")
-
-                self.insert_records(model_object=result)
+                    .execution_options(synchronize_session=False)
+                )
 
-            # session.refresh(result)
-            session.close()
+                self._track_update(session, model_class, clauses, with_what)
+                logger.debug("DB@UPDATE: Exec - %s | Values - %s", statement, with_what)
+                updated: int = session.execute(statement).rowcount
+                logger.info("DB@UPDATE: Updated %s record(s)", updated)
+                session.commit()
+                measurement.rows = updated
+                return updated
+            except Exception as e:
+                logger.error("DB@UPDATE: %s", e)
+                session.rollback()
+                measurement.failed = True
+                return None
 
     def delete_records(
         self,
@@ -271,46 +788,268 @@ class DB:
         model_class: SQLModel,
         where_and_to: dict[str, Any],
         delete_mode: Literal["all", "one"] = "one",
-    ) -> bool:
+        where_clauses: Optional[list[Any]] = None,
+        batch_size: int = 500,
+    ) -> Optional[int]:
         """
         The function deletes records from a SQL database based on a given model class and a dictionary
         of where conditions, with the option to delete all matching records or just one.
 
+        Every condition is compiled into set-based `DELETE ... WHERE ...` statements, so the records
+        are never loaded into Python. A condition whose value is a list (e.g. a large list of ids) is
+        matched with `IN` and deleted `batch_size` values per statement, all in one transaction.
+
         Args:
           model_class (SQLModel): The SQLModel class representing the database table from which records
         will be deleted.
           where_and_to (dict[str, Any]): `where_and_to` is a dictionary that contains the condition(s)
         to be used in the `WHERE` clause of the SQL `DELETE` statement. The keys of the dictionary
-        represent the column names and the values represent the values to be matched. For example, if
-        `where_and_to` is
+        represent the column names and the values represent the values to be matched, a list, tuple or
+        set of values matching any of them (the rest of the filter language of `simple_ledger._filters`
+        works too).
           delete_mode (Literal["all", "one"]): The `delete_mode` parameter is a string literal that
         specifies the mode of deletion. It can be either "one" or "all". If it is set to "one", only one
         record that matches the given condition will be deleted. If it is set to "all", all records that
         match. Defaults to one
+          where_clauses (Optional[list[Any]]): Extra SQL expressions (e.g. date range predicates) that
+        are pushed down into the `WHERE` clause. Defaults to None
+          batch_size (int): The maximum number of values of a list condition bound in one `DELETE`
+        statement. Defaults to 500
 
         Returns:
-          a boolean value indicating whether the deletion of records was successful or not. True is
-        returned if the deletion was successful, and False is returned if there was an error.
+          the number of records deleted, or None if there was an error (nothing is deleted then).
         """
+        if (len(where_and_to) == 0) and (len(where_clauses or []) == 0):
+            logger.error("Session@DELETE: Refusing to delete without any condition")
+            return None
+
         try:
-            with Session(self.engine) as session:
+            batches: list[list[Any]] = self._batched_where_clauses(
+                model_class, where_and_to, where_clauses, batch_size
+            )
+            measurement: Measurement = self.metrics.measure("delete")
+            with measurement, Session(self.engine) as session:
                 logger.info("Session@DELETE: DELETE Work")
-                statement = select(model_class).where(
-                    getattr(model_class, list(where_and_to.keys())[0])
-                    == list(where_and_to.values())[0]
-                )
-                logger.debug(f"Session@DELETE: Delete Mode: {delete_mode}")
-                result = session.exec(statement)
+                logger.debug("Session@DELETE: Delete Mode: %s", delete_mode)
                 if delete_mode == "one":
-                    session.delete(list(result)[0])
-                    logger.debug("Session@DELETE: Deleted one result")
-                elif delete_mode == "all":
-                    session.delete(result)
-                    logger.debug("Session@DELETE: Deleted all results")
+                    first = None
+                    for batch_clauses in batches:
+                        first = session.exec(
+                            select(model_class).where(*batch_clauses).limit(1)
+                        ).first()
+                        if first != None:
+                            break
+                    batches = [self._identity_clauses(first)] if first != None else []
+
+                deleted: int = 0
+                for batch_clauses in batches:
+                    self._track_delete(session, model_class, batch_clauses)
+                    statement = (
+                        delete(model_class)
+                        .where(*batch_clauses)
+                        .execution_options(synchronize_session=False)
+                    )
+                    logger.debug("Session@DELETE: Exec - %s", statement)
+                    deleted += session.execute(statement).rowcount
+                logger.debug("Session@DELETE: Deleted %s result(s)", deleted)
 
                 logger.info("Session@DELETE: Committing Session")
                 session.commit()
-                return True
+                measurement.rows = deleted
+                return deleted
         except Exception as e:
-            logger.debug(f"Session@DELETE: Error deleting records: {e}")
-            return False
+            logger.debug("Session@DELETE: Error deleting records: %s", e)
+            return None
+
+    def _read_statement(
+        self,
+        *,
+        model_class: SQLModel,
+        where_and_to: Optional[dict[str, Any]],
+        fetch_mode: Optional[str],
+        how_many: Optional[int],
+        order_by: Optional[Union[str, list[str]]],
+        offset: Optional[int],
+    ) -> tuple[Any, dict[str, Any]]:
+        """
+        Returns the (cached) statement of a `read_records` call and the parameters to execute it with.
+        """
+        shape, parameters = filter_shape(model_class, where_and_to)
+        order_key: tuple = tuple(
+            [order_by] if type(order_by) == str else (order_by or [])
+        )
+        limited: bool = (fetch_mode == "many") and (how_many != None) and (how_many > 0)
+        if limited:
+            parameters["limit"] = how_many
+        if offset != None:
+            parameters["offset"] = offset
+
+        def build() -> Any:
+            statement = (
+                select(model_class)
+                .where(*compile_filter_shape(model_class, shape))
+                .order_by(*compile_order_by(model_class, list(order_key)))
+            )
+            if limited:
+                statement = statement.limit(bindparam("limit"))
+            if offset != None:
+                statement = statement.offset(bindparam("offset"))
+            return statement
+
+        statement: Type[select] = self._cached_statement(
+            ("read", model_class, shape, order_key, limited, offset != None), build
+        )
+        return statement, parameters
+
+    @staticmethod
+    def _aggregate_statement(
+        *,
+        model_class: SQLModel,
+        group_by: list[Any],
+        sum_of: str,
+        count_of: Optional[str] = None,
+        where_and_to: Optional[dict[str, Any]] = None,
+        where_clauses: Optional[list[Any]] = None,
+    ) -> Any:
+        """Returns the `GROUP BY` statement of an `aggregate_records` call."""
+        keys: list[Any] = [
+            getattr(model_class, key) if type(key) == str else key for key in group_by
+        ]
+        statement = select(
+            *keys,
+            func.count()
+            if count_of == None
+            else func.coalesce(func.sum(getattr(model_class, count_of)), 0),
+            func.coalesce(func.sum(getattr(model_class, sum_of)), 0.0),
+        )
+        statement = statement.where(*compile_filter(model_class, where_and_to))
+        if where_clauses != None:
+            for clause in where_clauses:
+                statement = statement.where(clause)
+        statement = statement.group_by(*keys)
+        return statement
+
+    def statement_cache_info(self) -> dict[str, int]:
+        """
+        Returns the counters of the compiled statement cache used by `read_records`.
+
+        Returns:
+          a dictionary with the number of cache `hits` and `misses`, the number of statements
+        currently cached (`size`) and the most it keeps (`max_size`).
+        """
+        return {
+            "hits": self.statement_cache_hits,
+            "misses": self.statement_cache_misses,
+            "size": len(self._statement_cache),
+            "max_size": self.STATEMENT_CACHE_SIZE,
+        }
+
+    def metrics_info(self) -> dict[str, Any]:
+        """
+        Returns the statistics of the database work of the process (every `DB` shares them): the
+        count, errors, rows and latencies (mean, p50, p95, p99 and max, in seconds) of each operation
+        ("read", "insert", "bulk_insert", "page", "aggregate", "update", "delete") and of the executed
+        statements by SQL verb. See `simple_ledger._metrics.DBMetrics.snapshot`.
+        """
+        return self.metrics.snapshot()
+
+    def _cached_statement(self, key: tuple, build: Callable[[], Any]) -> Any:
+        """
+        Returns the statement cached under `key`, building (and caching) it with `build` on a miss.
+
+        The key describes the shape of the query (model class, filter shape, ordering, ...) and never
+        its values: those are bound parameters. Reusing the statement object lets SQLAlchemy reuse its
+        cache key and compiled SQL instead of rebuilding and recompiling the query for every call. The
+        least recently used statements are evicted beyond `STATEMENT_CACHE_SIZE`.
+        """
+        with self._statement_cache_lock:
+            if key in self._statement_cache:
+                self.statement_cache_hits += 1
+                self._statement_cache.move_to_end(key)
+                return self._statement_cache[key]
+            self.statement_cache_misses += 1
+        statement = build()
+        with self._statement_cache_lock:
+            self._statement_cache[key] = statement
+            while len(self._statement_cache) > self.STATEMENT_CACHE_SIZE:
+                self._statement_cache.popitem(last=False)
+        return statement
+
+    @staticmethod
+    def _batched_where_clauses(
+        model_class: SQLModel,
+        where_and_to: dict[str, Any],
+        where_clauses: Optional[list[Any]],
+        batch_size: int,
+    ) -> list[list[Any]]:
+        """
+        Compiles the conditions into lists of `WHERE` clauses, one list per statement. List values are
+        matched with `IN`; the longest list is split into batches of `batch_size` values and every
+        other condition goes into each batch.
+        """
+        # `IN` lists by filter key, the longest of which is batched
+        in_lists: dict[str, list[Any]] = {
+            key: list(value)
+            for key, value in where_and_to.items()
+            if (key != OR_KEY)
+            and (split_key(key)[1] in ("eq", "in"))
+            and (type(value) in (list, tuple, set))
+        }
+        batched: Optional[str] = (
+            max(in_lists, key=lambda key: len(in_lists[key]))
+            if len(in_lists) > 0
+            else None
+        )
+        clauses: list[Any] = compile_filter(
+            model_class,
+            {key: value for key, value in where_and_to.items() if key != batched},
+        ) + list(where_clauses or [])
+        return (
+            [clauses]
+            if batched == None
+            else [
+                clauses
+                + [
+                    getattr(model_class, split_key(batched)[0]).in_(
+                        in_lists[batched][start : start + batch_size]
+                    )
+                ]
+                for start in range(0, max(len(in_lists[batched]), 1), batch_size)
+            ]
+        )
+
+    @staticmethod
+    def _identity_clauses(record: SQLModel) -> list[Any]:
+        """
+        Returns the `WHERE` clauses matching exactly the given record through its primary key.
+        """
+        model_class = type(record)
+        return [
+            getattr(model_class, column.key) == getattr(record, column.key)
+            for column in inspect(model_class).primary_key
+        ]
+
+    # Write hooks:
+    # They run inside the session of `insert_records`, `update_records` and `delete_records`
+    # before it is committed, so anything they write (e.g. a rollup table) is committed or rolled
+    # back together with the records themselves. Subclasses override them; by default they do
+    # nothing.
+
+    def _track_insert(
+        self, session: Session, model_class: SQLModel, rows: list[dict[str, Any]]
+    ) -> None:
+        """Called with the values of the records of `model_class` being inserted."""
+
+    def _track_update(
+        self,
+        session: Session,
+        model_class: SQLModel,
+        where_clauses: list[Any],
+        with_what: dict[str, Any],
+    ) -> None:
+        """Called before the records matching `where_clauses` are updated with `with_what`."""
+
+    def _track_delete(
+        self, session: Session, model_class: SQLModel, where_clauses: list[Any]
+    ) -> None:
+        """Called before the records matching `where_clauses` are deleted."""
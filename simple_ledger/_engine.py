@@ -0,0 +1,180 @@
+"""This module keeps one SQLAlchemy engine (and connection pool) per database for the whole process.
+
+Every `DB` (and so every `LedgerDB`, be it from the CLI or one of the flet apps) asks the process
+wide `engines` registry for its engine instead of creating one, so components opening the same
+ledger share pooled connections and the schema is only created once per database file.
+
+Classes:
+    EngineRegistry:
+        Hands out shared engines by URL and settings, runs the schema creation once per URL and
+        disposes of the engines (explicitly, at exit, and in the child after a fork).
+
+Functions:
+    listen_for_pragmas:
+        Applies the PRAGMAs of a performance profile to every new connection of an engine.
+
+Attributes:
+    SQLITE_PRAGMAS:
+        The PRAGMAs a performance profile may set, in the order they are applied.
+
+    engines:
+        The process wide `EngineRegistry`.
+"""
+
+import atexit
+import os
+import threading
+from typing import Any, Callable, Optional
+
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool
+from sqlmodel import create_engine
+from simple_ledger._config import AppConfig as config
+from simple_ledger._metrics import metrics
+
+# `busy_timeout` goes first so that switching the journal mode waits for other connections
+SQLITE_PRAGMAS: tuple[str, ...] = (
+    "busy_timeout",
+    "journal_mode",
+    "synchronous",
+    "mmap_size",
+    "cache_size",
+    "temp_store",
+)
+
+
+class EngineRegistry:
+    """
+    A thread safe registry of engines keyed by database URL and engine settings.
+
+    Attributes:
+        engines (dict[tuple, Any]): The engines by `(url, profile, hide_parameters)`.
+        schema_ready (set[str]): The URLs whose schema has already been created in this process.
+    """
+
+    def __init__(self) -> None:
+        self.engines: dict[tuple, Any] = {}
+        self.schema_ready: set[str] = set()
+        self._lock: threading.RLock = threading.RLock()
+
+    def get_engine(
+        self,
+        url: str,
+        *,
+        profile: Optional[str] = None,
+        hide_parameters: bool = False,
+    ) -> Any:
+        """
+        Returns the shared engine of a database, creating it on first use.
+
+        Args:
+          url (str): The database URL, e.g. "sqlite:////path/to/ledger.db".
+          profile (Optional[str]): The name of a performance profile of `AppConfig.APP_DB_PROFILES`.
+        For SQLite its PRAGMAs are applied to every new connection and its pool settings to the
+        engine. Defaults to None, which keeps the SQLAlchemy and SQLite defaults.
+          hide_parameters (bool): Whether SQL parameters are hidden from logs and errors. Defaults to
+        False
+
+        Raises:
+          ValueError: if the profile is unknown.
+
+        Returns:
+          the engine.
+        """
+        if (profile != None) and (profile not in config.APP_DB_PROFILES):
+            raise ValueError(
+                f"Unknown profile {profile!r}, expected one of {list(config.APP_DB_PROFILES)}"
+            )
+        key: tuple = (url, profile, hide_parameters)
+        with self._lock:
+            if key not in self.engines:
+                self.engines[key] = self._create_engine(url, profile, hide_parameters)
+            return self.engines[key]
+
+    def ensure_schema(self, url: str, create: Callable[[], bool]) -> None:
+        """
+        Runs `create` (the schema creation) for a database URL unless it already succeeded in this
+        process.
+        """
+        with self._lock:
+            if url in self.schema_ready:
+                return
+            if create():
+                self.schema_ready.add(url)
+
+    def dispose(self, url: Optional[str] = None) -> None:
+        """
+        Closes the pooled connections of the engines of a database URL (of every database if `url`
+        is None) and forgets them; the next `get_engine` creates a new engine.
+        """
+        with self._lock:
+            for key in [key for key in self.engines if url in (None, key[0])]:
+                self.engines.pop(key).dispose()
+            if url == None:
+                self.schema_ready.clear()
+            else:
+                self.schema_ready.discard(url)
+
+    def _after_fork(self) -> None:
+        """
+        Called in the child after a fork: the pooled connections belong to the parent, so the pools
+        are replaced without closing them (which would disturb the parent).
+        """
+        self._lock = threading.RLock()
+        for engine in self.engines.values():
+            engine.dispose(close=False)
+
+    @staticmethod
+    def _create_engine(url: str, profile: Optional[str], hide_parameters: bool) -> Any:
+        """
+        Creates an engine with the pool settings and PRAGMAs of a performance profile, its statements
+        timed by the DB metrics (see `simple_ledger._metrics`).
+        """
+        settings: dict[str, Any] = config.APP_DB_PROFILES.get(profile, {})
+        engine_options: dict[str, Any] = {}
+        sqlite: bool = url.startswith("sqlite")
+        if sqlite and (profile != None):
+            # a file database gets no pool by default: keep connections (and their page cache)
+            # around, they are shared between threads (e.g. the UI prefetching pages)
+            engine_options = {
+                "poolclass": QueuePool,
+                "pool_size": settings["pool_size"],
+                "max_overflow": settings["max_overflow"],
+                "connect_args": {"check_same_thread": False},
+            }
+        engine: Any = create_engine(
+            url, echo=False, hide_parameters=hide_parameters, **engine_options
+        )
+
+        if sqlite:
+            listen_for_pragmas(engine, profile)
+        metrics.instrument(engine)
+        return engine
+
+
+def listen_for_pragmas(engine: Any, profile: Optional[str]) -> None:
+    """
+    Applies the PRAGMAs of a performance profile to every new connection of a SQLite engine (for an
+    async engine, pass its `sync_engine`). Does nothing if the profile is None or sets no PRAGMAs.
+    """
+    settings: dict[str, Any] = config.APP_DB_PROFILES.get(profile, {})
+    pragmas: dict[str, Any] = {
+        name: settings[name] for name in SQLITE_PRAGMAS if name in settings
+    }
+    if len(pragmas) == 0:
+        return
+
+    @event.listens_for(engine, "connect")
+    def apply_pragmas(dbapi_connection: Any, connection_record: Any) -> None:
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name} = {value}")
+        finally:
+            cursor.close()
+
+
+engines: EngineRegistry = EngineRegistry()
+atexit.register(engines.dispose)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=engines._after_fork)
@@ -0,0 +1,286 @@
+"""This module compiles the `where_and_to` filter dictionaries used throughout `DB` into SQL.
+
+The filter language:
+
+    {"tag": "DEBIT"}                         # equality (`None` means `IS NULL`)
+    {"id": [1, 2, 3]}                        # a list, tuple or set of values means `IN`
+    {"amount__gte": 100, "amount__lt": 500}  # <attribute>__<operator>
+    {"transaction_noted_on__between": (start, end)}
+    {"from_person__startswith": "Jo"}
+    {"$or": [{"tag": "DEBIT"}, {"amount__gt": 1000}]}
+
+Every key of a dictionary must hold (AND); `$or` takes a list of such dictionaries of which any may
+hold and can be nested.
+
+Operators:
+    eq, ne, lt, lte (le), gt, gte (ge), in, not_in, between (inclusive) and startswith.
+
+Every condition is compiled so that the column is left bare on one side of the comparison, which
+keeps it sargable: SQLite can answer it from an index on that column (e.g. the `tag` index). In
+particular `startswith` is compiled to the range `column >= prefix AND column < next prefix` (a
+case sensitive match) instead of a `LIKE`, which SQLite only runs through an index under special
+collations.
+
+A filter has a shape (its attributes and operators, without the values) and parameters (the
+values). Filters of the same shape compile to the same SQL with different bound parameters, which
+is what `DB` caches its statements on.
+
+Functions:
+    compile_filter:
+        Compiles a filter dictionary into a list of `WHERE` clauses.
+
+    filter_shape:
+        Splits a filter dictionary into its hashable shape and its bound parameters.
+
+    compile_filter_shape:
+        Compiles a filter shape into a list of `WHERE` clauses with bound parameters.
+
+    compile_order_by:
+        Compiles attribute names (prefixed with "-" for descending) into `ORDER BY` clauses.
+
+    split_key:
+        Splits a filter key into its attribute and operator.
+"""
+
+import itertools
+from typing import Any, Callable, Iterator, Optional, Union
+from sqlmodel import SQLModel, and_, bindparam, or_
+
+OR_KEY: str = "$or"
+OPERATOR_SEPARATOR: str = "__"
+PARAMETER_PREFIX: str = "filter_"
+
+_MAX_CODE_POINT: int = 0x10FFFF
+_COMPARISONS: dict[str, Any] = {
+    "lt": lambda column, value: column < value,
+    "lte": lambda column, value: column <= value,
+    "le": lambda column, value: column <= value,
+    "gt": lambda column, value: column > value,
+    "gte": lambda column, value: column >= value,
+    "ge": lambda column, value: column >= value,
+}
+_OPERATORS: set[str] = {
+    "eq",
+    "ne",
+    "in",
+    "not_in",
+    "between",
+    "startswith",
+    *_COMPARISONS,
+}
+
+
+def compile_filter(
+    model_class: SQLModel, where_and_to: Optional[dict[str, Any]]
+) -> list[Any]:
+    """
+    Compiles a filter dictionary into SQL expressions.
+
+    Args:
+      model_class (SQLModel): The SQLModel class whose attributes the filter refers to.
+      where_and_to (Optional[dict[str, Any]]): The filter dictionary, see the module documentation.
+
+    Raises:
+      ValueError: if the filter refers to an unknown attribute or operator, or an operator is given
+    a value of the wrong shape.
+
+    Returns:
+      the list of `WHERE` clauses, all of which must hold (empty if there is no filter).
+    """
+    shape, parameters = filter_shape(model_class, where_and_to)
+    return _build(
+        model_class, shape, iter(parameters.values()), lambda value, expanding: value
+    )
+
+
+def filter_shape(
+    model_class: SQLModel, where_and_to: Optional[dict[str, Any]]
+) -> tuple[tuple, dict[str, Any]]:
+    """
+    Validates a filter dictionary and splits it into its shape and its parameters.
+
+    Args:
+      model_class (SQLModel): The SQLModel class whose attributes the filter refers to.
+      where_and_to (Optional[dict[str, Any]]): The filter dictionary, see the module documentation.
+
+    Raises:
+      ValueError: if the filter refers to an unknown attribute or operator, or an operator is given
+    a value of the wrong shape.
+
+    Returns:
+      the hashable shape of the filter and the values of its bound parameters by name, in the order
+    `compile_filter_shape` binds them.
+    """
+    values: list[Any] = []
+    shape: tuple = _shape(model_class, where_and_to or {}, values)
+    return shape, {
+        f"{PARAMETER_PREFIX}{position}": value for position, value in enumerate(values)
+    }
+
+
+def compile_filter_shape(model_class: SQLModel, shape: tuple) -> list[Any]:
+    """
+    Compiles the shape of a filter (see `filter_shape`) into SQL expressions whose values are bound
+    parameters, to be executed with the parameters of any filter of that shape.
+
+    Args:
+      model_class (SQLModel): The SQLModel class whose attributes the filter refers to.
+      shape (tuple): The shape returned by `filter_shape`.
+
+    Returns:
+      the list of `WHERE` clauses, all of which must hold (empty if there is no filter).
+    """
+    return _build(
+        model_class,
+        shape,
+        (f"{PARAMETER_PREFIX}{position}" for position in itertools.count()),
+        lambda name, expanding: bindparam(name, expanding=expanding),
+    )
+
+
+def compile_order_by(
+    model_class: SQLModel, order_by: Optional[Union[str, list[str]]]
+) -> list[Any]:
+    """
+    Compiles attribute names into `ORDER BY` clauses; a name prefixed with "-" sorts descending.
+
+    Args:
+      model_class (SQLModel): The SQLModel class whose attributes are sorted on.
+      order_by (Optional[Union[str, list[str]]]): One attribute name or a list of them, most
+    significant first.
+
+    Returns:
+      the list of `ORDER BY` clauses (empty if there is nothing to sort on).
+    """
+    if order_by == None:
+        return []
+    clauses: list[Any] = []
+    for name in [order_by] if type(order_by) == str else order_by:
+        attribute: str = name.lstrip("-")
+        if attribute not in model_class.__fields__:
+            raise ValueError(f"Unknown attribute {attribute!r} in order by {name!r}")
+        column = getattr(model_class, attribute)
+        clauses.append(column.desc() if name.startswith("-") else column.asc())
+    return clauses
+
+
+def split_key(key: str) -> tuple[str, str]:
+    """Splits `<attribute>__<operator>` into its parts, the operator defaulting to "eq"."""
+    attribute, separator, operator = key.rpartition(OPERATOR_SEPARATOR)
+    if (separator == "") or (operator not in _OPERATORS):
+        return key, "eq"
+    return attribute, operator
+
+
+def _shape(model_class: SQLModel, where_and_to: dict[str, Any], values: list) -> tuple:
+    """
+    Returns the shape of a filter: one `(attribute, form)` or `(OR_KEY, (shape, ...))` item per
+    condition. The values of the conditions are appended to `values` in the same order.
+    """
+    shape: list[tuple] = []
+    for key, value in where_and_to.items():
+        if key == OR_KEY:
+            if (type(value) not in (list, tuple)) or (len(value) == 0):
+                raise ValueError(f"{OR_KEY} expects a non empty list of filters")
+            shape.append(
+                (OR_KEY, tuple(_shape(model_class, group, values) for group in value))
+            )
+            continue
+        attribute, operator = split_key(key)
+        if attribute not in model_class.__fields__:
+            raise ValueError(f"Unknown attribute {attribute!r} in filter {key!r}")
+        form, condition_values = _condition(operator, value, key)
+        shape.append((attribute, form))
+        values.extend(condition_values)
+    return tuple(shape)
+
+
+def _condition(operator: str, value: Any, key: str) -> tuple[str, tuple]:
+    """
+    Resolves a single condition into the form of the SQL expression it compiles to and the values
+    that expression is bound to.
+    """
+    if operator == "eq":
+        if type(value) in (list, tuple, set):
+            return "in", (list(value),)
+        return ("is_null", ()) if value == None else ("eq", (value,))
+    if operator == "ne":
+        return ("is_not_null", ()) if value == None else ("ne", (value,))
+    if operator in ("in", "not_in"):
+        if type(value) not in (list, tuple, set):
+            raise ValueError(f"{key!r} expects a list of values")
+        return operator, (list(value),)
+    if operator == "between":
+        if (type(value) not in (list, tuple)) or (len(value) != 2):
+            raise ValueError(f"{key!r} expects a (low, high) pair")
+        return "between", (value[0], value[1])
+    if operator == "startswith":
+        if type(value) != str:
+            raise ValueError(f"{key!r} expects a string")
+        if value == "":
+            return "is_not_null", ()
+        if ord(value[-1]) == _MAX_CODE_POINT:
+            escaped: str = "".join(
+                "/" + character if character in "%_/" else character
+                for character in value
+            )
+            return "like", (escaped + "%",)
+        return "prefix", (value, value[:-1] + chr(ord(value[-1]) + 1))
+    if type(value) in (list, tuple, set, dict):
+        raise ValueError(f"{key!r} expects a single value")
+    return operator, (value,)
+
+
+def _build(
+    model_class: SQLModel,
+    shape: tuple,
+    values: Iterator[Any],
+    operand: Callable[[Any, bool], Any],
+) -> list[Any]:
+    """
+    Builds the clauses of a filter shape. The operand of every value is `operand` called with the
+    next item of `values` and whether that value is a list.
+    """
+    clauses: list[Any] = []
+    for attribute, form in shape:
+        if attribute == OR_KEY:
+            clauses.append(
+                or_(
+                    *[
+                        and_(True, *_build(model_class, group, values, operand))
+                        for group in form
+                    ]
+                )
+            )
+            continue
+        column = getattr(model_class, attribute)
+        if form == "is_null":
+            clauses.append(column.is_(None))
+        elif form == "is_not_null":
+            clauses.append(column.is_not(None))
+        elif form == "eq":
+            clauses.append(column == operand(next(values), False))
+        elif form == "ne":
+            clauses.append(column != operand(next(values), False))
+        elif form == "in":
+            clauses.append(column.in_(operand(next(values), True)))
+        elif form == "not_in":
+            clauses.append(column.not_in(operand(next(values), True)))
+        elif form == "between":
+            clauses.append(
+                column.between(
+                    operand(next(values), False), operand(next(values), False)
+                )
+            )
+        elif form == "prefix":
+            clauses.append(
+                and_(
+                    column >= operand(next(values), False),
+                    column < operand(next(values), False),
+                )
+            )
+        elif form == "like":
+            clauses.append(column.like(operand(next(values), False), escape="/"))
+        else:
+            clauses.append(_COMPARISONS[form](column, operand(next(values), False)))
+    return clauses
@@ -11,9 +11,25 @@ Functions:
     create_multi_loggers:
         Creates multiple logger instances for specified logger names.
 
+    start_log_listener:
+        Starts the background thread writing the records of the asynchronous loggers.
+
+    stop_log_listener:
+        Writes the queued records, stops the background thread and attaches the handlers back to
+        their loggers.
+
 Attributes:
     No module-level attributes are defined in this module.
 
+Asynchronous mode:
+    With `asynchronous=True` (the default is `AppConfig.APP_LOG_ASYNC`) a Logger does not attach its
+    console and file handlers to the logging logger. It attaches a QueueHandler instead, which puts
+    every record on one process wide queue. A single background QueueListener takes the records off
+    that queue, in the order they were logged, and hands each one to the handlers of the Logger that
+    queued it. So the calling thread never waits for console or file I/O. The listener is stopped at
+    exit (after writing out every queued record), and the loggers then go back to writing
+    synchronously, so nothing logged later is lost.
+
 Usage:
     To create a single logger instance, create an instance of the Logger class with a name, logging level, and optionally a log file and other logging options. To create multiple logger instances for specified logger names, call the create_multi_loggers function with a list of logger names.
 
@@ -38,7 +54,7 @@ Classes:
                 Initializes the ColoredFormatter instance.
 
             format(self, record):
-                Formats a log record by adding colors to the message based on the log level.
+                Formats a log record with the level name in brackets and the logger name padded.
 
         Attributes:
             colors:
@@ -123,15 +139,21 @@ Attributes:
     No module-level attributes are defined in this module.
 """
 
-from datetime import datetime
+import atexit
+import functools
 import logging
-from logging.handlers import RotatingFileHandler
+from logging.handlers import QueueHandler, QueueListener
 import os
+import queue
+import threading
 from pathlib import Path
 from typing import Optional, Self, Type, Union
 
-from sqlmodel import Field
-from simple_ledger._config import AppConfig as config
+from simple_ledger._config import AppConfig as config, app_config
+from simple_ledger._log_rotation import (
+    CompressingRotatingFileHandler,
+    schedule_log_retention,
+)
 
 
 class ColoredFormatter(logging.Formatter):
@@ -145,10 +167,17 @@ class ColoredFormatter(logging.Formatter):
 
     def __init__(
         self,
+        fmt: Optional[str] = None,
         *args,
         **kwargs,
     ):
-        super().__init__(*args, **kwargs)
+        # the level name is shown as "[LEVEL   ]" and the logger name padded to 10 characters by the
+        # format itself, so records are never modified (the other handlers get them untouched)
+        if fmt != None:
+            fmt = fmt.replace("%(levelname)s", "[%(levelname)-8s]").replace(
+                "%(name)s", "%(name)-10s"
+            )
+        super().__init__(fmt, *args, **kwargs)
         # self.colors = {
         #     "DEBUG": "\033[1;34m",
         #     "INFO": "\033[1;32m",
@@ -158,34 +187,6 @@ class ColoredFormatter(logging.Formatter):
         # }
         # self.reset = "\033[0m"
 
-    def format(self, record):
-        """
-        Format a log record.
-
-        Args:
-            record (LogRecord): The log record to format.
-
-        Returns:
-            str: The formatted log record.
-        """
-
-        levelname = record.levelname
-        self.backup_level_name = record.levelname
-        self.backup_name = record.levelname
-        # if levelname in self.colors:
-        levelname_color = f"[{levelname:<8}]"
-        record.levelname = levelname_color
-        name = record.name
-        # if not self.custom_name == None:
-        # record.message = self.custom_name + ": ``" + record.message
-        name_color = f"{name:<10}"
-        record.name = name_color
-        return super().format(record)
-
-    def __exit__(self, record):
-        record.name = self.backup_name
-        record.levelname = self.backup_level_name
-
 
 class Logger:
     """
@@ -205,10 +206,11 @@ class Logger:
         name: str,
         custom_name_to_message: str = "",
         level=config.APP_LOG_LEVEL,
-        log_file: Optional[str] = config().APP_LOG_FILE_NAME,
-        log_dir: Union[str, Path, None] = config().APP_LOG_DIR,
+        log_file: Optional[str] = None,
+        log_dir: Union[str, Path, None] = None,
         backup_count: int = 5,
-        max_size: int = 10485760 * 50,  # 50 MB
+        max_size: Optional[int] = None,
+        asynchronous: Optional[bool] = None,
     ):
         """
         Initialize the logger with a name, logging level, and optionally a log file and other logging options.
@@ -216,85 +218,315 @@ class Logger:
         Args:
             name (str): The name of the logger.
             level (int): The logging level. Defaults to logging.INFO.
-            log_file (str, optional): The name of the log file. Defaults to None.
-            log_dir (Union[str,Path,None], optional): The path to the log directory. Defaults to None.
-            backup_count (int, optional): The number of backup log files to keep. Defaults to 5.
-            max_size (int, optional): The maximum size of the log file in bytes. Defaults to 1048576.
+            log_file (str, optional): The name of the log file. Defaults to None, which means
+                `AppConfig.APP_LOG_FILE_NAME`.
+            log_dir (Union[str,Path,None], optional): The path to the log directory. Defaults to None,
+                which means `AppConfig.APP_LOG_DIR`.
+            backup_count (int, optional): The number of rotated (compressed) segments of the log file
+                to keep. Defaults to 5.
+            max_size (int, optional): The size in bytes at which the log file is rotated. Defaults to
+                None, which means `AppConfig.APP_LOG_MAX_FILE_SIZE`.
+            asynchronous (bool, optional): Whether the records are written by the background listener
+                (see the module documentation) instead of the calling thread. Defaults to None, which
+                means `AppConfig.APP_LOG_ASYNC`.
         """
 
         self.logger_name = name
         self.custom_name_to_message = custom_name_to_message
         self.logger = logging.getLogger(name)
         self.logger.setLevel(level)
-        if not self.custom_name_to_message == "":
-            self.formatter = ColoredFormatter(
-                "[%(asctime)s] %(levelname)s `%(name)s` : "
-                + str(self.custom_name_to_message)
-                + " >> "
-                + "%(message)s",
-                # custom_name_to_message=self.custom_name_to_message,
-            )
-        else:
-            self.formatter = ColoredFormatter(
-                "[%(asctime)s] %(levelname)s `%(name)s` : %(message)s"
-            )
-
-        self.console_handler = logging.StreamHandler()
-        self.console_handler.setFormatter(self.formatter)
-        self.logger.addHandler(self.console_handler)
+        _register_prefix(name, custom_name_to_message)
 
         if log_dir == None:
-            log_dir = Path(config().APP_LOG_DIR)
-            log_dir.mkdir(parents=True, exist_ok=True)
-            if log_file == None:
-                log_file = f"{self.logger_name.split('.')[0]}__{str(datetime.now())[:13].replace(' ','_')}.log"
-        else:
-            log_dir.mkdir(parents=True, exist_ok=True)
-
-        self.file_handler = RotatingFileHandler(
-            log_dir / log_file,
-            backupCount=backup_count,
-            maxBytes=max_size,
+            log_dir = app_config().APP_LOG_DIR
+        if log_file == None:
+            log_file = app_config().APP_LOG_FILE_NAME
+        log_path: Path = Path(log_dir).resolve() / log_file
+        if max_size == None:
+            max_size = config.APP_LOG_MAX_FILE_SIZE
+
+        # the handlers are shared (see `_shared_handler`): every Logger of the process writes to the
+        # same console handler, and to the same file handler per log file
+        self.console_handler = _shared_handler(("console",), _console_handler)
+        self.formatter = self.console_handler.formatter
+        self.file_handler = _shared_handler(
+            ("file", str(log_path)),
+            lambda: _file_handler(log_path, backup_count, max_size),
         )
-        if not self.custom_name_to_message == "":
-            file_formatter = logging.Formatter(
-                "[%(asctime)s] %(levelname)s `%(name)s` : "
-                + str(self.custom_name_to_message)
-                + " >> "
-                + "%(message)s",
-            )
+
+        self.handlers: list[logging.Handler] = [self.console_handler, self.file_handler]
+        self.queue_handler: Optional[QueueHandler] = None
+        if asynchronous == None:
+            asynchronous = config.APP_LOG_ASYNC
+        if asynchronous and _queue_logger(self):
+            _attach(self.logger, self.queue_handler)
         else:
-            file_formatter = logging.Formatter(
-                "[%(asctime)s] %(levelname)s `%(name)s` : %(message)s",
-            )
-        self.file_handler.setFormatter(file_formatter)
-        self.logger.addHandler(self.file_handler)
+            for handler in self.handlers:
+                _attach(self.logger, handler)
+
+    def _attach_handlers(self) -> None:
+        """Replaces the queue handler with the console and file handlers (see `stop_log_listener`)."""
+        if self.queue_handler != None:
+            self.logger.removeHandler(self.queue_handler)
+            self.queue_handler = None
+            for handler in self.handlers:
+                _attach(self.logger, handler)
 
     @staticmethod
     def create_child(*, parent_logger: logging.Logger, child_name: str):
         parent_logger_name = parent_logger.name
         return Logger(name=str(parent_logger_name + "." + child_name))
 
+    def isEnabledFor(self, level: int) -> bool:
+        """
+        Whether a message of the given level would be logged. Cheap (`logging` caches the answer),
+        so it can guard building an expensive message:
+
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Rows: %s", expensive_summary(rows))
+        """
+        return self.logger.isEnabledFor(level)
+
+    # The messages are lazy: `%`-style arguments are only merged into the message, and a callable
+    # message (e.g. `lambda: pformat(rows)`) is only called, if the level is enabled.
+
+    def _log(self, level: int, message, args: tuple, kwargs: dict) -> None:
+        if self.logger.isEnabledFor(level):
+            self.logger.log(
+                level, message() if callable(message) else message, *args, **kwargs
+            )
+
     def debug(self, message, *args, **kwargs):
         """Log a debug message."""
-        self.logger.debug(message, *args, **kwargs)
+        self._log(logging.DEBUG, message, args, kwargs)
 
     def info(self, message, *args, **kwargs):
         """Log an info message."""
-        self.logger.info(message, *args, **kwargs)
+        self._log(logging.INFO, message, args, kwargs)
 
     def warning(self, message, *args, **kwargs):
         """Log a warning message."""
-        self.logger.warning(message, *args, **kwargs)
+        self._log(logging.WARNING, message, args, kwargs)
 
     def error(self, message, *args, **kwargs):
         """Log an error message."""
-        self.logger.error(message, *args, **kwargs)
+        self._log(logging.ERROR, message, args, kwargs)
 
     def critical(self, message, *args, **kwargs):
         """Log a critical message."""
-        self.logger.critical(message, *args, **kwargs)
+        self._log(logging.CRITICAL, message, args, kwargs)
 
     def exception(self, message, *args, exc_info=True, **kwargs):
         """Log an exception message."""
-        self.logger.exception(message, *args, exc_info=exc_info, **kwargs)
+        self._log(logging.ERROR, message, args, {"exc_info": exc_info, **kwargs})
+
+
+# Handler registry:
+# A handler is created once per destination and kept in `_handlers`, so two Loggers of the same name
+# (or of the same log file) never write a record twice. The text every Logger adds to its messages
+# (`custom_name_to_message`) is looked up by logger name when the record is written, which is what
+# lets loggers with different texts share a handler.
+
+_handlers: dict[tuple, logging.Handler] = {}
+_prefixes: dict[str, str] = {}
+_registry_lock: threading.RLock = threading.RLock()
+_LOG_FORMAT: str = (
+    "[%(asctime)s] %(levelname)s `%(name)s` : %(ledger_prefix)s%(message)s"
+)
+
+
+def _shared_handler(key: tuple, create) -> logging.Handler:
+    """Returns the handler registered under `key`, creating it with `create` the first time."""
+    with _registry_lock:
+        if key not in _handlers:
+            _handlers[key] = create()
+        return _handlers[key]
+
+
+def _register_prefix(name: str, custom_name_to_message: str) -> None:
+    """
+    Registers the text the records of a logger (and of its children) start with. An empty text does
+    not replace one registered for the same name before.
+    """
+    with _registry_lock:
+        if (custom_name_to_message != "") or (name not in _prefixes):
+            _prefixes[name] = custom_name_to_message
+            _prefix_of.cache_clear()
+
+
+@functools.lru_cache(maxsize=1024)
+def _prefix_of(name: str) -> str:
+    """The message prefix of a logger name: the text of the closest registered ancestor."""
+    while True:
+        if name in _prefixes:
+            return (_prefixes[name] + " >> ") if _prefixes[name] != "" else ""
+        if "." not in name:
+            return ""
+        name = name.rpartition(".")[0]
+
+
+def _add_prefix(record: logging.LogRecord) -> bool:
+    """Handler filter: sets the `ledger_prefix` the formats use. Never drops a record."""
+    record.ledger_prefix = _prefix_of(record.name)
+    return True
+
+
+def _console_handler() -> logging.Handler:
+    handler = logging.StreamHandler()
+    handler.setFormatter(ColoredFormatter(_LOG_FORMAT))
+    handler.addFilter(_add_prefix)
+    return handler
+
+
+def _file_handler(path: Path, backup_count: int, max_size: int) -> logging.Handler:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    first: bool = not any(key[0] == "file" for key in _handlers)
+    # the file is only opened by the first record actually written to it; the handler registers it
+    # as active, so it has to exist before retention runs
+    handler = CompressingRotatingFileHandler(
+        path,
+        backupCount=backup_count,
+        maxBytes=max_size,
+        compression=config.APP_LOG_COMPRESSION,
+        delay=True,
+    )
+    handler.setFormatter(logging.Formatter(_LOG_FORMAT))
+    handler.addFilter(_add_prefix)
+    if first:
+        # the first log file of the process: trim the log tree left by the previous runs
+        schedule_log_retention()
+    return handler
+
+
+def _attach(logger: logging.Logger, handler: logging.Handler) -> None:
+    """
+    Attaches a handler to a logger unless the records of the logger reach it already (through the
+    logger itself or an ancestor it propagates to), and detaches it from the descendants of the
+    logger, whose records reach it through the logger from now on.
+    """
+    with _registry_lock:
+        ancestor: Optional[logging.Logger] = logger
+        while ancestor != None:
+            if handler in ancestor.handlers:
+                return
+            ancestor = ancestor.parent if ancestor.propagate else None
+        logger.addHandler(handler)
+        for other in list(logging.Logger.manager.loggerDict.values()):
+            if (handler in getattr(other, "handlers", ())) and (other is not logger):
+                # only if its records propagate up to `logger`
+                ancestor = other
+                while ancestor.propagate and (ancestor.parent != None):
+                    ancestor = ancestor.parent
+                    if ancestor is logger:
+                        other.removeHandler(handler)
+                        break
+
+
+class _LoggerQueueHandler(QueueHandler):
+    """
+    Queues the records of a Logger along with the handlers they are written to by the listener.
+    """
+
+    def __init__(self, log_queue: queue.SimpleQueue, handlers: list[logging.Handler]):
+        super().__init__(log_queue)
+        self.target_handlers: list[logging.Handler] = handlers
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # `prepare` merges the arguments into the message (on the calling thread, so later changes
+        # to mutable arguments do not show) and copies the record
+        record = super().prepare(record)
+        record.target_handlers = self.target_handlers
+        return record
+
+
+class _TargetHandler(logging.Handler):
+    """The handler of the listener: writes every record to the handlers it was queued for."""
+
+    def handle(self, record: logging.LogRecord) -> bool:
+        for handler in getattr(record, "target_handlers", ()):
+            if record.levelno >= handler.level:
+                handler.handle(record)
+        return True
+
+
+_log_queue: queue.SimpleQueue = queue.SimpleQueue()
+_log_listener: Optional[QueueListener] = None
+_queued_loggers: list[Logger] = []
+_listener_lock: threading.RLock = threading.RLock()
+
+
+def _queue_logger(logger: Logger) -> bool:
+    """
+    Gives a Logger a queue handler and starts the listener if need be. Returns False (the Logger
+    then writes synchronously) if the listener was already stopped.
+    """
+    with _listener_lock:
+        if start_log_listener() == None:
+            return False
+        logger.queue_handler = _shared_handler(
+            ("queue", *map(id, logger.handlers)),
+            lambda: _LoggerQueueHandler(_log_queue, logger.handlers),
+        )
+        _queued_loggers.append(logger)
+        return True
+
+
+def start_log_listener() -> Optional[QueueListener]:
+    """
+    Starts the background listener writing the records of the asynchronous loggers, unless it is
+    running already. The listener is stopped at exit.
+
+    Returns:
+        the listener, or None if it was stopped for good (at exit).
+    """
+    global _log_listener
+    with _listener_lock:
+        if _log_listener == None:
+            _log_listener = QueueListener(_log_queue, _TargetHandler())
+            _log_listener.start()
+            atexit.register(stop_log_listener)
+        return _log_listener if _log_listener._thread != None else None
+
+
+def stop_log_listener() -> None:
+    """
+    Writes every queued record, stops the background listener and attaches the handlers of the
+    asynchronous loggers directly to them again, so anything logged afterwards (e.g. by other exit
+    handlers) is written synchronously. Runs at exit.
+    """
+    with _listener_lock:
+        if (_log_listener == None) or (_log_listener._thread == None):
+            return
+        # `stop` puts a sentinel on the queue and waits until everything before it is handled
+        _log_listener.stop()
+        for logger in _queued_loggers:
+            logger._attach_handlers()
+            for handler in logger.handlers:
+                # like `logging.shutdown`, a stream closed already is not an error at exit
+                try:
+                    handler.flush()
+                except (OSError, ValueError):
+                    pass
+        _queued_loggers.clear()
+
+
+def _after_fork_in_child() -> None:
+    """
+    The listener thread does not survive a fork: the child drops the records the parent had queued
+    (the parent writes them) and starts a listener of its own.
+    """
+    global _listener_lock, _log_listener, _registry_lock
+    _listener_lock = threading.RLock()
+    _registry_lock = threading.RLock()
+    if (_log_listener != None) and (_log_listener._thread != None):
+        while True:
+            try:
+                _log_queue.get_nowait()
+            except queue.Empty:
+                break
+        _log_listener = QueueListener(_log_queue, _TargetHandler())
+        _log_listener.start()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
@@ -0,0 +1,255 @@
+"""This module rotates the log files with compression and keeps the log tree within a retention budget.
+
+A new log directory is created every hour (see `AppConfig.APP_LOG_DIR`), so without cleanup the
+`AppConfig.APP_LOG_ROOT` tree only grows. Here:
+
+    - A log file that reaches its maximum size is renamed to a timestamped segment, which is cheap.
+    The writer then carries on with a new file at once, and the segment is compressed by a
+    background thread.
+    - After every rotation (and once when the first log file of the process is opened) the whole
+    log tree is trimmed: files older than the maximum age go first, then the oldest files until the
+    tree fits the byte budget. The log files the process is writing to are never removed, nor are
+    the files and directories modified within the grace period, which may belong to another
+    running process.
+
+Classes:
+    CompressingRotatingFileHandler:
+        A RotatingFileHandler compressing its rotated segments in the background.
+
+Functions:
+    enforce_log_retention:
+        Trims a log tree to a maximum age and size.
+
+    schedule_log_retention:
+        Runs `enforce_log_retention` with the configured bounds on the background thread.
+"""
+
+import gzip
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+from typing import Any, Optional, Union
+
+from simple_ledger._config import AppConfig as config
+
+# the file name extension of the compressed segments, by compression
+COMPRESSION_SUFFIXES: dict[str, str] = {"gzip": ".gz", "zstd": ".zst"}
+
+# one background thread compresses and trims; concurrent.futures waits for it at exit, so a
+# rotation right before exit still ends up compressed
+_maintenance: Optional[ThreadPoolExecutor] = None
+_maintenance_lock: threading.Lock = threading.Lock()
+# the log files written to by this process, which retention leaves alone
+_active_files: set[str] = set()
+
+
+class CompressingRotatingFileHandler(RotatingFileHandler):
+    """
+    A RotatingFileHandler whose rotated segments are compressed by a background thread.
+
+    When the file reaches `maxBytes`, it is renamed to `<file>.<timestamp>` and a new file is
+    started, so the writing thread only pays for a rename. The segment is then compressed to
+    `<file>.<timestamp>.gz` (or `.zst`), the segments beyond `backupCount` are deleted and the log
+    tree is trimmed (see `schedule_log_retention`).
+
+    Attributes:
+        compression (Optional[str]): "gzip", "zstd" or None (the segments are kept as they are).
+    """
+
+    def __init__(
+        self,
+        filename: Union[str, Path],
+        *,
+        maxBytes: int = 0,
+        backupCount: int = 0,
+        compression: Optional[str] = "gzip",
+        delay: bool = True,
+    ) -> None:
+        if (compression != None) and (compression not in COMPRESSION_SUFFIXES):
+            raise ValueError(
+                f"Unknown compression {compression!r}, expected one of {list(COMPRESSION_SUFFIXES)} or None"
+            )
+        super().__init__(
+            filename, maxBytes=maxBytes, backupCount=backupCount, delay=delay
+        )
+        self.compression: Optional[str] = compression
+        _active_files.add(os.path.realpath(self.baseFilename))
+
+    def _open(self):
+        # the directory may have been removed since (e.g. by hand, or by an older release's retention)
+        os.makedirs(os.path.dirname(self.baseFilename), exist_ok=True)
+        return super()._open()
+
+    def doRollover(self) -> None:
+        """Renames the current file to a segment and hands the segment to the background thread."""
+        if self.stream:
+            self.stream.close()
+            self.stream = None
+        if os.path.exists(self.baseFilename):
+            segment: str = (
+                f"{self.baseFilename}.{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}"
+            )
+            os.rename(self.baseFilename, segment)
+            _submit(self._finish_rotation, segment)
+        if not self.delay:
+            self.stream = self._open()
+
+    def close(self) -> None:
+        _active_files.discard(os.path.realpath(self.baseFilename))
+        super().close()
+
+    def _finish_rotation(self, segment: str) -> None:
+        """Runs on the background thread: compresses a segment, drops old ones and trims the tree."""
+        compress_file(segment, self.compression)
+        if self.backupCount > 0:
+            segments: list[Path] = sorted(
+                Path(self.baseFilename).parent.glob(
+                    Path(self.baseFilename).name + ".*"
+                ),
+                key=lambda path: path.name,
+            )
+            for old in segments[: -self.backupCount]:
+                old.unlink(missing_ok=True)
+        enforce_log_retention()
+
+
+def compress_file(path: Union[str, Path], compression: Optional[str]) -> Path:
+    """
+    Compresses a file next to itself (adding the suffix of the compression) and removes the
+    original. Falls back to gzip if zstd is asked for but the zstandard package is not installed.
+
+    Returns:
+        the path of the compressed file (`path` itself if `compression` is None).
+    """
+    path = Path(path)
+    if compression == None:
+        return path
+    if compression == "zstd":
+        try:
+            import zstandard
+        except ImportError:
+            compression = "gzip"
+    target: Path = path.with_name(path.name + COMPRESSION_SUFFIXES[compression])
+    partial: Path = target.with_name(target.name + ".partial")
+    with open(path, "rb") as source:
+        if compression == "zstd":
+            with open(partial, "wb") as raw:
+                with zstandard.ZstdCompressor().stream_writer(raw) as destination:
+                    shutil.copyfileobj(source, destination, 1024 * 1024)
+        else:
+            with gzip.open(partial, "wb", compresslevel=6) as destination:
+                shutil.copyfileobj(source, destination, 1024 * 1024)
+    os.replace(partial, target)
+    path.unlink()
+    return target
+
+
+def enforce_log_retention(
+    root: Union[str, Path, None] = None,
+    *,
+    max_bytes: Optional[int] = None,
+    max_age_days: Optional[float] = None,
+    grace_seconds: Optional[float] = None,
+) -> dict[str, int]:
+    """
+    Trims a log tree: deletes the files older than `max_age_days`, then the oldest files until the
+    tree holds at most `max_bytes`, and finally the directories left empty. The log files this
+    process is writing to are kept, and so are the files and directories modified within the last
+    `grace_seconds`: other running processes may be writing to them (or, for an empty directory,
+    about to), and only their own in-process state would tell.
+
+    Args:
+        root (Union[str, Path, None]): The log tree. Defaults to None, which means
+            `AppConfig.APP_LOG_ROOT`.
+        max_bytes (Optional[int]): The size budget of the tree. Defaults to None, which means
+            `AppConfig.APP_LOG_RETENTION["max_bytes"]`.
+        max_age_days (Optional[float]): The age (by modification time) beyond which files are
+            deleted. Defaults to None, which means `AppConfig.APP_LOG_RETENTION["max_age_days"]`.
+        grace_seconds (Optional[float]): The files and directories modified more recently are never
+            deleted. Defaults to None, which means `AppConfig.APP_LOG_RETENTION["grace_seconds"]`.
+
+    Returns:
+        a dictionary with the number of files `deleted`, the bytes `freed` and the bytes `kept`.
+    """
+    root = Path(root if root != None else config.APP_LOG_ROOT).resolve()
+    if max_bytes == None:
+        max_bytes = config.APP_LOG_RETENTION["max_bytes"]
+    if max_age_days == None:
+        max_age_days = config.APP_LOG_RETENTION["max_age_days"]
+    if grace_seconds == None:
+        grace_seconds = config.APP_LOG_RETENTION["grace_seconds"]
+    stats: dict[str, int] = {"deleted": 0, "freed": 0, "kept": 0}
+    if not root.is_dir():
+        return stats
+
+    files: list[tuple[float, int, Path]] = []
+    for directory, _, names in os.walk(root):
+        for name in names:
+            path = Path(directory) / name
+            try:
+                status = path.stat()
+            except FileNotFoundError:
+                continue
+            files.append((status.st_mtime, status.st_size, path))
+    files.sort(key=lambda file: file[0])
+
+    oldest_kept: float = time.time() - max_age_days * 24 * 60 * 60
+    recent: float = time.time() - grace_seconds
+    total: int = sum(size for _, size, _ in files)
+    for modified, size, path in files:
+        if (modified >= oldest_kept) and (total <= max_bytes):
+            break
+        if (modified >= recent) or (str(path) in _active_files):
+            continue
+        path.unlink(missing_ok=True)
+        total -= size
+        stats["deleted"] += 1
+        stats["freed"] += size
+    stats["kept"] = total
+
+    # the hourly directories left empty, deepest first (not those of the files being written to,
+    # which are only created by their first record, nor the recent ones)
+    active_directories: set[str] = {str(Path(path).parent) for path in _active_files}
+    for directory, _, _ in sorted(
+        os.walk(root), key=lambda entry: len(Path(entry[0]).parts), reverse=True
+    ):
+        if (Path(directory) == root) or (directory in active_directories):
+            continue
+        try:
+            if os.stat(directory).st_mtime < recent:
+                os.rmdir(directory)
+        except OSError:
+            pass
+    return stats
+
+
+def schedule_log_retention() -> Future:
+    """Runs `enforce_log_retention` with the configured bounds on the background thread."""
+    return _submit(enforce_log_retention)
+
+
+def _submit(function: Any, *args: Any) -> Future:
+    """Runs a function on the background maintenance thread."""
+    global _maintenance
+    with _maintenance_lock:
+        if _maintenance == None:
+            _maintenance = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="PyLedger-logs"
+            )
+        return _maintenance.submit(function, *args)
+
+
+def _after_fork_in_child() -> None:
+    # the maintenance thread does not survive a fork
+    global _maintenance, _maintenance_lock
+    _maintenance = None
+    _maintenance_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
@@ -0,0 +1,505 @@
+"""This module measures the database work of the process: counts, row counts, errors and latencies.
+
+Two levels are measured:
+
+    - Statements: every statement executed on an instrumented engine is timed from SQLAlchemy's
+    `before_cursor_execute` event to its `after_cursor_execute` event (or its `handle_error` event),
+    and grouped by its SQL verb (SELECT, INSERT, UPDATE, ...).
+    - Operations: the `DB` methods (read, insert, update, ...) time themselves with
+    `DBMetrics.measure`, ORM work around the statements included, and report how many rows they
+    handled.
+
+Latencies go into histograms with fixed, exponentially growing buckets (`LATENCY_BUCKETS`). Recording
+a latency is a bisect and a few additions, the memory used does not grow with the uptime, and the
+histograms can be exported as they are in Prometheus' text format. The quantiles (p50, p95, p99) are
+interpolated within the buckets, so they are estimates, never off by more than the width of their
+bucket.
+
+The process wide `metrics` writes a snapshot (JSON) every `dump_interval` seconds and at exit, which
+the `stats` command of the CLI shows, and optionally the same snapshot in Prometheus' text format
+(e.g. for the textfile collector of the node exporter), see `AppConfig.APP_DB_METRICS`. Every process
+writes a snapshot file of its own, named after its pid, so concurrent processes never overwrite each
+other's statistics.
+
+Classes:
+    OperationStats:
+        The count, errors, rows and latency histogram of one operation (or statement verb).
+
+    DBMetrics:
+        The statistics of the operations and statements of the process, and the engine hooks.
+
+Functions:
+    snapshot_file_of:
+        The snapshot file of a process.
+
+    snapshot_files:
+        The snapshot files of every process, the most recent first.
+
+    load_snapshot:
+        Reads a snapshot written by `DBMetrics.dump`.
+
+    prometheus_text:
+        Formats a snapshot in Prometheus' text exposition format.
+
+Attributes:
+    LATENCY_BUCKETS:
+        The upper bounds (seconds) of the latency histogram buckets: 10 µs to ~84 s, doubling.
+
+    metrics:
+        The process wide `DBMetrics`.
+"""
+
+import atexit
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Optional, Union
+
+from sqlalchemy import event
+from simple_ledger._log import Logger
+from simple_ledger._config import AppConfig as config
+
+logger = Logger(name="PyLedger.metrics", level=config.APP_LOG_LEVEL)
+
+LATENCY_BUCKETS: tuple[float, ...] = tuple(0.00001 * 2**power for power in range(24))
+QUANTILES: tuple[float, ...] = (0.5, 0.95, 0.99)
+
+# the `Connection.info` key of the start times of the statements being executed
+_STARTED: str = "ledger_metrics_started"
+
+
+class OperationStats:
+    """
+    The statistics of one operation (or statement verb).
+
+    Attributes:
+        count (int): The number of times it ran.
+        errors (int): The number of times it failed.
+        rows (int): The number of rows it read or wrote.
+        seconds (float): The total time it took.
+        max (float): Its longest run, in seconds.
+        buckets (list[int]): The number of runs per `LATENCY_BUCKETS` bucket, the last one counting
+    the runs longer than the largest bound.
+    """
+
+    __slots__ = ("count", "errors", "rows", "seconds", "max", "buckets")
+
+    def __init__(self) -> None:
+        self.count: int = 0
+        self.errors: int = 0
+        self.rows: int = 0
+        self.seconds: float = 0.0
+        self.max: float = 0.0
+        self.buckets: list[int] = [0] * (len(LATENCY_BUCKETS) + 1)
+
+    def observe(self, seconds: float, rows: int, failed: bool) -> None:
+        self.count += 1
+        self.errors += failed
+        self.rows += rows
+        self.seconds += seconds
+        if seconds > self.max:
+            self.max = seconds
+        self.buckets[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+
+    def quantile(self, q: float) -> float:
+        """
+        Estimates a latency quantile (e.g. 0.95 for p95) in seconds, interpolating linearly within
+        the bucket holding it. Returns 0.0 if nothing was measured.
+        """
+        rank: float = q * self.count
+        seen: int = 0
+        for index, in_bucket in enumerate(self.buckets):
+            if (in_bucket > 0) and (seen + in_bucket >= rank):
+                lower: float = LATENCY_BUCKETS[index - 1] if index > 0 else 0.0
+                upper: float = (
+                    LATENCY_BUCKETS[index] if index < len(LATENCY_BUCKETS) else self.max
+                )
+                return min(
+                    lower + (upper - lower) * (rank - seen) / in_bucket, self.max
+                )
+            seen += in_bucket
+        return self.max
+
+    def snapshot(self) -> dict[str, Any]:
+        """Returns the statistics as a dictionary, with the mean and the p50 / p95 / p99 latencies."""
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "rows": self.rows,
+            "seconds": self.seconds,
+            "mean": self.seconds / self.count if self.count > 0 else 0.0,
+            **{f"p{round(q * 100)}": self.quantile(q) for q in QUANTILES},
+            "max": self.max,
+            "buckets": list(self.buckets),
+        }
+
+
+class Measurement:
+    """
+    Times a block as one run of an operation (see `DBMetrics.measure`). Set `rows` to the number of
+    rows handled and `failed` to True if the operation failed without raising; an exception raised
+    out of the block counts as a failure too.
+    """
+
+    __slots__ = ("metrics", "operation", "rows", "failed", "_started")
+
+    def __init__(self, metrics: "DBMetrics", operation: str) -> None:
+        self.metrics: DBMetrics = metrics
+        self.operation: str = operation
+        self.rows: int = 0
+        self.failed: bool = False
+
+    def __enter__(self) -> "Measurement":
+        self._started: float = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type: Any, exc: Any, traceback: Any) -> bool:
+        self.metrics.record(
+            "operations",
+            self.operation,
+            time.perf_counter() - self._started,
+            self.rows,
+            self.failed or (exc_type != None),
+        )
+        return False
+
+
+class DBMetrics:
+    """
+    The statistics of the database operations and statements of the process.
+
+    Attributes:
+        enabled (bool): Whether anything is recorded. Engines are only instrumented while it is True.
+    Defaults to `AppConfig.APP_DB_METRICS["enabled"]`.
+        operations (dict[str, OperationStats]): The statistics by `DB` operation ("read", "insert", ...).
+        statements (dict[str, OperationStats]): The statistics by SQL verb ("SELECT", "INSERT", ...).
+        started_at (datetime): When the statistics started (were last reset).
+    """
+
+    def __init__(self) -> None:
+        self.enabled: bool = config.APP_DB_METRICS["enabled"]
+        self.operations: dict[str, OperationStats] = {}
+        self.statements: dict[str, OperationStats] = {}
+        self.started_at: datetime = datetime.now()
+        self._lock: threading.Lock = threading.Lock()
+        self._dumping: bool = False
+
+    def measure(self, operation: str) -> Measurement:
+        """
+        Returns a context manager timing its block as one run of `operation`, e.g.
+
+            with metrics.measure("read") as measurement:
+                records = ...
+                measurement.rows = len(records)
+        """
+        return Measurement(self, operation)
+
+    def record(
+        self,
+        group: str,
+        name: str,
+        seconds: float,
+        rows: int = 0,
+        failed: bool = False,
+    ) -> None:
+        """
+        Records one run of an operation (`group` "operations") or statement (`group` "statements").
+        """
+        if not self.enabled:
+            return
+        stats: dict[str, OperationStats] = getattr(self, group)
+        with self._lock:
+            if name not in stats:
+                stats[name] = OperationStats()
+            stats[name].observe(seconds, rows, failed)
+
+    def instrument(self, engine: Any) -> None:
+        """
+        Times every statement executed on an engine (for an async engine, pass its `sync_engine`) and
+        starts writing the snapshots. Does nothing if the metrics are disabled.
+        """
+        if not self.enabled:
+            return
+        event.listen(engine, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", self._after_cursor_execute)
+        event.listen(engine, "handle_error", self._handle_error)
+        self.start_dumping()
+
+    def snapshot(self) -> dict[str, Any]:
+        """
+        Returns the statistics of the process.
+
+        Returns:
+          a dictionary with the `pid`, when the statistics `started_at` and when the snapshot was
+        `taken_at` (ISO format), and the statistics (see `OperationStats.snapshot`) by operation
+        (`operations`) and by SQL verb (`statements`).
+        """
+        with self._lock:
+            return {
+                "pid": os.getpid(),
+                "started_at": self.started_at.isoformat(timespec="seconds"),
+                "taken_at": datetime.now().isoformat(timespec="seconds"),
+                "operations": {
+                    name: stats.snapshot() for name, stats in self.operations.items()
+                },
+                "statements": {
+                    name: stats.snapshot() for name, stats in self.statements.items()
+                },
+            }
+
+    def reset(self) -> None:
+        """Forgets every statistic recorded so far."""
+        with self._lock:
+            self.operations = {}
+            self.statements = {}
+            self.started_at = datetime.now()
+
+    def has_data(self) -> bool:
+        """Whether anything was recorded since the statistics started."""
+        return (len(self.operations) > 0) or (len(self.statements) > 0)
+
+    def dump(
+        self,
+        path: Union[str, Path, None] = None,
+        *,
+        prometheus_file: Union[str, Path, None] = None,
+    ) -> Optional[Path]:
+        """
+        Writes a snapshot as JSON (read back by `load_snapshot` and the `stats` command), and also in
+        Prometheus' text format if a Prometheus file is given or configured. The files are replaced
+        atomically, so readers never see half a snapshot.
+
+        Args:
+          path (Union[str, Path, None]): Where to write the snapshot. Defaults to None, which means
+        the snapshot file of this process (see `snapshot_file_of`); the oldest snapshot files beyond
+        `AppConfig.APP_DB_METRICS["keep_snapshots"]` are removed then.
+          prometheus_file (Union[str, Path, None]): Where to write the Prometheus text. Defaults to
+        None, which means `AppConfig.APP_DB_METRICS["prometheus_file"]` (not written if that is None).
+
+        Returns:
+          the path of the snapshot, or None if it could not be written.
+        """
+        settings: dict[str, Any] = config.APP_DB_METRICS
+        configured: bool = path == None
+        path = Path(path if path != None else snapshot_file_of())
+        if prometheus_file == None:
+            prometheus_file = settings["prometheus_file"]
+        snapshot: dict[str, Any] = self.snapshot()
+        try:
+            _write_atomically(path, json.dumps(snapshot, indent=1))
+            if prometheus_file != None:
+                _write_atomically(Path(prometheus_file), prometheus_text(snapshot))
+            if configured:
+                for stale in snapshot_files()[settings["keep_snapshots"] :]:
+                    stale.unlink(missing_ok=True)
+        except OSError as e:
+            logger.error("Metrics@DUMP: Unable to write the metrics: %s", e)
+            return None
+        logger.debug("Metrics@DUMP: Wrote the metrics to %s", path)
+        return path
+
+    def start_dumping(self) -> None:
+        """
+        Writes a snapshot (see `dump`) every `AppConfig.APP_DB_METRICS["dump_interval"]` seconds from
+        a background thread, and at exit. Does nothing if it already started or no snapshot file is
+        configured; an interval of None only writes at exit.
+        """
+        settings: dict[str, Any] = config.APP_DB_METRICS
+        with self._lock:
+            if self._dumping or (settings["snapshot_file"] == None):
+                return
+            self._dumping = True
+        atexit.register(self._dump_at_exit)
+        if settings["dump_interval"] != None:
+            threading.Thread(
+                target=self._dump_periodically,
+                args=(settings["dump_interval"],),
+                name="PyLedger-metrics",
+                daemon=True,
+            ).start()
+
+    def _dump_periodically(self, interval: float) -> None:
+        while True:
+            time.sleep(interval)
+            if self.has_data() and (config.APP_DB_METRICS["snapshot_file"] != None):
+                self.dump()
+
+    def _dump_at_exit(self) -> None:
+        # a process that never touched the database writes no snapshot
+        if self.has_data() and (config.APP_DB_METRICS["snapshot_file"] != None):
+            self.dump()
+
+    # Engine hooks:
+    # The start times are kept on the connection, as a stack: a listener may execute statements of
+    # its own on the same connection while one is running.
+
+    def _before_cursor_execute(
+        self,
+        connection: Any,
+        cursor: Any,
+        statement: str,
+        parameters: Any,
+        context: Any,
+        executemany: bool,
+    ) -> None:
+        connection.info.setdefault(_STARTED, []).append(time.perf_counter())
+
+    def _after_cursor_execute(
+        self,
+        connection: Any,
+        cursor: Any,
+        statement: str,
+        parameters: Any,
+        context: Any,
+        executemany: bool,
+    ) -> None:
+        seconds: float = time.perf_counter() - connection.info[_STARTED].pop()
+        # SQLite reports no row count for SELECT (-1): the read operations count their rows
+        self.record("statements", _verb_of(statement), seconds, max(cursor.rowcount, 0))
+
+    def _handle_error(self, exception_context: Any) -> None:
+        connection: Any = exception_context.connection
+        if (connection == None) or (len(connection.info.get(_STARTED, [])) == 0):
+            return
+        seconds: float = time.perf_counter() - connection.info[_STARTED].pop()
+        self.record(
+            "statements",
+            _verb_of(exception_context.statement),
+            seconds,
+            failed=True,
+        )
+
+    def _after_fork(self) -> None:
+        """
+        Called in the child after a fork: it starts with statistics of its own, and with a dump thread
+        and exit dump of its own once it uses the database (the ones inherited from the parent are
+        dropped, so they are never registered twice).
+        """
+        self._lock = threading.Lock()
+        self._dumping = False
+        atexit.unregister(self._dump_at_exit)
+        self.reset()
+
+
+def snapshot_file_of(pid: Optional[int] = None) -> Path:
+    """
+    Returns the snapshot file of a process: `AppConfig.APP_DB_METRICS["snapshot_file"]` with the pid
+    inserted before its suffix, e.g. "metrics.1234.json".
+
+    Args:
+      pid (Optional[int]): The pid of the process. Defaults to None, which means this process.
+    """
+    template: Path = Path(config.APP_DB_METRICS["snapshot_file"])
+    if pid == None:
+        pid = os.getpid()
+    return template.with_name(f"{template.stem}.{pid}{template.suffix}")
+
+
+def snapshot_files() -> list[Path]:
+    """Returns the snapshot files of every process, the most recently written first."""
+    if config.APP_DB_METRICS["snapshot_file"] == None:
+        return []
+    template: Path = Path(config.APP_DB_METRICS["snapshot_file"])
+    written: list[tuple[float, Path]] = []
+    for path in template.parent.glob(f"{template.stem}.*{template.suffix}"):
+        if not path.name[len(template.stem) + 1 : -len(template.suffix)].isdigit():
+            continue
+        try:
+            written.append((path.stat().st_mtime, path))
+        except OSError:  # removed by another process meanwhile
+            continue
+    return [path for _, path in sorted(written, reverse=True)]
+
+
+def load_snapshot(
+    path: Union[str, Path, None] = None, *, pid: Optional[int] = None
+) -> Optional[dict[str, Any]]:
+    """
+    Reads a snapshot written by `DBMetrics.dump`.
+
+    Args:
+      path (Union[str, Path, None]): The snapshot file. Defaults to None, which means the snapshot
+    of the process `pid`, or the most recent snapshot of any process.
+      pid (Optional[int]): The pid of the process whose snapshot is read (see `snapshot_file_of`).
+    Defaults to None
+
+    Returns:
+      the snapshot (see `DBMetrics.snapshot`), or None if there is none (or it cannot be read).
+    """
+    if (path == None) and (pid == None):
+        latest: list[Path] = snapshot_files()[:1]
+        if len(latest) == 0:
+            logger.debug("Metrics@LOAD: No metrics snapshot yet")
+            return None
+        path = latest[0]
+    path = Path(path if path != None else snapshot_file_of(pid))
+    try:
+        return json.loads(path.read_text())
+    except (OSError, ValueError) as e:
+        logger.debug("Metrics@LOAD: No metrics snapshot at %s: %s", path, e)
+        return None
+
+
+def prometheus_text(snapshot: dict[str, Any]) -> str:
+    """
+    Formats a snapshot (see `DBMetrics.snapshot`) in Prometheus' text exposition format: a latency
+    histogram and row and error counters per operation (`pyledger_db_operation_*`, labelled with
+    `operation`) and per SQL verb (`pyledger_db_statement_*`, labelled with `statement`).
+    """
+    lines: list[str] = []
+    for group, label in (("operations", "operation"), ("statements", "statement")):
+        prefix: str = f"pyledger_db_{label}"
+        stats: dict[str, dict[str, Any]] = snapshot[group]
+        lines += [
+            f"# HELP {prefix}_seconds The latency of the database {group}.",
+            f"# TYPE {prefix}_seconds histogram",
+        ]
+        for name, values in stats.items():
+            cumulative: int = 0
+            for bound, in_bucket in zip(
+                [f"{bound:.6g}" for bound in LATENCY_BUCKETS] + ["+Inf"],
+                values["buckets"],
+            ):
+                cumulative += in_bucket
+                lines.append(
+                    f'{prefix}_seconds_bucket{{{label}="{name}",le="{bound}"}} {cumulative}'
+                )
+            lines += [
+                f'{prefix}_seconds_sum{{{label}="{name}"}} {values["seconds"]!r}',
+                f'{prefix}_seconds_count{{{label}="{name}"}} {values["count"]}',
+            ]
+        for counter, description in (
+            ("rows", "rows read or written"),
+            ("errors", "failures"),
+        ):
+            lines += [
+                f"# HELP {prefix}_{counter}_total The {description} of the database {group}.",
+                f"# TYPE {prefix}_{counter}_total counter",
+            ]
+            lines += [
+                f'{prefix}_{counter}_total{{{label}="{name}"}} {values[counter]}'
+                for name, values in stats.items()
+            ]
+    return "\n".join(lines) + "\n"
+
+
+def _verb_of(statement: Optional[str]) -> str:
+    """Returns the SQL verb of a statement ("SELECT", "INSERT", ...)."""
+    words: list[str] = (statement or "").split(None, 1)
+    return words[0].upper() if len(words) > 0 else "UNKNOWN"
+
+
+def _write_atomically(path: Path, text: str) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    partial: Path = path.with_name(path.name + ".partial")
+    partial.write_text(text)
+    os.replace(partial, path)
+
+
+metrics: DBMetrics = DBMetrics()
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=metrics._after_fork)
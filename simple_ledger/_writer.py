@@ -0,0 +1,189 @@
+"""This module coalesces single record inserts into grouped commits on a background thread.
+
+Committing one ledger entry at a time pays a transaction (and, depending on the profile, an fsync)
+per entry. A `WriteBehindQueue` takes the records instead, returns a future per record right away,
+and a writer thread commits whatever has queued up in one transaction: as soon as `batch_size`
+records are waiting, or `flush_interval` seconds after the first record of a batch arrived.
+
+Classes:
+    WriteBehindQueue:
+        A bounded queue of records with a writer thread committing them in batches.
+"""
+
+import atexit
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Optional
+
+from simple_ledger._db import logger
+
+# queue markers, see `WriteBehindQueue.flush` and `WriteBehindQueue.close`
+_FLUSH: object = object()
+_STOP: object = object()
+
+
+def _is_marker(record: Any) -> bool:
+    return (record is _FLUSH) or (record is _STOP)
+
+
+class WriteBehindQueue:
+    """
+    A bounded queue of records committed in batches by a background writer thread.
+
+    `submit` blocks while `max_pending` records are waiting (back-pressure: callers cannot queue up
+    more than the writer can commit). Every record gets a `Future` resolved with the result of its
+    commit: True once it is committed, False if it could not be inserted. A batch that fails is
+    retried record by record, so one bad record does not fail the records queued with it. Whatever is
+    still queued is committed by `close`, which also runs at exit.
+
+    Attributes:
+        batch_size (int): The most records committed in one transaction.
+        flush_interval (float): The most seconds a record waits for more records to be batched with.
+        max_pending (int): The most records waiting to be committed.
+    """
+
+    def __init__(
+        self,
+        write: Callable[[list[Any]], bool],
+        *,
+        batch_size: int = 256,
+        flush_interval: float = 0.02,
+        max_pending: int = 10000,
+        name: str = "WriteBehindQueue",
+    ) -> None:
+        """
+        Starts the writer thread.
+
+        Args:
+          write (Callable[[list[Any]], bool]): Commits a list of records in one transaction, returning
+        whether it succeeded (e.g. `DB.insert_records`).
+          batch_size (int): The most records committed in one transaction. Defaults to 256
+          flush_interval (float): The most seconds a record waits for more records. Defaults to 0.02
+          max_pending (int): The most records waiting to be committed. Defaults to 10000
+          name (str): The name of the writer thread. Defaults to WriteBehindQueue
+        """
+        if (batch_size < 1) or (max_pending < 1) or (flush_interval < 0):
+            raise ValueError(
+                "batch_size and max_pending must be at least 1, flush_interval not negative"
+            )
+        self.batch_size: int = batch_size
+        self.flush_interval: float = flush_interval
+        self.max_pending: int = max_pending
+        self._write: Callable[[list[Any]], bool] = write
+        self._queue: queue.Queue = queue.Queue(maxsize=max_pending)
+        self._lock: threading.Lock = threading.Lock()
+        self._closed: bool = False
+        self._thread: threading.Thread = threading.Thread(
+            target=self._run, name=name, daemon=True
+        )
+        self._thread.start()
+        atexit.register(self.close)
+
+    @property
+    def pending(self) -> int:
+        """The number of records (and markers) waiting for the writer thread."""
+        return self._queue.qsize()
+
+    def submit(self, record: Any, *, timeout: Optional[float] = None) -> Future:
+        """
+        Queues a record, blocking while `max_pending` records are already waiting.
+
+        Args:
+          record (Any): The record to be committed.
+          timeout (Optional[float]): The most seconds to wait for room in the queue. Defaults to None,
+        which waits as long as it takes
+
+        Raises:
+          RuntimeError: if the queue is closed.
+          queue.Full: if there was no room in the queue within `timeout` seconds.
+
+        Returns:
+          a future resolved with True once the record is committed, or False if it was not inserted.
+        """
+        if self._closed:
+            raise RuntimeError("The write-behind queue is closed")
+        future: Future = Future()
+        self._queue.put((record, future), timeout=timeout)
+        return future
+
+    def flush(self) -> None:
+        """Blocks until every record submitted before the call is committed (or failed)."""
+        if self._closed:
+            return
+        future: Future = Future()
+        self._queue.put((_FLUSH, future))
+        future.result()
+
+    def close(self) -> None:
+        """
+        Stops accepting records, commits the queued ones and stops the writer thread. Runs at exit,
+        so entries queued by the app are not lost when it quits.
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        atexit.unregister(self.close)
+        self._queue.put((_STOP, None))
+        self._thread.join()
+        # records submitted while closing come after the stop marker
+        leftovers: list[tuple[Any, Optional[Future]]] = []
+        while True:
+            try:
+                leftovers.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if len(leftovers) > 0:
+            self._commit(leftovers)
+        logger.info("WriteBehind@CLOSE: Closed the write-behind queue")
+
+    def _run(self) -> None:
+        """The writer thread: gathers batches by size and time and commits them."""
+        while True:
+            batch: list[tuple[Any, Optional[Future]]] = [self._queue.get()]
+            deadline: float = time.monotonic() + self.flush_interval
+            while (not _is_marker(batch[-1][0])) and (len(batch) < self.batch_size):
+                remaining: float = deadline - time.monotonic()
+                try:
+                    batch.append(
+                        self._queue.get(timeout=remaining)
+                        if remaining > 0
+                        else self._queue.get_nowait()
+                    )
+                except queue.Empty:
+                    break
+            self._commit(batch)
+            if batch[-1][0] is _STOP:
+                return
+
+    def _commit(self, batch: list[tuple[Any, Optional[Future]]]) -> None:
+        """Commits the records of a batch and resolves their futures (and those of the markers)."""
+        items: list[tuple[Any, Future]] = [
+            (record, future)
+            for record, future in batch
+            if (not _is_marker(record)) and future.set_running_or_notify_cancel()
+        ]
+        if len(items) > 0:
+            logger.debug("WriteBehind@FLUSH: Committing %s record(s)", len(items))
+            try:
+                if self._write([record for record, _ in items]):
+                    for _, future in items:
+                        future.set_result(True)
+                else:
+                    # find the records that fail on their own
+                    if len(items) > 1:
+                        logger.error(
+                            "WriteBehind@FLUSH: Batch failed, committing record by record"
+                        )
+                    for record, future in items:
+                        future.set_result((len(items) > 1) and self._write([record]))
+            except Exception as e:
+                logger.error("WriteBehind@FLUSH: %s", e)
+                for _, future in items:
+                    if not future.done():
+                        future.set_exception(e)
+        for record, future in batch:
+            if _is_marker(record) and (future != None):
+                future.set_result(None)
@@ -0,0 +1,343 @@
+"""
+asyncio version of `LedgerDB` (`AsyncLedgerDB`), for callers that must not block their event loop
+(e.g. the flet UI event handlers or an API server)
+"""
+import asyncio
+import contextlib
+import datetime
+from typing import Any, AsyncIterator, Literal, Optional, Type
+
+try:
+    import aiosqlite  # noqa: F401, the driver of the `sqlite+aiosqlite` engine
+except ImportError as e:
+    raise ImportError(
+        "AsyncLedgerDB needs aiosqlite, install it with the `async` extra: "
+        "`pip install simple-ledger[async]`"
+    ) from e
+
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlmodel import SQLModel, delete, select, update
+from sqlmodel.ext.asyncio.session import AsyncSession
+from simple_ledger._db import DB, logger
+from simple_ledger._engine import listen_for_pragmas
+from simple_ledger._filters import compile_filter
+from simple_ledger._metrics import metrics
+from simple_ledger.db import Ledger, LedgerDB, LedgerRollup
+
+
+class AsyncLedgerDB:
+    """
+    The asyncio counterpart of `LedgerDB`: the same insert, read, update, delete and summary methods
+    as coroutines, running on SQLAlchemy's asyncio engine with the aiosqlite driver.
+
+    The statements, the filter language and the rollup bookkeeping are the ones of `LedgerDB` (the
+    write hooks run inside the async session's transaction), so both can be used on the same
+    database. Every method opens its own session, and at most `max_concurrency` of them run at the
+    same time: that many pooled connections let concurrent reads overlap (SQLite in WAL mode), while
+    callers beyond the limit wait for a free slot instead of piling up on the database lock.
+
+    Attributes:
+        ledger (LedgerDB): The synchronous `LedgerDB` of the database, which created the schema and
+    builds the statements.
+        engine_url (str): The URL of the async engine, e.g. "sqlite+aiosqlite:////path/to/ledger.db".
+        engine (AsyncEngine): The async engine.
+        max_concurrency (int): The maximum number of sessions running at the same time.
+    """
+
+    def __init__(
+        self, *, ledger: Optional[LedgerDB] = None, max_concurrency: int = 8
+    ) -> None:
+        """
+        Creates the async engine of the database of `ledger`.
+
+        Args:
+          ledger (Optional[LedgerDB]): The `LedgerDB` whose database is used. Defaults to None, which
+        opens the configured ledger (see `AppConfig.APP_DB_CONFIG`).
+          max_concurrency (int): The maximum number of sessions running at the same time, which is also
+        the size of the connection pool. Defaults to 8
+        """
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1")
+        self.ledger: LedgerDB = ledger if ledger != None else LedgerDB()
+        self.max_concurrency: int = max_concurrency
+        self.engine_url: str = self.ledger.engine_url.replace(
+            f"{self.ledger.db_api}://", f"{self.ledger.db_api}+aiosqlite://", 1
+        )
+        logger.info("AsyncDB@Init: Creating the async engine")
+        logger.debug("AsyncDB@Init: Engine URL - %s", self.engine_url)
+        self.engine: Any = create_async_engine(
+            self.engine_url,
+            echo=False,
+            hide_parameters=self.ledger.database_config["hide_parameters"],
+            poolclass=AsyncAdaptedQueuePool,
+            pool_size=max_concurrency,
+            max_overflow=0,
+            connect_args={"check_same_thread": False},
+        )
+        listen_for_pragmas(self.engine.sync_engine, self.ledger.profile)
+        metrics.instrument(self.engine.sync_engine)
+        self._slots: asyncio.Semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def __aenter__(self) -> "AsyncLedgerDB":
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.dispose()
+
+    async def dispose(self) -> None:
+        """
+        Closes the pooled connections of the async engine; the synchronous `ledger` is left open.
+        """
+        logger.info("AsyncDB@Dispose: Disposing of the async engine")
+        await self.engine.dispose()
+
+    @contextlib.asynccontextmanager
+    async def _session(self) -> AsyncIterator[AsyncSession]:
+        """
+        Opens a session once one of the `max_concurrency` slots is free and closes it (rolling back
+        anything not committed) on exit.
+        """
+        async with self._slots:
+            async with AsyncSession(self.engine, expire_on_commit=False) as session:
+                yield session
+
+    async def add_ledger_info(self, *, ledger: SQLModel) -> bool:
+        """
+        Inserts a ledger entry, see `LedgerDB.add_ledger_info`.
+
+        Args:
+          ledger (SQLModel): The `Ledger` object to be inserted.
+
+        Returns:
+          True if the entry was inserted, False otherwise.
+        """
+        return await self.add_ledger_infos(ledgers=[ledger])
+
+    async def add_ledger_infos(self, *, ledgers: list[SQLModel]) -> bool:
+        """
+        Inserts ledger entries in one transaction, see `LedgerDB.add_ledger_infos`.
+
+        Args:
+          ledgers (list[SQLModel]): The `Ledger` objects to be inserted.
+
+        Returns:
+          True if the entries were inserted, False otherwise (nothing is inserted then).
+        """
+        try:
+            async with self._session() as session:
+                logger.debug("AsyncSession@INSERT: Adding SQLModel Objects")
+                logger.debug("AsyncSession@INSERT: Added %s Objects", len(ledgers))
+                session.add_all(ledgers)
+                for model_class in {type(record) for record in ledgers}:
+                    rows: list[dict[str, Any]] = [
+                        record.dict()
+                        for record in ledgers
+                        if type(record) == model_class
+                    ]
+                    await session.run_sync(
+                        lambda sync_session: self.ledger._track_insert(
+                            sync_session, model_class, rows
+                        )
+                    )
+                await session.commit()
+                logger.debug("AsyncSession@INSERT: Committed Session")
+                return True
+        except Exception as e:
+            logger.error("AsyncSession@INSERT: %s", e)
+            return False
+
+    async def read_ledger_info(
+        self,
+        ledger_class: SQLModel = Ledger,
+        *,
+        where_and_to: dict[str, Any] | None = None,
+        fetch_mode: Literal["all", "one", "many"] | None = "all",
+        how_many: int | None = 10,
+        order_by: str | list[str] | None = None,
+        offset: int | None = None,
+    ) -> list[Type[Ledger]] | Type[Ledger] | None:
+        """
+        Reads ledger entries, see `LedgerDB.read_ledger_info` for the arguments. The statement comes
+        from (and is cached by) the synchronous `ledger`.
+
+        Returns:
+          the matching records as a list, or the single matching record (None if there is not exactly
+        one) when `fetch_mode` is "one".
+        """
+        statement, parameters = self.ledger._read_statement(
+            model_class=ledger_class,
+            where_and_to=where_and_to,
+            fetch_mode=fetch_mode,
+            how_many=how_many,
+            order_by=order_by,
+            offset=offset,
+        )
+        async with self._session() as session:
+            logger.debug("AsyncSession@READ: READ Work")
+            logger.debug(
+                "AsyncSession@READ: Exec - %s | Parameters - %s", statement, parameters
+            )
+            result = await session.exec(statement, params=parameters)
+            if fetch_mode == "one":
+                try:
+                    return result.one()
+                except Exception:
+                    return None
+            elif (fetch_mode == "many") and (how_many != None) and (how_many > 0):
+                return result.fetchmany(how_many)
+            else:
+                return result.all()
+
+    async def count_ledger_info(self) -> int:
+        """
+        Returns the exact number of ledger entries, see `LedgerDB.count_ledger_info`.
+        """
+        statement = DB._aggregate_statement(
+            model_class=LedgerRollup,
+            group_by=[],
+            sum_of="amount",
+            count_of="transactions",
+        )
+        async with self._session() as session:
+            logger.debug("AsyncSession@AGGREGATE: Counting records")
+            ((transactions, _),) = (await session.exec(statement)).all()
+            return transactions
+
+    async def update_ledger_info(
+        self,
+        *,
+        ledger_class: SQLModel = Ledger,
+        where_and_to: dict[str, Any],
+        with_what: dict[str, Any],
+        where_clauses: Optional[list[Any]] = None,
+    ) -> Optional[int]:
+        """
+        Updates every matching ledger entry with one `UPDATE` statement, see
+        `LedgerDB.update_ledger_info` for the arguments.
+
+        Returns:
+          the number of records updated, or None if the update failed (nothing is changed then). An
+        update without any condition is refused.
+        """
+        if (len(where_and_to) == 0) and (len(where_clauses or []) == 0):
+            logger.error(
+                "AsyncSession@UPDATE: Refusing to update without any condition"
+            )
+            return None
+
+        try:
+            async with self._session() as session:
+                logger.info("AsyncSession@UPDATE: Update Work")
+                clauses: list[Any] = compile_filter(ledger_class, where_and_to) + list(
+                    where_clauses or []
+                )
+                statement = (
+                    update(ledger_class)
+                    .where(*clauses)
+                    .values(
+                        {
+                            getattr(ledger_class, attribute): value
+                            for attribute, value in with_what.items()
+                        }
+                    )
+                    .execution_options(synchronize_session=False)
+                )
+                await session.run_sync(
+                    lambda sync_session: self.ledger._track_update(
+                        sync_session, ledger_class, clauses, with_what
+                    )
+                )
+                logger.debug(
+                    "AsyncSession@UPDATE: Exec - %s | Values - %s", statement, with_what
+                )
+                updated: int = (await session.execute(statement)).rowcount
+                await session.commit()
+                logger.info("AsyncSession@UPDATE: Updated %s record(s)", updated)
+                return updated
+        except Exception as e:
+            logger.error("AsyncSession@UPDATE: %s", e)
+            return None
+
+    async def delete_ledger_records(
+        self,
+        *,
+        ledger_class: SQLModel = Ledger,
+        where_and_to: dict[str, Any],
+        delete_mode: Literal["all", "one"] = "one",
+        where_clauses: Optional[list[Any]] = None,
+        batch_size: int = 500,
+    ) -> Optional[int]:
+        """
+        Deletes the matching ledger entries (only the first one in the "one" mode) in one transaction,
+        see `LedgerDB.delete_ledger_records` for the arguments.
+
+        Returns:
+          the number of records deleted, or None if there was an error or no condition was given
+        (nothing is deleted then).
+        """
+        if (len(where_and_to) == 0) and (len(where_clauses or []) == 0):
+            logger.error(
+                "AsyncSession@DELETE: Refusing to delete without any condition"
+            )
+            return None
+
+        try:
+            batches: list[list[Any]] = DB._batched_where_clauses(
+                ledger_class, where_and_to, where_clauses, batch_size
+            )
+            async with self._session() as session:
+                logger.info("AsyncSession@DELETE: DELETE Work")
+                if delete_mode == "one":
+                    first = None
+                    for batch_clauses in batches:
+                        first = (
+                            await session.exec(
+                                select(ledger_class).where(*batch_clauses).limit(1)
+                            )
+                        ).first()
+                        if first != None:
+                            break
+                    batches = [DB._identity_clauses(first)] if first != None else []
+
+                deleted: int = 0
+                for batch_clauses in batches:
+                    await session.run_sync(
+                        lambda sync_session: self.ledger._track_delete(
+                            sync_session, ledger_class, batch_clauses
+                        )
+                    )
+                    statement = (
+                        delete(ledger_class)
+                        .where(*batch_clauses)
+                        .execution_options(synchronize_session=False)
+                    )
+                    logger.debug("AsyncSession@DELETE: Exec - %s", statement)
+                    deleted += (await session.execute(statement)).rowcount
+                await session.commit()
+                logger.debug("AsyncSession@DELETE: Deleted %s result(s)", deleted)
+                return deleted
+        except Exception as e:
+            logger.error("AsyncSession@DELETE: Error deleting records: %s", e)
+            return None
+
+    async def summary(
+        self,
+        *,
+        from_: Optional[datetime.date] = None,
+        to_: Optional[datetime.date] = None,
+        bucket: Optional[Literal["day", "week", "month", "year"]] = None,
+    ) -> dict:
+        """
+        Summarises the ledger from the rollup table, see `LedgerDB.summary` for the arguments and the
+        returned dictionary.
+        """
+        query: dict[str, Any] = LedgerDB._summary_query(
+            from_=from_, to_=to_, bucket=bucket
+        )
+        statement = DB._aggregate_statement(**query)
+        async with self._session() as session:
+            logger.debug("AsyncSession@AGGREGATE: Summarising the ledger")
+            logger.debug("AsyncSession@AGGREGATE: Exec - %s", statement)
+            groups: list[tuple] = (await session.exec(statement)).all()
+        return LedgerDB._summary_of(groups, bucket)
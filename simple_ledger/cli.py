@@ -2,24 +2,36 @@
 CLI Version of Simple Ledger
 """
 import dataclasses
-from datetime import datetime
+import datetime
+import functools
 from pathlib import Path
+from typing import Optional
 import typer
 from simple_ledger._log import Logger
+from simple_ledger._metrics import load_snapshot, prometheus_text
 from simple_ledger.db import LedgerDB, Ledger
-from simple_ledger._config import AppConfig as config
+from simple_ledger.ledger_io import (
+    LEDGER_IMPORT_FIELDS,
+    export_ledger,
+    import_ledger_file,
+)
+from simple_ledger._config import AppConfig as config, app_config
 from pprint import pformat
 from rich import print, table
+from rich.progress import Progress, SpinnerColumn, TextColumn, TimeElapsedColumn
 
 cli_logger = Logger(name="PyLedger.cli", level=config.APP_LOG_LEVEL)
 
 app = typer.Typer()
 
-db = LedgerDB()
-cli_logger.debug(
-    f"LEDGER@CLI: Creating Ledger db with default config\n\t{pformat(config.APP_DB_CONFIG, indent=1)}"
-)
-db.create_table_metadata()
+
+@functools.cache
+def ledger_db() -> LedgerDB:
+    """Opens the ledger database on first use, so that e.g. `--help` never touches it."""
+    cli_logger.debug(
+        f"LEDGER@CLI: Creating Ledger db with default config\n\t{pformat(app_config().APP_DB_CONFIG, indent=1)}"
+    )
+    return LedgerDB()
 
 
 @app.command
@@ -57,5 +69,187 @@ def add_entry():
         values_.append(
             typer.prompt(f"Enter the value for [bold green underline]{key}[/]")
         )
-    db.add_ledger_info(ledger=Ledger(**dict(zip(keys_, values_))))
-    db.summary(from_=datetime.date(2023, 1, 1), to_=datetime.date(2023, 1, 1))
+    ledger_db().add_ledger_info(ledger=Ledger(**dict(zip(keys_, values_))))
+    ledger_db().summary(from_=datetime.date(2023, 1, 1), to_=datetime.date(2023, 1, 1))
+
+
+@app.command()
+def rebuild_rollup():
+    """Recomputes the balance rollup table from the raw ledger entries"""
+    if ledger_db().rebuild_rollup():
+        print("[bold green]Rollup table rebuilt[/]")
+    else:
+        print("[bold red]Unable to rebuild the rollup table, check the logs[/]")
+        raise typer.Exit(code=1)
+
+
+@app.command()
+def check_rollup():
+    """Checks the balance rollup table against the raw ledger entries"""
+    mismatches = ledger_db().check_rollup()
+    if len(mismatches) == 0:
+        print("[bold green]Rollup table is consistent with the ledger[/]")
+        return
+    print(f"[bold red]{len(mismatches)} inconsistent rollup key(s)[/]")
+    print(pformat(mismatches))
+    print("Run [bold yellow]rebuild-rollup[/] to fix them")
+    raise typer.Exit(code=1)
+
+
+@app.command(name="import")
+def import_file(
+    path: Path = typer.Argument(..., exists=True, dir_okay=False, readable=True),
+    file_format: Optional[str] = typer.Option(
+        None, "--format", help="csv or jsonl, guessed from the extension by default"
+    ),
+    column_map: list[str] = typer.Option(
+        [], "--map", help="SOURCE_COLUMN=LEDGER_FIELD, can be repeated"
+    ),
+    batch_size: int = typer.Option(5000, help="Entries committed at a time"),
+    date_format: Optional[str] = typer.Option(
+        None, help="strptime format of the dates, ISO dates by default"
+    ),
+    reject_file: Optional[Path] = typer.Option(
+        None, help="Where to write the rejected entries"
+    ),
+    restart: bool = typer.Option(
+        False, help="Ignore the progress of an interrupted import"
+    ),
+):
+    """Imports ledger entries from a CSV or JSONL file (resumes interrupted imports)"""
+    mapping: dict[str, str] = {}
+    for pair in column_map:
+        source_column, _, field = pair.partition("=")
+        if field not in LEDGER_IMPORT_FIELDS:
+            print(
+                f"[bold red]{pair!r}: expected SOURCE_COLUMN=LEDGER_FIELD with one of {LEDGER_IMPORT_FIELDS}[/]"
+            )
+            raise typer.Exit(code=2)
+        mapping[source_column] = field
+
+    try:
+        with Progress(
+            SpinnerColumn(),
+            TextColumn("[progress.description]{task.description}"),
+            TimeElapsedColumn(),
+        ) as progress:
+            task = progress.add_task(f"Importing {path.name}", total=None)
+            stats = import_ledger_file(
+                ledger_db(),
+                path,
+                file_format=file_format,
+                column_map=mapping,
+                batch_size=batch_size,
+                date_format=date_format,
+                reject_path=reject_file,
+                resume=not restart,
+                on_progress=lambda stats: progress.update(
+                    task,
+                    description=f"Importing {path.name}: {stats['read']} read, "
+                    f"{stats['imported']} imported, {stats['rejected']} rejected",
+                ),
+            )
+    except (RuntimeError, ValueError) as e:
+        print(f"[bold red]{e}[/]")
+        raise typer.Exit(code=1)
+
+    print(
+        f"[bold green]Imported {stats['imported']} entries[/] "
+        f"({stats['read']} read, {stats['skipped']} already imported before)"
+    )
+    if stats["rejected"] > 0:
+        print(
+            f"[bold yellow]{stats['rejected']} entries rejected[/], see {stats['reject_file']}"
+        )
+
+
+@app.command(name="export")
+def export_file(
+    path: Path = typer.Argument(..., dir_okay=False, writable=True),
+    file_format: Optional[str] = typer.Option(
+        None,
+        "--format",
+        help="csv, jsonl or parquet, guessed from the extension by default",
+    ),
+    from_: Optional[datetime.datetime] = typer.Option(
+        None, "--from", formats=["%Y-%m-%d"], help="First day to export"
+    ),
+    to_: Optional[datetime.datetime] = typer.Option(
+        None, "--to", formats=["%Y-%m-%d"], help="Last day to export"
+    ),
+    person: Optional[str] = typer.Option(
+        None, help="Only entries from or to this person"
+    ),
+    tag: Optional[str] = typer.Option(None, help="Only entries with this tag"),
+    chunk_size: int = typer.Option(10000, help="Rows written at a time"),
+):
+    """Exports the ledger to a CSV, JSONL or Parquet file"""
+    try:
+        stats = export_ledger(
+            ledger_db(),
+            path,
+            file_format=file_format,
+            from_=from_.date() if from_ != None else None,
+            to_=to_.date() if to_ != None else None,
+            person=person,
+            tag=tag,
+            chunk_size=chunk_size,
+        )
+    except (RuntimeError, ValueError) as e:
+        print(f"[bold red]{e}[/]")
+        raise typer.Exit(code=1)
+    print(
+        f"[bold green]Exported {stats['rows']} entries[/] to {stats['path']} in {stats['seconds']:.2f}s"
+    )
+
+
+@app.command()
+def stats(
+    snapshot_file: Optional[Path] = typer.Option(
+        None,
+        "--snapshot",
+        help="The metrics snapshot file to show, the most recent one by default",
+    ),
+    pid: Optional[int] = typer.Option(
+        None, help="Show the snapshot of this process instead of the most recent one"
+    ),
+    prometheus: Optional[Path] = typer.Option(
+        None, help="Also write the snapshot in Prometheus' text format to this file"
+    ),
+):
+    """Shows the latency, row and error counts of the database operations (last metrics snapshot)"""
+    snapshot = load_snapshot(snapshot_file, pid=pid)
+    if snapshot == None:
+        print(
+            "[bold red]No metrics snapshot yet[/], it is written while the app uses the database"
+        )
+        raise typer.Exit(code=1)
+
+    print(
+        f"Process {snapshot['pid']}: from {snapshot['started_at']} to {snapshot['taken_at']}"
+    )
+    for group, title in (("operations", "Operation"), ("statements", "Statement")):
+        stats_table = table.Table(title=f"DB {group} (ms)")
+        stats_table.add_column(title)
+        for column in ("Count", "Errors", "Rows", "Mean", "p50", "p95", "p99", "Max"):
+            stats_table.add_column(column, justify="right")
+        for name, values in sorted(snapshot[group].items()):
+            stats_table.add_row(
+                name,
+                str(values["count"]),
+                str(values["errors"]),
+                str(values["rows"]),
+                *[
+                    f"{values[key] * 1000:.3f}"
+                    for key in ("mean", "p50", "p95", "p99", "max")
+                ],
+            )
+        print(stats_table)
+
+    if prometheus != None:
+        prometheus.write_text(prometheus_text(snapshot))
+        print(f"[bold green]Wrote the Prometheus metrics to {prometheus}[/]")
+
+
+if __name__ == "__main__":
+    app()
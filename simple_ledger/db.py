@@ -1,9 +1,22 @@
 import datetime
+from concurrent.futures import Future
 from pathlib import Path
-from typing import Any, Literal, Optional, Type
-from sqlmodel import SQLModel, Field
+from typing import Any, Iterable, Iterator, Literal, Optional, Sequence, Type
+from sqlalchemy import bindparam
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlmodel import SQLModel, Field, Index, Session, delete, func, insert, select
 from simple_ledger._db import DB, logger
-from simple_ledger._config import AppConfig as config
+from simple_ledger._config import app_config
+from simple_ledger._writer import WriteBehindQueue
+
+# SQLite `strftime` formats (and date modifiers) used to bucket `Ledger.transaction_noted_on` in
+# `LedgerDB.summary`; a week is labelled by the date of its monday, like in `LedgerFrame`
+SUMMARY_BUCKETS: dict[str, tuple[str, ...]] = {
+    "day": ("%Y-%m-%d",),
+    "week": ("%Y-%m-%d", "weekday 0", "-6 days"),
+    "month": ("%Y-%m",),
+    "year": ("%Y",),
+}
 
 
 class Ledger(SQLModel, table=True):  # One and only table/model : `Ledger`
@@ -15,7 +28,12 @@ class Ledger(SQLModel, table=True):  # One and only table/model : `Ledger`
     and whether the field is nullable or not.
     """
 
+    # serves the date range scans and the date ordered pages of `LedgerDB.read_ledger_page`, whose
+    # keyset `(transaction_noted_on, id)` it matches (summaries read `LedgerRollup` instead)
+    __table_args__ = (Index("ix_ledger_noted_on_id", "transaction_noted_on", "id"),)
+
     id: Optional[int] = Field(default=None, primary_key=True)
+    # indexed together with `id` by `ix_ledger_noted_on_id`
     transaction_noted_on: datetime.date = Field(
         default_factory=datetime.datetime.now().date, nullable=False
     )
@@ -31,15 +49,62 @@ class Ledger(SQLModel, table=True):  # One and only table/model : `Ledger`
     logger.info("LedgerObject: Creating Ledger Object")
 
 
+class LedgerRollup(SQLModel, table=True):
+    """
+    Running totals of the `Ledger` table per day, person and tag. `LedgerDB` keeps it in step with the
+    ledger inside the same transaction as every insert, update and delete, so balances and summaries
+    can be read from here instead of re-aggregating every ledger entry.
+    """
+
+    transaction_noted_on: datetime.date = Field(primary_key=True)
+    from_person: str = Field(primary_key=True, max_length=30)
+    to_person: str = Field(primary_key=True, max_length=30)
+    tag: str = Field(primary_key=True)
+    transactions: int = Field(default=0, nullable=False)
+    amount: float = Field(default=0.0, nullable=False)
+
+
+class LedgerImport(SQLModel, table=True):
+    """
+    The progress of an interrupted file import (see `simple_ledger.ledger_io.import_ledger_file`),
+    one row per file. It is written in the same transaction as every imported batch, so it tells
+    exactly how far the committed entries go; the row is removed once the import is done.
+    """
+
+    source: str = Field(primary_key=True)
+    size: int = Field(nullable=False)
+    mtime: float = Field(nullable=False)
+    read: int = Field(default=0, nullable=False)
+    imported: int = Field(default=0, nullable=False)
+    rejected: int = Field(default=0, nullable=False)
+    rejects_size: int = Field(default=0, nullable=False)
+
+
+# the columns shared by `Ledger` and `LedgerRollup` that make up a rollup key
+ROLLUP_KEYS: tuple[str, ...] = (
+    "transaction_noted_on",
+    "from_person",
+    "to_person",
+    "tag",
+)
+
+
 class LedgerDB(DB):
     """DB for the Ledger . Inherits from DB"""
 
     def __init__(
         self,
+        *,
+        write_behind: bool = False,
     ) -> None:
         """
         This is a constructor function that initializes some variables and calls the constructor of a
         parent class with some arguments.
+
+        Args:
+          write_behind (bool): Whether `add_ledger_info` queues the entries for a background writer
+        thread, which commits them in batches (see `AppConfig.APP_DB_WRITE_BEHIND`), instead of
+        committing every entry on its own. Defaults to False
         """
         self.allowed_tags: list[str] = [
             "CREDIT",
@@ -57,7 +122,9 @@ class LedgerDB(DB):
         # this case, True)
         # - `hide_parameters`: a boolean that specifies whether or not to hide sensitive information
         # (such as passwords) in SQL statements (in this case, False)
-        self.database_config: dict[str, Any] = config().APP_DB_CONFIG
+        # - `profile`: the SQLite performance profile of `AppConfig.APP_DB_PROFILES` (in this case,
+        # None unless the PYLEDGER_DB_PROFILE environment variable names one)
+        self.database_config: dict[str, Any] = app_config().APP_DB_CONFIG
 
         super().__init__(
             db_api=self.database_config["db_api"],
@@ -65,8 +132,53 @@ class LedgerDB(DB):
             db_dir=self.database_config["db_dir"],
             echo=self.database_config["echo"],
             hide_parameters=self.database_config["hide_parameters"],
+            profile=self.database_config.get("profile"),
         )
 
+        # the write-behind queue of `add_ledger_info`, None unless `write_behind` is set
+        self.writer: Optional[WriteBehindQueue] = (
+            WriteBehindQueue(
+                lambda ledgers: self.insert_records(model_object=ledgers),
+                name="LedgerDB-writer",
+                **app_config().APP_DB_WRITE_BEHIND,
+            )
+            if write_behind
+            else None
+        )
+
+    def dispose(self) -> None:
+        """Commits the entries still queued for the writer (if any), then disposes of the engine."""
+        if self.writer != None:
+            self.writer.close()
+        super().dispose()
+
+    def flush(self) -> None:
+        """
+        Blocks until every entry queued by `add_ledger_info` so far is committed. Does nothing
+        unless the write-behind mode is on.
+        """
+        if self.writer != None:
+            self.writer.flush()
+
+    def create_table_metadata(self) -> bool:
+        """
+        Creates the tables and indexes (see `DB.create_table_metadata`) and fills the rollup table of
+        ledgers created before it existed. Runs once per database file and process.
+
+        Returns:
+          True if the tables were created, False otherwise.
+        """
+        if not super().create_table_metadata():
+            return False
+        # ledgers created before the rollup table existed start with an empty rollup
+        with Session(self.engine) as session:
+            if (session.exec(select(Ledger.id).limit(1)).first() != None) and (
+                session.exec(select(LedgerRollup.tag).limit(1)).first() == None
+            ):
+                logger.info("LedgerDB@Init: Rollup table is empty, rebuilding it")
+                self.rebuild_rollup()
+        return True
+
     def add_ledger_info(self, *, ledger: SQLModel) -> bool:
         """
         This function adds ledger information to a database using SQLModel and returns a boolean value
@@ -80,10 +192,41 @@ class LedgerDB(DB):
           The `add_ledger_info` method returns a boolean value indicating whether the insertion of the
         `ledger` object into the database was successful or not. It calls the `insert_records` method of
         the parent class (which is not shown in the code snippet) and passes the `ledger` object as a
-        parameter.
+        parameter. In the write-behind mode it returns True as soon as the entry is queued; use
+        `submit_ledger_info` to wait for the commit, or `flush` to wait for every queued entry.
         """
+        if self.writer != None:
+            self.writer.submit(ledger)
+            return True
         return super().insert_records(model_object=ledger)
 
+    def submit_ledger_info(
+        self, *, ledger: SQLModel, timeout: Optional[float] = None
+    ) -> Future:
+        """
+        This function adds a ledger entry like `add_ledger_info`, but returns a future of the result.
+
+        In the write-behind mode the entry is queued for the writer thread, blocking while the queue
+        is full (see `AppConfig.APP_DB_WRITE_BEHIND`). Otherwise it is committed right away and the
+        returned future is already done.
+
+        Args:
+          ledger (SQLModel): The `Ledger` object to be inserted.
+          timeout (Optional[float]): The most seconds to wait for room in the queue. Defaults to None,
+        which waits as long as it takes
+
+        Raises:
+          queue.Full: if there was no room in the queue within `timeout` seconds.
+
+        Returns:
+          a future resolved with True once the entry is committed, or False if it was not inserted.
+        """
+        if self.writer != None:
+            return self.writer.submit(ledger, timeout=timeout)
+        future: Future = Future()
+        future.set_result(super().insert_records(model_object=ledger))
+        return future
+
     def add_ledger_infos(self, *, ledgers: list[SQLModel]) -> bool:
         """
         This function adds a list of ledger information to a database using SQLModel.
@@ -101,6 +244,40 @@ class LedgerDB(DB):
         """
         return super().insert_records(model_object=ledgers)
 
+    def bulk_add_ledger_infos(
+        self,
+        *,
+        rows: Iterable[dict[str, Any] | tuple] | dict[str, Sequence[Any]],
+        columns: list[str] | None = None,
+        batch_size: int = 10000,
+        import_progress: Optional[LedgerImport] = None,
+    ) -> dict[str, Any] | None:
+        """
+        This function adds many ledger entries at once from plain dictionaries, tuples or columns,
+        without building a `Ledger` object per entry, see `DB.bulk_insert_records`. The rollup table is
+        kept up to date within the same transaction.
+
+        Args:
+          rows (Iterable[dict[str, Any] | tuple] | dict[str, Sequence[Any]]): The ledger entries, as
+        dictionaries, as tuples following `columns`, or as a dictionary of columns.
+          columns (list[str] | None): The `Ledger` attribute names of the values in tuple rows. Defaults
+        to None
+          batch_size (int): The number of entries sent to the database at a time. Defaults to 10000
+          import_progress (Optional[LedgerImport]): The progress of a file import, saved in the same
+        transaction as the entries. Defaults to None
+
+        Returns:
+          A dictionary with the `ids` of the inserted entries, the number of `rows` inserted, the
+        `seconds` taken and the `rows_per_second`, or None if the insertion failed.
+        """
+        return super().bulk_insert_records(
+            model_class=Ledger,
+            rows=rows,
+            columns=columns,
+            batch_size=batch_size,
+            merge_records=[import_progress] if import_progress != None else None,
+        )
+
     def read_ledger_info(
         self,
         ledger_class: SQLModel = Ledger,
@@ -108,6 +285,8 @@ class LedgerDB(DB):
         where_and_to: dict[str, Any] | None = None,
         fetch_mode: Literal["all", "one", "many"] | None = "all",
         how_many: int | None = 10,
+        order_by: str | list[str] | None = None,
+        offset: int | None = None,
     ) -> list[Type[Ledger]] | Type[Ledger] | None:
         """
         This function reads ledger information from a SQL database using specified parameters.
@@ -118,7 +297,8 @@ class LedgerDB(DB):
             where_and_to (dict[str, Any] | None): `where_and_to` is a dictionary that specifies the
                 conditions to filter the records in the database. The keys of the dictionary represent the
                 column names and the values represent the values to filter by. For example, if you want to
-                filter by the `name` column and only retrieve records where the name
+                filter by the `name` column and only retrieve records where the name. Ranges, `IN` lists,
+                prefixes and `$or` groups are supported too, e.g. `{"amount__gte": 100, "tag": "DEBIT"}`.
             fetch_mode (Literal["all", "one", "many"] | None): The `fetch_mode` parameter specifies how
                 many records should be fetched from the database. It can have one of the following values:.
                 Defaults to all
@@ -126,6 +306,9 @@ class LedgerDB(DB):
                 maximum number of records to fetch from the database. If `how_many` is not provided or is set to
                 `None`, the function will fetch all records that match the specified criteria. If `how_many` is
                 provided, the function. Defaults to 10
+            order_by (str | list[str] | None): The attribute name(s) to sort on, prefixed with "-" for
+                a descending order. Defaults to None
+            offset (int | None): The number of matching records to skip. Defaults to None
 
         Returns:
             The `read_ledger_info` function is returning the result of calling the `read_records` method
@@ -138,15 +321,104 @@ class LedgerDB(DB):
             where_and_to=where_and_to,
             fetch_mode=fetch_mode,
             how_many=how_many,
+            order_by=order_by,
+            offset=offset,
+        )
+
+    def iter_ledger_info(
+        self,
+        ledger_class: SQLModel = Ledger,
+        *,
+        where_and_to: dict[str, Any] | None = None,
+        chunk_size: int = 1000,
+    ) -> Iterator[Ledger]:
+        """
+        This function streams ledger information from the database in constant memory, see
+        `DB.iter_records`.
+
+        Args:
+            ledger_class (SQLModel): The model class to use for reading ledger information. By default, it
+        is set to `Ledger`.
+            where_and_to (dict[str, Any] | None): A dictionary of equality conditions to filter the
+                records, the same as in `read_ledger_info`. Defaults to None
+            chunk_size (int): The number of rows fetched from the database at a time. Defaults to 1000
+
+        Returns:
+            A generator yielding the matching `Ledger` records one at a time.
+        """
+        return super().iter_records(
+            model_class=ledger_class,
+            where_and_to=where_and_to,
+            chunk_size=chunk_size,
         )
 
+    def read_ledger_page(
+        self,
+        ledger_class: SQLModel = Ledger,
+        *,
+        after_key: tuple | None = None,
+        before_key: tuple | None = None,
+        limit: int = 10,
+        order_by: Literal["id", "transaction_noted_on"] = "id",
+        where_and_to: dict[str, Any] | None = None,
+        with_total: bool = False,
+    ) -> dict[str, Any]:
+        """
+        This function reads one page of ledger information using keyset pagination, see
+        `DB.read_page`.
+
+        Args:
+            ledger_class (SQLModel): The model class to use for reading ledger information. By default, it
+        is set to `Ledger`.
+            after_key (tuple | None): The `next_key` of the previous page. Defaults to None
+            before_key (tuple | None): The `prev_key` of the previous page, to move backward. Defaults to
+                None
+            limit (int): The maximum number of records in the page. Defaults to 10
+            order_by (Literal["id", "transaction_noted_on"]): The indexed attribute the pages are ordered
+                by. Defaults to id
+            where_and_to (dict[str, Any] | None): A dictionary of equality conditions to filter the
+                records, the same as in `read_ledger_info`. Defaults to None
+            with_total (bool): Whether to also return an estimate of the total number of records.
+                Defaults to False
+
+        Returns:
+            A dictionary with the `records` of the page, the `next_key` and `prev_key` cursors and the
+            `total_estimate`.
+        """
+        return super().read_page(
+            model_class=ledger_class,
+            after_key=after_key,
+            before_key=before_key,
+            limit=limit,
+            order_by=order_by,
+            where_and_to=where_and_to,
+            with_total=with_total,
+        )
+
+    def count_ledger_info(self) -> int:
+        """
+        This function returns the exact number of ledger entries, read from the `LedgerRollup` table
+        instead of counting every ledger row.
+
+        Returns:
+          the number of entries in the ledger.
+        """
+        ((transactions, _),) = self.aggregate_records(
+            model_class=LedgerRollup,
+            group_by=[],
+            sum_of="amount",
+            count_of="transactions",
+        )
+        return transactions
+
     def update_ledger_info(
         self,
         *,
         ledger_class: SQLModel = Ledger,
         where_and_to: dict[str, Any],
         with_what: dict[str, Any],
-    ) -> None:
+        where_clauses: Optional[list[Any]] = None,
+    ) -> Optional[int]:
         """
         This function updates records in a ledger table using the provided parameters.
 
@@ -159,14 +431,17 @@ class LedgerDB(DB):
         the `id` column is equal to 1, we
           with_what (dict[str, Any]): `with_what` is a dictionary containing the key-value pairs of the
         fields and their updated values that need to be updated in the database table.
+          where_clauses (Optional[list[Any]]): Extra SQL expressions (e.g. date range predicates) that
+        narrow down the records to be updated. Defaults to None
 
         Returns:
-          `None`.
+          the number of records updated, or None if the update failed.
         """
         return super().update_records(
             model_class=ledger_class,
             where_and_to=where_and_to,
             with_what=with_what,
+            where_clauses=where_clauses,
         )
 
     def delete_ledger_records(
@@ -174,7 +449,10 @@ class LedgerDB(DB):
         *,
         ledger_class: SQLModel = Ledger,
         where_and_to: dict[str, Any],
-    ) -> bool:
+        delete_mode: Literal["all", "one"] = "one",
+        where_clauses: Optional[list[Any]] = None,
+        batch_size: int = 500,
+    ) -> Optional[int]:
         """
         This function deletes ledger records based on a given where clause.
 
@@ -183,89 +461,346 @@ class LedgerDB(DB):
         table in the database where ledger records are stored. It is used to specify which table to
         delete records from.
           where_and_to (dict[str, Any]): where_and_to is a dictionary that contains the conditions to
-        filter the records to be deleted and the values to update in the remaining records after the
-        deletion. The keys of the dictionary represent the column names and the values represent the
-        values to be matched or updated. For example, if we want to delete all
+        filter the records to be deleted. The keys of the dictionary represent the column names and the
+        values represent the values to be matched, a list of values (e.g. ids) matching any of them.
+          delete_mode (Literal["all", "one"]): Whether every matching record or only the first one is
+        deleted. Defaults to one
+          where_clauses (Optional[list[Any]]): Extra SQL expressions (e.g. date range predicates) that
+        narrow down the records to be deleted. Defaults to None
+          batch_size (int): The maximum number of values of a list condition bound in one `DELETE`
+        statement. Defaults to 500
 
         Returns:
-          a boolean value indicating whether the deletion of ledger records was successful or not.
+          the number of ledger records deleted, or None if the deletion failed.
         """
         return super().delete_records(
             model_class=ledger_class,
             where_and_to=where_and_to,
+            delete_mode=delete_mode,
+            where_clauses=where_clauses,
+            batch_size=batch_size,
         )
 
-    def summary(self) -> dict:
+    def summary(
+        self,
+        *,
+        from_: Optional[datetime.date] = None,
+        to_: Optional[datetime.date] = None,
+        bucket: Optional[Literal["day", "week", "month", "year"]] = None,
+    ) -> dict:
         """
         The function summarizes ledger information by calculating total transactions, total credit and
         debit amounts, and amounts credited and debited by each person.
 
+        Everything is derived from a single `GROUP BY from_person, to_person, tag` query over the
+        `LedgerRollup` table, so the work done is proportional to the number of distinct
+        counterparties per day and not to the number of ledger entries. The date range and the
+        bucketing are pushed down into the same query.
+
         Args:
-          from_ (datetime.date): The start date for the summary period, represented as a datetime.date
-        object.
-          to_ (datetime.date): The `to_` parameter is a `datetime.date` object representing the end date
-        of the time period for which the summary is being generated.
+          from_ (Optional[datetime.date]): The start date (inclusive) for the summary period. Defaults
+        to None, which means from the very first entry.
+          to_ (Optional[datetime.date]): The end date (inclusive) for the summary period. Defaults to
+        None, which means up to the latest entry.
+          bucket (Optional[Literal["day", "week", "month", "year"]]): When given, the summary is also
+        split into periods of `transaction_noted_on`, available under the `buckets` key. Defaults to
+        None
 
         Returns:
           A dictionary containing various summary information about the ledger transactions, such as
-        total number of transactions, total credit and debit amounts, names of people who made
-        transactions, and amounts credited and debited by each person.
+        total number of transactions, the number of credit and debit transactions (`total_credit`,
+        `total_debit`) and their amounts (`credit_amount`, `debit_amount`), names of people who made
+        transactions, and amounts credited and debited by each person. With `bucket`, the `buckets`
+        key maps each period label (e.g. "2023-04", or the date of the monday for a week) to a
+        dictionary of the same shape for that period.
         """
-        total_transactions: int = 0
-        total_credit: float = 0.0
-        total_debit: float = 0.0
-        from_whom_names: set[str] = ""
-        to_whom_names: set[str] = ""
-        amount_credited_by: list[dict[str, float]] = []
-        amount_debited_by: list[dict[str, float]] = []
-
-        # read everything about ledger from the database
-        result: list[Ledger] = self.read_ledger_info()
-        total_transactions = len([x.id for x in result])
-        total_credit = len(self.read_ledger_info(where_and_to={"tag": "CREDIT"}))
-        total_debit = len(self.read_ledger_info(where_and_to={"tag": "DEBIT"}))
-        from_whom_names = set(x.from_person for x in result)
-        to_whom_names = set(x.to_person for x in result)
-
-        set_of_froms = set(from_whom_names)
-
-        # The above code is initializing two empty lists `amount_credited_by` and `amount_debited_by`
-        # and then iterating over a set of names `set_of_froms`. For each name in the set, it is
-        # adding a dictionary with the name as key and 0.0 as value to both `amount_credited_by` and
-        # `amount_debited_by`.
-        # The above code is iterating over a set of values called `set_of_froms` using a `for` loop.
-        # For each value in the set, the loop assigns the value to the variable `name` and executes
-        # the code block that follows the colon.
-        for name in set_of_froms:
-            amount_credited_by.append({name: 0.0})
-            amount_debited_by.append({name: 0.0})
-
-        for name in set_of_froms:
-            for users in amount_credited_by:
-                users[name] = sum(
-                    [
-                        x.amount
-                        for x in self.read_ledger_info(
-                            where_and_to={"from_person": name, "tag": "CREDIT"}
-                        )
-                    ]
-                )
-            for users in amount_debited_by:
-                users[name] = sum(
-                    [
-                        x.amount
-                        for x in self.read_ledger_info(
-                            where_and_to={"from_person": name, "tag": "DEBIT"}
-                        )
-                    ]
+        groups = self.aggregate_records(
+            **self._summary_query(from_=from_, to_=to_, bucket=bucket)
+        )
+        return self._summary_of(groups, bucket)
+
+    @staticmethod
+    def _summary_query(
+        *,
+        from_: Optional[datetime.date],
+        to_: Optional[datetime.date],
+        bucket: Optional[str],
+    ) -> dict[str, Any]:
+        """Returns the `aggregate_records` arguments of a `summary` call."""
+        where_clauses: list[Any] = []
+        if from_ != None:
+            where_clauses.append(LedgerRollup.transaction_noted_on >= from_)
+        if to_ != None:
+            where_clauses.append(LedgerRollup.transaction_noted_on <= to_)
+
+        group_by: list[Any] = ["from_person", "to_person", "tag"]
+        if bucket != None:
+            if bucket not in SUMMARY_BUCKETS:
+                raise ValueError(
+                    f"Unknown bucket {bucket!r}, expected one of {list(SUMMARY_BUCKETS)}"
                 )
+            date_format, *modifiers = SUMMARY_BUCKETS[bucket]
+            group_by.insert(
+                0,
+                func.strftime(
+                    date_format, LedgerRollup.transaction_noted_on, *modifiers
+                ),
+            )
+
+        return {
+            "model_class": LedgerRollup,
+            "group_by": group_by,
+            "sum_of": "amount",
+            "count_of": "transactions",
+            "where_clauses": where_clauses,
+        }
+
+    @classmethod
+    def _summary_of(cls, groups: list[tuple], bucket: Optional[str]) -> dict:
+        """Folds the group rows of the `summary` query into the summary dictionary."""
+        if bucket == None:
+            return cls._summarize_groups(groups)
+
+        periods: dict[str, list[tuple]] = {}
+        for period, *group in groups:
+            periods.setdefault(period, []).append(tuple(group))
+        summary = cls._summarize_groups(
+            [group for period_groups in periods.values() for group in period_groups]
+        )
+        summary["buckets"] = {
+            period: cls._summarize_groups(periods[period]) for period in sorted(periods)
+        }
+        return summary
+
+    @staticmethod
+    def _summarize_groups(groups: list[tuple]) -> dict:
+        """
+        Folds `(from_person, to_person, tag, count, amount)` group rows into the summary dictionary
+        returned by `summary`.
+        """
+        total_transactions: int = 0
+        total_credit: int = 0
+        total_debit: int = 0
+        credit_amount: float = 0.0
+        debit_amount: float = 0.0
+        from_whom_names: set[str] = set()
+        to_whom_names: set[str] = set()
+        credited_by: dict[str, float] = {}
+        debited_by: dict[str, float] = {}
+
+        for from_person, to_person, tag, count, amount in groups:
+            total_transactions += count
+            from_whom_names.add(from_person)
+            to_whom_names.add(to_person)
+            credited_by.setdefault(from_person, 0.0)
+            debited_by.setdefault(from_person, 0.0)
+            if tag == "CREDIT":
+                total_credit += count
+                credit_amount += amount
+                credited_by[from_person] += amount
+            elif tag == "DEBIT":
+                total_debit += count
+                debit_amount += amount
+                debited_by[from_person] += amount
 
         return {
             "total_transactions": total_transactions,
             "total_credit": total_credit,
             "total_debit": total_debit,
+            "credit_amount": credit_amount,
+            "debit_amount": debit_amount,
             "from_whom_names": from_whom_names,
             "to_whom_names": to_whom_names,
-            "amount_credited_by": amount_credited_by,
-            "amount_debited_by": amount_debited_by,
+            "amount_credited_by": [
+                {name: amount} for name, amount in credited_by.items()
+            ],
+            "amount_debited_by": [
+                {name: amount} for name, amount in debited_by.items()
+            ],
         }
+
+    def rebuild_rollup(self) -> bool:
+        """
+        This function recomputes the `LedgerRollup` table from the raw `Ledger` rows in a single
+        transaction, e.g. after the ledger file was modified outside of `LedgerDB`.
+
+        Returns:
+          a boolean value indicating whether the rollup was rebuilt successfully or not.
+        """
+        keys: list[Any] = [getattr(Ledger, key) for key in ROLLUP_KEYS]
+        try:
+            with Session(self.engine) as session:
+                logger.info("Session@ROLLUP: Rebuilding the rollup table")
+                session.execute(delete(LedgerRollup))
+                session.execute(
+                    insert(LedgerRollup).from_select(
+                        [*ROLLUP_KEYS, "transactions", "amount"],
+                        select(
+                            *keys,
+                            func.count(),
+                            func.coalesce(func.sum(Ledger.amount), 0.0),
+                        ).group_by(*keys),
+                    )
+                )
+                session.commit()
+                return True
+        except Exception as e:
+            logger.error("Session@ROLLUP: Unable to rebuild the rollup table: %s", e)
+            return False
+
+    def check_rollup(self) -> list[dict[str, Any]]:
+        """
+        This function compares the `LedgerRollup` table against a fresh aggregation of the raw
+        `Ledger` rows.
+
+        Returns:
+          a list with one dictionary per inconsistent rollup key, holding the `key`, the `expected`
+        (transactions, amount) computed from the ledger and the `found` one stored in the rollup. An
+        empty list means the rollup is consistent.
+        """
+        expected: dict[tuple, tuple] = {
+            tuple(key): (count, amount)
+            for *key, count, amount in self.aggregate_records(
+                model_class=Ledger, group_by=list(ROLLUP_KEYS), sum_of="amount"
+            )
+        }
+        found: dict[tuple, tuple] = {
+            tuple(key): (count, amount)
+            for *key, count, amount in self.aggregate_records(
+                model_class=LedgerRollup,
+                group_by=list(ROLLUP_KEYS),
+                sum_of="amount",
+                count_of="transactions",
+            )
+        }
+        mismatches: list[dict[str, Any]] = []
+        for key in sorted(set(expected) | set(found)):
+            expected_count, expected_amount = expected.get(key, (0, 0.0))
+            found_count, found_amount = found.get(key, (0, 0.0))
+            if (expected_count != found_count) or (
+                abs(expected_amount - found_amount) > 1e-6
+            ):
+                mismatches.append(
+                    {
+                        "key": dict(zip(ROLLUP_KEYS, key)),
+                        "expected": (expected_count, expected_amount),
+                        "found": (found_count, found_amount),
+                    }
+                )
+        logger.info("LedgerDB@ROLLUP: %s inconsistent rollup key(s)", len(mismatches))
+        return mismatches
+
+    def _rollup_groups(self, session: Session, where_clauses: list[Any]) -> list[tuple]:
+        """
+        Aggregates the `Ledger` rows matching `where_clauses` per rollup key, inside `session`.
+        """
+        keys: list[Any] = [getattr(Ledger, key) for key in ROLLUP_KEYS]
+        statement = (
+            select(*keys, func.count(), func.coalesce(func.sum(Ledger.amount), 0.0))
+            .where(*where_clauses)
+            .group_by(*keys)
+        )
+        return session.exec(statement).all()
+
+    def _apply_rollup_deltas(
+        self, session: Session, deltas: dict[tuple, list[float]]
+    ) -> None:
+        """
+        Adds the given `{rollup key: [transactions, amount]}` deltas to `LedgerRollup` with one
+        batched upsert, and drops the keys left without any transaction. Only the keys whose count
+        went down can be left empty, so only those are checked, by primary key: the cost of a write
+        does not depend on the size of the rollup table.
+        """
+        deltas = {key: delta for key, delta in deltas.items() if delta != [0, 0.0]}
+        if len(deltas) == 0:
+            return
+        statement = sqlite_insert(LedgerRollup)
+        statement = statement.on_conflict_do_update(
+            index_elements=list(ROLLUP_KEYS),
+            set_={
+                "transactions": LedgerRollup.transactions
+                + statement.excluded.transactions,
+                "amount": LedgerRollup.amount + statement.excluded.amount,
+            },
+        )
+        session.execute(
+            statement,
+            [
+                {
+                    **dict(zip(ROLLUP_KEYS, key)),
+                    "transactions": transactions,
+                    "amount": amount,
+                }
+                for key, (transactions, amount) in deltas.items()
+            ],
+        )
+        shrunk: list[dict[str, Any]] = [
+            {f"key_{name}": value for name, value in zip(ROLLUP_KEYS, key)}
+            for key, (transactions, _) in deltas.items()
+            if transactions < 0
+        ]
+        if len(shrunk) > 0:
+            table = LedgerRollup.__table__
+            session.connection().execute(
+                table.delete()
+                .where(
+                    *[table.c[name] == bindparam(f"key_{name}") for name in ROLLUP_KEYS]
+                )
+                .where(table.c.transactions <= 0),
+                shrunk,
+            )
+        logger.debug("Session@ROLLUP: Applied %s rollup delta(s)", len(deltas))
+
+    def _track_insert(
+        self, session: Session, model_class: SQLModel, rows: list[dict[str, Any]]
+    ) -> None:
+        if model_class is not Ledger:
+            return
+        deltas: dict[tuple, list[float]] = {}
+        for row in rows:
+            delta = deltas.setdefault(tuple(row[key] for key in ROLLUP_KEYS), [0, 0.0])
+            delta[0] += 1
+            delta[1] += float(row["amount"])
+        self._apply_rollup_deltas(session, deltas)
+
+    def _track_update(
+        self,
+        session: Session,
+        model_class: SQLModel,
+        where_clauses: list[Any],
+        with_what: dict[str, Any],
+    ) -> None:
+        if (model_class is not Ledger) or not (
+            set(with_what) & {*ROLLUP_KEYS, "amount"}
+        ):
+            return
+        # every matching row moves from its old key to the key rewritten by `with_what`
+        deltas: dict[tuple, list[float]] = {}
+        for *key, count, amount in self._rollup_groups(session, where_clauses):
+            old = deltas.setdefault(tuple(key), [0, 0.0])
+            old[0] -= count
+            old[1] -= amount
+            new = deltas.setdefault(
+                tuple(
+                    with_what.get(name, value) for name, value in zip(ROLLUP_KEYS, key)
+                ),
+                [0, 0.0],
+            )
+            new[0] += count
+            new[1] += (
+                count * float(with_what["amount"]) if "amount" in with_what else amount
+            )
+        self._apply_rollup_deltas(session, deltas)
+
+    def _track_delete(
+        self, session: Session, model_class: SQLModel, where_clauses: list[Any]
+    ) -> None:
+        if model_class is not Ledger:
+            return
+        self._apply_rollup_deltas(
+            session,
+            {
+                tuple(key): [-count, -amount]
+                for *key, count, amount in self._rollup_groups(session, where_clauses)
+            },
+        )
@@ -1,5 +1,8 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import flet as ft
 import math
+import threading
 
 from simple_ledger import flet_logger, Logger
 from simple_ledger.db import Ledger, LedgerDB
@@ -267,9 +270,123 @@ using the following attributes:
     - `datatable`
     - `datarows`
     - `datacolumns`
+
+Instead of handing over every row up front, a data source (e.g. `LedgerDataSource`) can be given;
+the table then only asks it for the rows of the page being displayed.
 """
 
 
+class LedgerDataSource:
+    """
+    A data source for `PaginatedDataTable` which reads only the requested page of the ledger from the
+    database (using keyset pagination), keeps the most recently viewed pages in a bounded LRU cache
+    and prefetches the following page in a background thread.
+
+    Any object with the same `num_rows`, `get_rows` and `invalidate` methods can be used as a data
+    source.
+    """
+
+    DEFAULT_CACHED_PAGES = 16
+
+    def __init__(
+        self,
+        database: LedgerDB,
+        cached_pages: int = DEFAULT_CACHED_PAGES,
+        prefetch: bool = True,
+    ) -> None:
+        """
+        :parameter database: the LedgerDB to read the ledger from
+        :parameter cached_pages: the maximum number of pages kept in the LRU cache
+        :parameter prefetch: whether to load the next page in the background
+        """
+        self.database = database
+        self.cached_pages = cached_pages
+        self.prefetch = prefetch
+
+        self._lock = threading.Lock()
+        # (page, rows_per_page) -> records, the most recently used page last
+        self._pages: OrderedDict[tuple[int, int], list[Ledger]] = OrderedDict()
+        # (page, rows_per_page) -> key of the last record of the previous page
+        self._page_keys: dict[tuple[int, int], tuple | None] = {}
+        self._num_rows: int | None = None
+        # bumped by `invalidate`: a page read before it is returned but never cached
+        self._generation = 0
+        self._prefetcher = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="LedgerDataSource"
+        )
+
+    def num_rows(self) -> int:
+        """Returns the number of rows in the ledger (cached until `invalidate` is called)"""
+        if self._num_rows is None:
+            self._num_rows = self.database.count_ledger_info()
+        return self._num_rows
+
+    def invalidate(self) -> None:
+        """Forgets the cached pages and row count, e.g. after the ledger was changed"""
+        with self._lock:
+            self._generation += 1
+            self._pages.clear()
+            self._page_keys.clear()
+            self._num_rows = None
+
+    def get_rows(self, page: int, rows_per_page: int) -> list[ft.DataRow]:
+        """
+        Returns the rows of the given (1 based) page and schedules the prefetch of the next one.
+
+        :parameter page: the page number
+        :parameter rows_per_page: the number of rows on each page
+        """
+        records = self._get_page(page, rows_per_page)
+        if self.prefetch and (page * rows_per_page < self.num_rows()):
+            self._prefetcher.submit(self._get_page, page + 1, rows_per_page)
+        return [self.build_row(record) for record in records]
+
+    def build_row(self, record: Ledger) -> ft.DataRow:
+        """Builds the DataRow displayed for a ledger record"""
+        return ft.DataRow(
+            cells=[
+                ft.DataCell(ft.Text(value=str(record.id))),
+                ft.DataCell(ft.Text(value=str(record.from_person))),
+                ft.DataCell(ft.Text(value=str(record.to_person))),
+                ft.DataCell(ft.Text(value=str(record.amount))),
+                ft.DataCell(ft.Text(value=str(record.tag))),
+            ]
+        )
+
+    def _get_page(self, page: int, rows_per_page: int) -> list[Ledger]:
+        cache_key = (page, rows_per_page)
+        with self._lock:
+            if cache_key in self._pages:
+                self._pages.move_to_end(cache_key)
+                return self._pages[cache_key]
+            generation = self._generation
+            known = cache_key in self._page_keys
+            after_key = self._page_keys.get(cache_key)
+
+        if page <= 1:
+            after_key = None
+        elif not known:
+            # jumping to a page never visited: seek the key of the last record of the previous page
+            after_key = self.database.key_at(
+                model_class=Ledger, position=(page - 1) * rows_per_page - 1
+            )
+        result = self.database.read_ledger_page(
+            after_key=after_key, limit=rows_per_page
+        )
+
+        with self._lock:
+            if generation != self._generation:
+                # the ledger changed while the page was read (e.g. a prefetch racing `invalidate`)
+                return result["records"]
+            self._pages[cache_key] = result["records"]
+            self._pages.move_to_end(cache_key)
+            while len(self._pages) > self.cached_pages:
+                self._pages.popitem(last=False)
+            if result["next_key"] is not None:
+                self._page_keys[(page + 1, rows_per_page)] = result["next_key"]
+        return result["records"]
+
+
 class PaginatedDataTable(ft.UserControl):
     # a default number of rows per page to be used in the data table
     DEFAULT_ROW_PER_PAGE = 5
@@ -279,6 +396,7 @@ class PaginatedDataTable(ft.UserControl):
         datatable: ft.DataTable,
         table_title: str = "Default Title",
         rows_per_page: int = DEFAULT_ROW_PER_PAGE,
+        data_source: LedgerDataSource | None = None,
     ):
         """
         A customized user control which returns a paginated data table. It offers the possibility to organize data
@@ -287,15 +405,20 @@ class PaginatedDataTable(ft.UserControl):
         :parameter datatable: a DataTable object to be used
         :parameter table_title: the title of the table
         :parameter rows_per_page: the number of rows to be shown per page
+        :parameter data_source: an object providing the rows page by page (e.g. a `LedgerDataSource`);
+            when given, the rows of `datatable` are ignored and only the displayed page is loaded
         """
         super().__init__()
 
         self.dt = datatable
         self.title = table_title
         self.rows_per_page = rows_per_page
+        self.data_source = data_source
 
         # number of rows in the table
-        self.num_rows = len(datatable.rows)
+        self.num_rows = (
+            len(datatable.rows) if data_source is None else data_source.num_rows()
+        )
         self.current_page = 1
 
         # Calculating the number of pages.
@@ -360,6 +483,13 @@ class PaginatedDataTable(ft.UserControl):
         return self.dt.rows
 
     def refresh_button(self, e: ft.ControlEvent):
+        if self.data_source is not None:
+            # re-read the row count and drop the cached pages
+            self.data_source.invalidate()
+            self.num_rows = self.data_source.num_rows()
+            p_int, p_add = divmod(self.num_rows, self.rows_per_page)
+            self.num_pages = p_int + (1 if p_add else 0)
+            self.current_page = min(self.current_page, max(self.num_pages, 1))
         self.refresh_data()
 
     def set_rows_per_page(self, new_row_per_page: str):
@@ -432,8 +562,11 @@ class PaginatedDataTable(ft.UserControl):
     def build_rows(self) -> list:
         """
         Returns a slice of indexes, using the start and end values returned by the paginate() function
+        (or asks the data source for the current page)
         :return: The rows of data that are being displayed on the page.
         """
+        if self.data_source is not None:
+            return self.data_source.get_rows(self.current_page, self.rows_per_page)
         return self.dt.rows[slice(*self.paginate())]
 
     def paginate(self) -> tuple[int, int]:
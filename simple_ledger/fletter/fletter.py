@@ -12,7 +12,7 @@ def main(page: ft.Page):
         +-- Update Entry
         +-- Summary (Data Table)
     """
-    database = LedgerDB()  # creating database
+    database = LedgerDB(write_behind=True)  # creating database
     # configuring pages
     page.title = "PyLedger"
     page.theme_mode = ft.ThemeMode.DARK
@@ -52,29 +52,38 @@ def main(page: ft.Page):
                 amount=float(secondary_column_amount.value),
                 tag=secondary_column_tag.value.upper(),
             )
-            database.add_ledger_info(ledger=entry)
-            secondary_column_entry_added.value = f"Added Entry"
+            # committed by the writer thread, the status and the table follow once it is
+            database.submit_ledger_info(ledger=entry).add_done_callback(entry_committed)
+            secondary_column_entry_added.value = f"Adding Entry"
             secondary_column_from.value = ""
             secondary_column_to.value = ""
             secondary_column_amount.value = ""
             secondary_column_description.value = ""
             secondary_column_tag.value = ""
-            required_data = []
+            page.update()
 
-            for data in database.read_ledger_info():
-                required_data.append(
-                    ft.DataRow(
-                        cells=[
-                            ft.DataCell(ft.Text(value=str(data.id))),
-                            ft.DataCell(ft.Text(value=str(data.from_person))),
-                            ft.DataCell(ft.Text(value=str(data.to_person))),
-                            ft.DataCell(ft.Text(value=str(data.amount))),
-                            ft.DataCell(ft.Text(value=str(data.tag))),
-                        ]
-                    )
+    def entry_committed(future):
+        if future.exception() == None and future.result():
+            secondary_column_entry_added.value = f"Added Entry"
+        else:
+            secondary_column_entry_added.value = f"Entry Not Added"
+        required_data = []
+
+        for data in database.read_ledger_info():
+            required_data.append(
+                ft.DataRow(
+                    cells=[
+                        ft.DataCell(ft.Text(value=str(data.id))),
+                        ft.DataCell(ft.Text(value=str(data.from_person))),
+                        ft.DataCell(ft.Text(value=str(data.to_person))),
+                        ft.DataCell(ft.Text(value=str(data.amount))),
+                        ft.DataCell(ft.Text(value=str(data.tag))),
+                    ]
                 )
+            )
 
-            page.update()
+        data_table.rows = required_data
+        page.update()
 
     secondary_column_button_to_add_entry = ft.ElevatedButton(
         text="Add Entry", on_click=add_entry
@@ -2,30 +2,18 @@ import flet as ft
 
 from simple_ledger.db import Ledger, LedgerDB
 
-from simple_ledger.fletter.controls import PaginatedDataTable
+from simple_ledger.fletter.controls import LedgerDataSource, PaginatedDataTable
 
 
 def main(page: ft.Page):
-    database = LedgerDB()  # creating database
+    database = LedgerDB(write_behind=True)  # creating database
     # configuring pages
     page.title = "PyLedger"
     page.theme_mode = ft.ThemeMode.DARK
 
     # !-- Tab ONE
-    required_data = []
-
-    for data in database.read_ledger_info():
-        required_data.append(
-            ft.DataRow(
-                cells=[
-                    ft.DataCell(ft.Text(value=str(data.id))),
-                    ft.DataCell(ft.Text(value=str(data.from_person))),
-                    ft.DataCell(ft.Text(value=str(data.to_person))),
-                    ft.DataCell(ft.Text(value=str(data.amount))),
-                    ft.DataCell(ft.Text(value=str(data.tag))),
-                ]
-            )
-        )
+    # rows are read from the database page by page, only when they are displayed
+    data_source = LedgerDataSource(database)
 
     data_table: ft.DataTable = ft.DataTable(
         columns=[
@@ -35,12 +23,14 @@ def main(page: ft.Page):
             ft.DataColumn(label=ft.Text("Amount"), numeric=True),
             ft.DataColumn(label=ft.Text("Mode")),
         ],
-        rows=required_data,
         expand=True,
     )
 
     paginated_data_table = PaginatedDataTable(
-        datatable=data_table, table_title="Summary", rows_per_page=10
+        datatable=data_table,
+        table_title="Summary",
+        rows_per_page=10,
+        data_source=data_source,
     )
 
     summary_tab = ft.Column(
@@ -79,7 +69,10 @@ def main(page: ft.Page):
                 amount=float(secondary_column_amount.value),
                 tag=secondary_column_tag.value.upper(),
             )
-            database.add_ledger_info(ledger=entry)
+            # committed by the writer thread, the table shows it once it is
+            database.submit_ledger_info(ledger=entry).add_done_callback(
+                lambda future: data_source.invalidate()
+            )
             secondary_column_from.value = ""
             secondary_column_to.value = ""
             secondary_column_amount.value = ""
@@ -0,0 +1,282 @@
+"""
+Columnar, in-memory snapshot of the ledger (`LedgerFrame`) for fast ad-hoc analysis with NumPy
+"""
+import datetime
+from typing import Any, Literal, Optional, Union
+
+try:
+    import numpy as np
+except ImportError as e:
+    raise ImportError(
+        "LedgerFrame needs numpy, install it with the `frame` extra: "
+        "`pip install simple-ledger[frame]`"
+    ) from e
+
+from sqlmodel import Integer, cast, func
+from simple_ledger.db import Ledger, LedgerDB
+from simple_ledger._db import logger
+
+GroupKey = Literal["from_person", "to_person", "tag", "day", "week", "month", "year"]
+
+# SQLite's julian day number of 1970-01-01, used to read dates as days since the epoch
+_UNIX_EPOCH_JULIAN_DAY: float = 2440587.5
+_EPOCH: datetime.date = datetime.date(1970, 1, 1)
+
+
+class LedgerFrame:
+    """
+    A columnar snapshot of the `Ledger` table held in NumPy arrays. Persons and tags are dictionary
+    encoded: `from_person` / `to_person` / `tag` are arrays of integer codes into the `persons` /
+    `tags` arrays, which makes filtering and grouping plain vectorised array operations.
+
+    Attributes:
+        ids (np.ndarray): The ledger ids (int64).
+        days (np.ndarray): `transaction_noted_on` as days since 1970-01-01 (int32).
+        amount (np.ndarray): The amounts (float64).
+        from_person (np.ndarray): Codes into `persons` (int32).
+        to_person (np.ndarray): Codes into `persons` (int32).
+        tag (np.ndarray): Codes into `tags` (int32).
+        persons (np.ndarray): The distinct person names, shared by `from_person` and `to_person`.
+        tags (np.ndarray): The distinct tags.
+    """
+
+    def __init__(
+        self,
+        *,
+        ids: np.ndarray,
+        days: np.ndarray,
+        amount: np.ndarray,
+        from_person: np.ndarray,
+        to_person: np.ndarray,
+        tag: np.ndarray,
+        persons: np.ndarray,
+        tags: np.ndarray,
+    ) -> None:
+        self.ids = ids
+        self.days = days
+        self.amount = amount
+        self.from_person = from_person
+        self.to_person = to_person
+        self.tag = tag
+        self.persons = persons
+        self.tags = tags
+
+    @classmethod
+    def from_db(
+        cls,
+        database: LedgerDB,
+        *,
+        from_: Optional[datetime.date] = None,
+        to_: Optional[datetime.date] = None,
+        chunk_size: int = 100000,
+    ) -> "LedgerFrame":
+        """
+        Builds the frame from a single projection query over the `Ledger` table, streamed
+        `chunk_size` rows at a time. Dates are converted to day numbers by SQLite itself.
+
+        Args:
+          database (LedgerDB): The ledger database to read.
+          from_ (Optional[datetime.date]): Only load entries noted on or after this date. Defaults to
+        None
+          to_ (Optional[datetime.date]): Only load entries noted on or before this date. Defaults to
+        None
+          chunk_size (int): The number of rows converted at a time. Defaults to 100000
+
+        Returns:
+          the LedgerFrame of the (selected) ledger entries.
+        """
+        where_clauses: list[Any] = []
+        if from_ != None:
+            where_clauses.append(Ledger.transaction_noted_on >= from_)
+        if to_ != None:
+            where_clauses.append(Ledger.transaction_noted_on <= to_)
+
+        person_codes: dict[str, int] = {}
+        tag_codes: dict[str, int] = {}
+        columns: dict[str, list[np.ndarray]] = {
+            name: []
+            for name in ("ids", "days", "amount", "from_person", "to_person", "tag")
+        }
+        for chunk in database.iter_rows(
+            model_class=Ledger,
+            columns=[
+                "id",
+                cast(
+                    func.julianday(Ledger.transaction_noted_on)
+                    - _UNIX_EPOCH_JULIAN_DAY,
+                    Integer,
+                ),
+                "amount",
+                "from_person",
+                "to_person",
+                "tag",
+            ],
+            where_clauses=where_clauses,
+            chunk_size=chunk_size,
+        ):
+            ids, days, amount, from_person, to_person, tag = zip(*chunk)
+            columns["ids"].append(np.array(ids, dtype=np.int64))
+            columns["days"].append(np.array(days, dtype=np.int32))
+            columns["amount"].append(np.array(amount, dtype=np.float64))
+            for name, values, codes in (
+                ("from_person", from_person, person_codes),
+                ("to_person", to_person, person_codes),
+                ("tag", tag, tag_codes),
+            ):
+                columns[name].append(
+                    np.fromiter(
+                        [codes.setdefault(value, len(codes)) for value in values],
+                        dtype=np.int32,
+                        count=len(values),
+                    )
+                )
+
+        arrays: dict[str, np.ndarray] = {
+            name: np.concatenate(chunks)
+            if len(chunks) > 0
+            else np.array(
+                [],
+                dtype={"ids": np.int64, "amount": np.float64}.get(name, np.int32),
+            )
+            for name, chunks in columns.items()
+        }
+        logger.info("LedgerFrame@BUILD: Loaded %s entries", len(arrays["ids"]))
+        return cls(
+            **arrays,
+            persons=np.array(list(person_codes), dtype=object),
+            tags=np.array(list(tag_codes), dtype=object),
+        )
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def filter(
+        self,
+        *,
+        from_: Optional[datetime.date] = None,
+        to_: Optional[datetime.date] = None,
+        person: Optional[str] = None,
+        from_person: Optional[str] = None,
+        to_person: Optional[str] = None,
+        tag: Optional[str] = None,
+        min_amount: Optional[float] = None,
+        max_amount: Optional[float] = None,
+    ) -> "LedgerFrame":
+        """
+        Returns a new frame with the entries matching every given condition (dates and amounts are
+        inclusive, `person` matches either side of the entry). The dictionaries are shared.
+        """
+        mask = np.ones(len(self), dtype=bool)
+        if from_ != None:
+            mask &= self.days >= (from_ - _EPOCH).days
+        if to_ != None:
+            mask &= self.days <= (to_ - _EPOCH).days
+        if person != None:
+            code = self._code_of(self.persons, person)
+            mask &= (self.from_person == code) | (self.to_person == code)
+        if from_person != None:
+            mask &= self.from_person == self._code_of(self.persons, from_person)
+        if to_person != None:
+            mask &= self.to_person == self._code_of(self.persons, to_person)
+        if tag != None:
+            mask &= self.tag == self._code_of(self.tags, tag)
+        if min_amount != None:
+            mask &= self.amount >= min_amount
+        if max_amount != None:
+            mask &= self.amount <= max_amount
+        return LedgerFrame(
+            ids=self.ids[mask],
+            days=self.days[mask],
+            amount=self.amount[mask],
+            from_person=self.from_person[mask],
+            to_person=self.to_person[mask],
+            tag=self.tag[mask],
+            persons=self.persons,
+            tags=self.tags,
+        )
+
+    def aggregate(self, by: Union[GroupKey, list[GroupKey]]) -> list[tuple]:
+        """
+        Groups the entries by one or more keys and returns one row per non-empty group holding the
+        group labels (in the order of `by`) followed by the number of entries and the summed amount,
+        the same shape as `DB.aggregate_records`.
+
+        Date buckets are labelled "YYYY-MM-DD" (day), "YYYY-MM-DD" of the monday (week), "YYYY-MM"
+        (month) and "YYYY" (year).
+        """
+        keys: list[GroupKey] = [by] if type(by) == str else list(by)
+        codes: list[np.ndarray] = []
+        labels: list[np.ndarray] = []
+        for key in keys:
+            key_codes, key_labels = self._group_codes(key)
+            codes.append(key_codes)
+            labels.append(key_labels)
+        sizes: tuple[int, ...] = tuple(max(len(key_labels), 1) for key_labels in labels)
+
+        flat = np.ravel_multi_index(codes, sizes) if len(keys) > 1 else codes[0]
+        if int(np.prod(sizes, dtype=np.int64)) <= max(4 * len(self), 1 << 20):
+            # small key space: count straight into it
+            counts = np.bincount(flat, minlength=int(np.prod(sizes)))
+            sums = np.bincount(flat, weights=self.amount, minlength=len(counts))
+            groups = np.flatnonzero(counts)
+            counts, sums = counts[groups], sums[groups]
+        else:
+            groups, inverse = np.unique(flat, return_inverse=True)
+            counts = np.bincount(inverse, minlength=len(groups))
+            sums = np.bincount(inverse, weights=self.amount, minlength=len(groups))
+
+        group_codes = np.unravel_index(groups, sizes)
+        columns = [key_labels[code] for key_labels, code in zip(labels, group_codes)]
+        return list(
+            zip(
+                *[column.tolist() for column in columns], counts.tolist(), sums.tolist()
+            )
+        )
+
+    def sum_by(self, by: Union[GroupKey, list[GroupKey]]) -> dict[Any, float]:
+        """Returns the summed amount per group (keys are tuples when grouping by several keys)."""
+        return {
+            (tuple(row[:-2]) if len(row) > 3 else row[0]): row[-1]
+            for row in self.aggregate(by)
+        }
+
+    def count_by(self, by: Union[GroupKey, list[GroupKey]]) -> dict[Any, int]:
+        """Returns the number of entries per group (keys are tuples when grouping by several keys)."""
+        return {
+            (tuple(row[:-2]) if len(row) > 3 else row[0]): row[-2]
+            for row in self.aggregate(by)
+        }
+
+    def _group_codes(self, key: GroupKey) -> tuple[np.ndarray, np.ndarray]:
+        """Returns the dense group codes of every entry and the label of each code."""
+        if key == "from_person":
+            return self.from_person, self.persons
+        if key == "to_person":
+            return self.to_person, self.persons
+        if key == "tag":
+            return self.tag, self.tags
+        if key not in ("day", "week", "month", "year"):
+            raise ValueError(f"Unknown group key {key!r}")
+
+        dates = self.days.astype("datetime64[D]")
+        if key == "day":
+            buckets, unit = dates, "D"
+        elif key == "week":
+            # 1970-01-01 was a thursday, shift so that weeks start on monday
+            buckets, unit = ((self.days + 3) // 7 * 7 - 3).astype("datetime64[D]"), "D"
+        elif key == "month":
+            buckets, unit = dates.astype("datetime64[M]"), "M"
+        else:
+            buckets, unit = dates.astype("datetime64[Y]"), "Y"
+        values = buckets.astype(np.int64)
+        if len(values) == 0:
+            return values, np.array([], dtype=object)
+        first = values.min()
+        labels = np.arange(first, values.max() + 1).astype(f"datetime64[{unit}]")
+        return values - first, labels.astype(str).astype(object)
+
+    @staticmethod
+    def _code_of(dictionary: np.ndarray, value: str) -> int:
+        """Returns the code of a value (-1, which matches nothing, if it is unknown)."""
+        matches = np.flatnonzero(dictionary == value)
+        return int(matches[0]) if len(matches) > 0 else -1
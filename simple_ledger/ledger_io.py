@@ -0,0 +1,407 @@
+"""
+Streaming import of ledger entries from CSV / JSONL files (e.g. bank statements) and streaming export
+of the ledger to CSV / JSONL / Parquet files
+"""
+import csv
+import datetime
+import json
+import time
+from pathlib import Path
+from typing import Any, Callable, Iterator, Literal, Optional, Union
+from sqlmodel import or_
+from simple_ledger.db import Ledger, LedgerDB, LedgerImport
+from simple_ledger._db import logger
+
+# the `Ledger` attributes that can be imported, `id` is always assigned by the database
+LEDGER_IMPORT_FIELDS: tuple[str, ...] = (
+    "transaction_noted_on",
+    "transaction_noted_time",
+    "from_person",
+    "to_person",
+    "description",
+    "amount",
+    "tag",
+)
+
+# the `Ledger` attributes written by `export_ledger`, in order
+LEDGER_EXPORT_FIELDS: tuple[str, ...] = ("id", *LEDGER_IMPORT_FIELDS)
+
+FileFormat = Literal["csv", "jsonl"]
+ExportFormat = Literal["csv", "jsonl", "parquet"]
+
+
+def import_ledger_file(
+    database: LedgerDB,
+    path: Union[str, Path],
+    *,
+    file_format: Optional[FileFormat] = None,
+    column_map: Optional[dict[str, str]] = None,
+    batch_size: int = 5000,
+    date_format: Optional[str] = None,
+    reject_path: Union[str, Path, None] = None,
+    resume: bool = True,
+    on_progress: Optional[Callable[[dict[str, int]], None]] = None,
+) -> dict[str, Any]:
+    """
+    This function streams a CSV or JSONL file of ledger entries into the database. The file is read
+    `batch_size` entries at a time, each batch is validated and committed with
+    `LedgerDB.bulk_add_ledger_infos`, so memory use does not depend on the size of the file.
+
+    Entries that fail validation are written to a reject file (with the reason) instead of stopping
+    the import. Every batch is committed together with the progress of the import (a `LedgerImport`
+    row), so if the import is interrupted, running it again on the same (unchanged) file resumes
+    right after the last committed batch, whatever else writes to the ledger meanwhile. The progress
+    is removed once the import is done.
+
+    Args:
+      database (LedgerDB): The ledger database to import into.
+      path (Union[str, Path]): The CSV (with a header row) or JSONL (one object per line) file.
+      file_format (Optional[FileFormat]): "csv" or "jsonl". Defaults to None, which means it is
+    guessed from the file extension.
+      column_map (Optional[dict[str, str]]): Maps the columns / keys of the file to `Ledger`
+    attributes, e.g. `{"Date": "transaction_noted_on", "Payee": "to_person"}`. Columns named after a
+    `Ledger` attribute are taken as they are; other columns are ignored. Defaults to None
+      batch_size (int): The number of entries validated and committed at a time. Defaults to 5000
+      date_format (Optional[str]): The `strptime` format of `transaction_noted_on`. Defaults to None,
+    which means ISO dates (YYYY-MM-DD).
+      reject_path (Union[str, Path, None]): Where the rejected entries are written. Defaults to None,
+    which means `<path>.rejects.<format>`.
+      resume (bool): Whether to resume an interrupted import of the file. If False, the import starts
+    over. Defaults to True
+      on_progress (Optional[Callable[[dict[str, int]], None]]): Called with the running statistics
+    after every committed batch. Defaults to None
+
+    Returns:
+      a dictionary with the number of entries `read`, `imported`, `rejected` and `skipped` (already
+    imported by a previous, interrupted run), and the `reject_file` (None if nothing was rejected).
+    """
+    path = Path(path)
+    if file_format == None:
+        file_format = "jsonl" if path.suffix.lower() in (".jsonl", ".ndjson") else "csv"
+    if file_format not in ("csv", "jsonl"):
+        raise ValueError(f"Unsupported file format {file_format!r}")
+    column_map = dict(column_map or {})
+    for field in LEDGER_IMPORT_FIELDS:
+        column_map.setdefault(field, field)
+    reject_path = Path(
+        reject_path
+        if reject_path != None
+        else path.with_name(f"{path.name}.rejects.{file_format}")
+    )
+    source_stat = path.stat()
+    source: dict[str, Any] = {
+        "source": str(path.resolve()),
+        "size": source_stat.st_size,
+        "mtime": source_stat.st_mtime,
+    }
+
+    stats: dict[str, int] = {"read": 0, "imported": 0, "rejected": 0, "skipped": 0}
+    progress: Optional[LedgerImport] = (
+        _load_progress(database, source) if resume else None
+    )
+    if progress != None:
+        stats.update(
+            read=progress.read, imported=progress.imported, rejected=progress.rejected
+        )
+        stats["skipped"] = stats["read"]
+        logger.info("Import@RESUME: Resuming %s after %s entries", path, stats["read"])
+
+    with open(path, newline="", encoding="utf-8") as source_file, open(
+        reject_path, "a" if progress != None else "w", newline="", encoding="utf-8"
+    ) as reject_file:
+        if progress != None:
+            # drop the rejects of a batch that was not committed
+            reject_file.truncate(progress.rejects_size)
+            reject_file.seek(progress.rejects_size)
+        records = _read_records(source_file, file_format)
+        reject_writer = _RejectWriter(reject_file, file_format)
+        for _ in range(stats["skipped"]):
+            next(records, None)
+
+        while True:
+            batch: list[dict[str, Any]] = []
+            rejects: list[tuple[dict[str, Any], str]] = []
+            for record in records:
+                stats["read"] += 1
+                try:
+                    batch.append(
+                        _to_ledger_row(
+                            record, column_map, database.allowed_tags, date_format
+                        )
+                    )
+                except (ValueError, TypeError, KeyError) as e:
+                    rejects.append((record, str(e)))
+                if len(batch) + len(rejects) >= batch_size:
+                    break
+            if len(batch) + len(rejects) == 0:
+                break
+
+            for record, reason in rejects:
+                reject_writer.write(record, reason)
+            reject_file.flush()
+            stats["rejected"] += len(rejects)
+            stats["imported"] += len(batch)
+
+            # the progress is committed together with the batch (even a batch of rejects only), so
+            # it never points past or before the entries that made it into the ledger
+            committed = database.bulk_add_ledger_infos(
+                rows=batch,
+                import_progress=LedgerImport(
+                    **source,
+                    read=stats["read"],
+                    imported=stats["imported"],
+                    rejected=stats["rejected"],
+                    rejects_size=reject_file.tell(),
+                ),
+            )
+            if committed == None:
+                raise RuntimeError(
+                    f"Unable to commit the entries up to entry {stats['read']} of {path}, "
+                    "see the logs"
+                )
+            logger.info(
+                "Import@BATCH: %s read | %s imported | %s rejected",
+                stats["read"],
+                stats["imported"],
+                stats["rejected"],
+            )
+            if on_progress != None:
+                on_progress(dict(stats))
+
+    database.delete_ledger_records(
+        ledger_class=LedgerImport, where_and_to={"source": source["source"]}
+    )
+    if stats["rejected"] == 0:
+        reject_path.unlink(missing_ok=True)
+    return {**stats, "reject_file": reject_path if stats["rejected"] > 0 else None}
+
+
+def export_ledger(
+    database: LedgerDB,
+    path: Union[str, Path],
+    *,
+    file_format: Optional[ExportFormat] = None,
+    from_: Optional[datetime.date] = None,
+    to_: Optional[datetime.date] = None,
+    person: Optional[str] = None,
+    tag: Optional[str] = None,
+    chunk_size: int = 10000,
+) -> dict[str, Any]:
+    """
+    This function streams the `Ledger` table (optionally filtered) into a CSV, JSONL or Parquet file.
+    Rows are read from an open cursor and written `chunk_size` at a time, so exporting the whole
+    ledger uses bounded memory. Parquet needs `pyarrow` to be installed; every chunk becomes a row
+    group of the file.
+
+    Args:
+      database (LedgerDB): The ledger database to export.
+      path (Union[str, Path]): The file to write, it is overwritten if it exists.
+      file_format (Optional[ExportFormat]): "csv", "jsonl" or "parquet". Defaults to None, which means
+    it is guessed from the file extension.
+      from_ (Optional[datetime.date]): Only export entries noted on or after this date. Defaults to
+    None
+      to_ (Optional[datetime.date]): Only export entries noted on or before this date. Defaults to None
+      person (Optional[str]): Only export entries from or to this person. Defaults to None
+      tag (Optional[str]): Only export entries with this tag. Defaults to None
+      chunk_size (int): The number of rows read and written at a time. Defaults to 10000
+
+    Returns:
+      a dictionary with the number of `rows` exported, the `path` written and the `seconds` taken.
+    """
+    started: float = time.perf_counter()
+    path = Path(path)
+    if file_format == None:
+        file_format = {
+            ".jsonl": "jsonl",
+            ".ndjson": "jsonl",
+            ".parquet": "parquet",
+        }.get(path.suffix.lower(), "csv")
+    if file_format not in ("csv", "jsonl", "parquet"):
+        raise ValueError(f"Unsupported file format {file_format!r}")
+
+    where_clauses: list[Any] = []
+    if from_ != None:
+        where_clauses.append(Ledger.transaction_noted_on >= from_)
+    if to_ != None:
+        where_clauses.append(Ledger.transaction_noted_on <= to_)
+    if person != None:
+        where_clauses.append(
+            or_(Ledger.from_person == person, Ledger.to_person == person)
+        )
+    if tag != None:
+        where_clauses.append(Ledger.tag == tag.upper())
+    chunks = database.iter_rows(
+        model_class=Ledger,
+        columns=list(LEDGER_EXPORT_FIELDS),
+        where_clauses=where_clauses,
+        chunk_size=chunk_size,
+    )
+
+    logger.info("Export@%s: Exporting the ledger to %s", file_format.upper(), path)
+    if file_format == "parquet":
+        rows = _write_parquet(chunks, path)
+    else:
+        rows = 0
+        with open(path, "w", newline="", encoding="utf-8") as export_file:
+            if file_format == "csv":
+                writer = csv.writer(export_file)
+                writer.writerow(LEDGER_EXPORT_FIELDS)
+                for chunk in chunks:
+                    writer.writerows(chunk)
+                    rows += len(chunk)
+            else:
+                for chunk in chunks:
+                    export_file.write(
+                        "".join(
+                            json.dumps(
+                                dict(zip(LEDGER_EXPORT_FIELDS, row)), default=str
+                            )
+                            + "\n"
+                            for row in chunk
+                        )
+                    )
+                    rows += len(chunk)
+
+    seconds: float = time.perf_counter() - started
+    logger.info(
+        "Export@%s: Exported %s rows in %.3fs", file_format.upper(), rows, seconds
+    )
+    return {"rows": rows, "path": path, "seconds": seconds}
+
+
+def _write_parquet(chunks: Iterator[list[tuple]], path: Path) -> int:
+    """Writes every chunk of ledger rows as a row group of a Parquet file."""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise RuntimeError(
+            "Exporting to Parquet needs pyarrow, install it with `pip install pyarrow`"
+        ) from e
+
+    schema = pa.schema(
+        [
+            ("id", pa.int64()),
+            ("transaction_noted_on", pa.date32()),
+            ("transaction_noted_time", pa.time64("us")),
+            ("from_person", pa.string()),
+            ("to_person", pa.string()),
+            ("description", pa.string()),
+            ("amount", pa.float64()),
+            ("tag", pa.string()),
+        ]
+    )
+    rows = 0
+    with pq.ParquetWriter(path, schema) as writer:
+        for chunk in chunks:
+            writer.write_table(
+                pa.Table.from_arrays(
+                    [pa.array(column) for column in zip(*chunk)], schema=schema
+                )
+            )
+            rows += len(chunk)
+    return rows
+
+
+def _read_records(source_file, file_format: FileFormat) -> Iterator[dict[str, Any]]:
+    """Yields the entries of the file one at a time."""
+    if file_format == "csv":
+        yield from csv.DictReader(source_file)
+        return
+    for line in source_file:
+        if line.strip() == "":
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            record = {"_line": line.rstrip("\n"), "_invalid_json": str(e)}
+        yield record if type(record) == dict else {"_line": line.rstrip("\n")}
+
+
+def _to_ledger_row(
+    record: dict[str, Any],
+    column_map: dict[str, str],
+    allowed_tags: list[str],
+    date_format: Optional[str],
+) -> dict[str, Any]:
+    """Maps and validates one entry of the file, raising ValueError if it is not valid."""
+    if "_invalid_json" in record:
+        raise ValueError(f"invalid JSON: {record['_invalid_json']}")
+    row: dict[str, Any] = {}
+    for column, field in column_map.items():
+        value = record.get(column)
+        if (value != None) and (str(value).strip() != ""):
+            row[field] = value.strip() if type(value) == str else value
+
+    for field in ("from_person", "to_person", "amount", "tag"):
+        if field not in row:
+            raise ValueError(f"missing {field}")
+    row["from_person"] = str(row["from_person"])
+    row["to_person"] = str(row["to_person"])
+    row["description"] = str(row.get("description", ""))
+    for field, max_length in (
+        ("from_person", 30),
+        ("to_person", 30),
+        ("description", 400),
+    ):
+        if len(row[field]) > max_length:
+            raise ValueError(f"{field} is longer than {max_length} characters")
+    row["amount"] = float(row["amount"])
+    row["tag"] = str(row["tag"]).upper()
+    if row["tag"] not in allowed_tags:
+        raise ValueError(f"tag {row['tag']!r} is not one of {allowed_tags}")
+    if "transaction_noted_on" in row:
+        noted_on = str(row["transaction_noted_on"])
+        row["transaction_noted_on"] = (
+            datetime.date.fromisoformat(noted_on)
+            if date_format == None
+            else datetime.datetime.strptime(noted_on, date_format).date()
+        )
+    if "transaction_noted_time" in row:
+        row["transaction_noted_time"] = datetime.time.fromisoformat(
+            str(row["transaction_noted_time"])
+        )
+    return row
+
+
+class _RejectWriter:
+    """Writes rejected entries, with the reason, in the format of the imported file."""
+
+    def __init__(self, reject_file, file_format: FileFormat) -> None:
+        self.reject_file = reject_file
+        self.file_format = file_format
+        self.csv_writer: Optional[csv.DictWriter] = None
+
+    def write(self, record: dict[str, Any], reason: str) -> None:
+        if self.file_format == "jsonl":
+            self.reject_file.write(
+                json.dumps({**record, "_reject_reason": reason}) + "\n"
+            )
+            return
+        if self.csv_writer == None:
+            self.csv_writer = csv.DictWriter(
+                self.reject_file,
+                fieldnames=[*record.keys(), "_reject_reason"],
+                extrasaction="ignore",
+            )
+            if self.reject_file.tell() == 0:
+                self.csv_writer.writeheader()
+        self.csv_writer.writerow({**record, "_reject_reason": reason})
+
+
+def _load_progress(
+    database: LedgerDB, source: dict[str, Any]
+) -> Optional[LedgerImport]:
+    """Returns the progress of an interrupted import of the same file, if there is one."""
+    progress: Optional[LedgerImport] = database.read_ledger_info(
+        LedgerImport, where_and_to={"source": source["source"]}, fetch_mode="one"
+    )
+    if progress == None:
+        return None
+    if (progress.size != source["size"]) or (progress.mtime != source["mtime"]):
+        logger.warning(
+            "Import@RESUME: The progress of %s belongs to another version of the file, starting over",
+            source["source"],
+        )
+        return None
+    return progress
@@ -0,0 +1,49 @@
+"""
+Shared fixtures of the test suite.
+
+The configuration derives the app home (logs, databases, metrics) from HOME when it is imported, so
+HOME points to a throwaway directory before anything of `simple_ledger` is imported: the tests never
+touch the real ledger or log tree.
+"""
+import datetime
+import os
+import tempfile
+
+os.environ["HOME"] = tempfile.mkdtemp(prefix="pyledger-tests-")
+
+import pytest
+
+from simple_ledger._config import app_config
+
+# no metric snapshots from the test runs: the exit dump would log into pytest's closed streams
+app_config().APP_DB_METRICS["snapshot_file"] = None
+
+
+def entry(**overrides):
+    """The fields of a ledger entry, for `bulk_add_ledger_infos` rows or `Ledger(**entry())`."""
+    values = dict(
+        transaction_noted_on=datetime.date(2023, 5, 1),
+        transaction_noted_time=datetime.time(12, 0),
+        from_person="ana",
+        to_person="bob",
+        description="lunch",
+        amount=10.0,
+        tag="food",
+    )
+    values.update(overrides)
+    return values
+
+
+@pytest.fixture
+def ledger_db(tmp_path):
+    """A `LedgerDB` on a fresh database file of its own."""
+    from simple_ledger.db import LedgerDB
+
+    database_config = app_config().APP_DB_CONFIG
+    saved = dict(database_config)
+    database_config.update({"db_dir": tmp_path, "echo": False})
+    database = LedgerDB()
+    yield database
+    database.dispose()
+    database_config.clear()
+    database_config.update(saved)
@@ -0,0 +1,61 @@
+import threading
+
+import pytest
+
+pytest.importorskip("flet")
+
+from simple_ledger.fletter.controls import LedgerDataSource
+
+
+class FakeLedger:
+    """Serves pages labelled with the ledger's `version`; `hold` pauses the next page read."""
+
+    def __init__(self):
+        self.version = 1
+        self.reads = 0
+        self.hold = None
+        self.reading = threading.Event()
+
+    def count_ledger_info(self):
+        return 10
+
+    def key_at(self, *, model_class, position):
+        return (position,)
+
+    def read_ledger_page(self, *, after_key, limit):
+        version = self.version
+        self.reads += 1
+        self.reading.set()
+        if self.hold != None:
+            self.hold.wait()
+        return {"records": [(version, after_key)] * limit, "next_key": ("next",)}
+
+
+def test_a_page_read_before_invalidate_is_not_cached():
+    ledger = FakeLedger()
+    source = LedgerDataSource(ledger, prefetch=False)
+    ledger.hold = threading.Event()
+    prefetch = threading.Thread(target=source._get_page, args=(2, 3))
+    prefetch.start()
+    ledger.reading.wait()
+
+    ledger.version = 2
+    source.invalidate()
+    ledger.hold.set()
+    prefetch.join()
+
+    assert source._get_page(2, 3)[0][0] == 2
+    assert ledger.reads == 2
+
+
+def test_pages_are_cached_until_invalidate():
+    ledger = FakeLedger()
+    source = LedgerDataSource(ledger, prefetch=False)
+
+    source._get_page(1, 3)
+    source._get_page(1, 3)
+    assert ledger.reads == 1
+
+    source.invalidate()
+    source._get_page(1, 3)
+    assert ledger.reads == 2
@@ -0,0 +1,307 @@
+import asyncio
+import datetime
+import os
+import subprocess
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+from sqlalchemy import event
+
+from simple_ledger._config import AppConfig, app_config
+from simple_ledger.db import Ledger, LedgerDB
+from tests.conftest import entry
+
+
+@pytest.fixture
+def seeded(ledger_db):
+    ledger_db.bulk_add_ledger_infos(
+        rows=[entry(amount=1.0), entry(amount=2.0), entry(amount=3.0, tag="rent")]
+    )
+    return ledger_db
+
+
+def amounts(database):
+    return sorted(ledger.amount for ledger in database.read_ledger_info())
+
+
+def test_update_without_any_condition_is_refused(seeded):
+    assert seeded.update_ledger_info(where_and_to={}, with_what={"amount": 0.0}) == None
+    assert (
+        seeded.update_ledger_info(
+            where_and_to={}, with_what={"amount": 0.0}, where_clauses=[]
+        )
+        == None
+    )
+
+    assert amounts(seeded) == [1.0, 2.0, 3.0]
+
+
+def test_update_with_only_where_clauses(seeded):
+    updated = seeded.update_ledger_info(
+        where_and_to={}, with_what={"amount": 0.0}, where_clauses=[Ledger.amount > 1.5]
+    )
+
+    assert updated == 2
+    assert amounts(seeded) == [0.0, 0.0, 1.0]
+
+
+def test_delete_without_any_condition_is_refused(seeded):
+    assert seeded.delete_ledger_records(where_and_to={}, delete_mode="all") == None
+    assert seeded.count_ledger_info() == 3
+
+
+def test_concurrent_bulk_inserts_get_distinct_ids(ledger_db):
+    start = threading.Barrier(4)
+    results = []
+
+    def load(amount):
+        start.wait()
+        results.append(
+            ledger_db.bulk_add_ledger_infos(
+                rows=[entry(amount=amount)] * 50, batch_size=10
+            )
+        )
+
+    loaders = [threading.Thread(target=load, args=(amount,)) for amount in range(4)]
+    for loader in loaders:
+        loader.start()
+    for loader in loaders:
+        loader.join()
+
+    assert None not in results
+    ids = sorted(id for result in results for id in result["ids"])
+    assert ids == sorted(
+        ledger.id for ledger in ledger_db.read_ledger_info(how_many=None)
+    )
+    assert len(set(ids)) == 200
+
+
+def test_bulk_inserts_return_the_ids_of_their_rows(seeded):
+    columns = list(entry())
+
+    as_dicts = seeded.bulk_add_ledger_infos(
+        rows=[entry(amount=10.0), entry(id=40, amount=40.0)]
+    )
+    as_tuples = seeded.bulk_add_ledger_infos(
+        rows=[tuple(entry(amount=41.0).values())], columns=columns
+    )
+    as_columns = seeded.bulk_add_ledger_infos(
+        rows={column: [value] * 2 for column, value in entry().items()}
+        | {"amount": [50.0, 51.0]}
+    )
+
+    # missing ids follow the largest one, explicit ids are kept
+    assert (as_dicts["ids"], as_tuples["ids"], as_columns["ids"]) == (
+        [4, 40],
+        [41],
+        [42, 43],
+    )
+    assert {
+        ledger.id: ledger.amount
+        for ledger in seeded.read_ledger_info(
+            where_and_to={"id__gte": 4}, how_many=None
+        )
+    } == {4: 10.0, 40: 40.0, 41: 41.0, 42: 50.0, 43: 51.0}
+
+
+def test_async_update_without_any_condition_is_refused(seeded):
+    pytest.importorskip("aiosqlite")
+    from simple_ledger.async_db import AsyncLedgerDB
+
+    async def update():
+        async with AsyncLedgerDB(ledger=seeded) as database:
+            refused = await database.update_ledger_info(
+                where_and_to={}, with_what={"amount": 0.0}
+            )
+            updated = await database.update_ledger_info(
+                where_and_to={"tag": "rent"}, with_what={"amount": 4.0}
+            )
+            return refused, updated
+
+    assert asyncio.run(update()) == (None, 1)
+    assert amounts(seeded) == [1.0, 2.0, 4.0]
+
+
+def test_no_profile_by_default(ledger_db):
+    with ledger_db.engine.connect() as connection:
+        journal_mode = connection.exec_driver_sql("PRAGMA journal_mode").scalar()
+
+    assert ledger_db.profile == None
+    assert journal_mode == "delete"
+
+
+@pytest.fixture
+def profiled(ledger_db, monkeypatch):
+    """Makes a `LedgerDB` with one of the performance profiles, on the database of `ledger_db`."""
+    databases = []
+
+    def make(profile):
+        monkeypatch.setitem(app_config().APP_DB_CONFIG, "profile", profile)
+        databases.append(LedgerDB())
+        return databases[-1]
+
+    yield make
+    for database in databases:
+        database.dispose()
+
+
+def pragma_of(database, name):
+    with database.engine.connect() as connection:
+        return connection.exec_driver_sql(f"PRAGMA {name}").scalar()
+
+
+@pytest.mark.parametrize("profile", list(AppConfig.APP_DB_PROFILES))
+def test_profiles_set_their_pragmas_and_pool(profiled, profile):
+    settings = AppConfig.APP_DB_PROFILES[profile]
+    levels = {"OFF": 0, "NORMAL": 1, "FULL": 2, "DEFAULT": 0, "MEMORY": 2}
+
+    database = profiled(profile)
+
+    assert pragma_of(database, "journal_mode") == settings["journal_mode"].lower()
+    assert pragma_of(database, "synchronous") == levels[settings["synchronous"]]
+    assert pragma_of(database, "temp_store") == levels[settings["temp_store"]]
+    assert pragma_of(database, "cache_size") == settings["cache_size"]
+    assert pragma_of(database, "busy_timeout") == settings["busy_timeout"]
+    assert database.engine.pool.size() == settings["pool_size"]
+
+
+def test_unknown_profiles_are_refused(profiled):
+    with pytest.raises(ValueError):
+        profiled("fastest")
+
+
+def test_profile_from_the_environment(tmp_path):
+    script = "from simple_ledger._config import app_config; print(app_config().APP_DB_CONFIG['profile'])"
+    environment = dict(
+        os.environ,
+        HOME=str(tmp_path),
+        PYTHONPATH=str(Path(__file__).resolve().parent.parent),
+        PYLEDGER_DB_PROFILE="balanced",
+    )
+
+    completed = subprocess.run(
+        [sys.executable, "-c", script],
+        env=environment,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    assert completed.stdout.splitlines()[-1] == "balanced"
+
+
+@pytest.fixture
+def many(ledger_db):
+    ledger_db.bulk_add_ledger_infos(
+        rows=[
+            entry(amount=float(amount), tag="rent" if amount % 3 == 0 else "food")
+            for amount in range(25)
+        ]
+    )
+    return ledger_db
+
+
+def test_iter_ledger_info_streams_every_match(many):
+    streamed = many.iter_ledger_info(where_and_to={"tag": "rent"}, chunk_size=2)
+
+    assert [ledger.amount for ledger in streamed] == [
+        float(amount) for amount in range(0, 25, 3)
+    ]
+
+
+def test_an_abandoned_stream_releases_its_connection(many):
+    checked_out = []
+    event.listen(many.engine, "checkout", lambda *args: checked_out.append(1))
+    event.listen(many.engine, "checkin", lambda *args: checked_out.pop())
+
+    streamed = many.iter_ledger_info(chunk_size=2)
+    first = next(streamed)
+    assert checked_out == [1]
+    streamed.close()
+
+    assert first.amount == 0.0
+    assert checked_out == []
+
+
+def test_iter_rows_yields_chunks_of_plain_rows(many):
+    chunks = list(
+        many.iter_rows(
+            model_class=Ledger,
+            columns=["id", Ledger.amount * 2],
+            where_clauses=[Ledger.amount >= 5],
+            chunk_size=8,
+        )
+    )
+
+    assert [len(chunk) for chunk in chunks] == [8, 8, 4]
+    rows = [tuple(row) for chunk in chunks for row in chunk]
+    assert rows == [(amount + 1, amount * 2.0) for amount in range(5, 25)]
+
+
+def pages_of(database, **arguments):
+    """Every page, following `next_key` from the first one."""
+    pages = [database.read_ledger_page(**arguments)]
+    while pages[-1]["next_key"] != None:
+        pages.append(
+            database.read_ledger_page(after_key=pages[-1]["next_key"], **arguments)
+        )
+    return pages
+
+
+def amounts_of(page):
+    return [ledger.amount for ledger in page["records"]]
+
+
+def test_pages_walk_forward_and_back(many):
+    pages = pages_of(many, limit=10)
+
+    assert [amounts_of(page) for page in pages] == [
+        [float(amount) for amount in range(start, min(start + 10, 25))]
+        for start in (0, 10, 20)
+    ]
+    assert pages[0]["prev_key"] == None
+    back = many.read_ledger_page(before_key=pages[2]["prev_key"], limit=10)
+    assert amounts_of(back) == amounts_of(pages[1])
+    assert back["next_key"] == pages[1]["next_key"]
+    assert back["prev_key"] == pages[1]["prev_key"]
+
+
+def test_date_ordered_pages_break_ties_by_id(ledger_db):
+    days = [datetime.date(2023, 5, day) for day in (3, 1, 2, 1, 3, 1)]
+    ledger_db.bulk_add_ledger_infos(
+        rows=[
+            entry(transaction_noted_on=day, amount=float(position))
+            for position, day in enumerate(days)
+        ]
+    )
+
+    pages = pages_of(ledger_db, order_by="transaction_noted_on", limit=4)
+
+    assert [amounts_of(page) for page in pages] == [[1.0, 3.0, 5.0, 2.0], [0.0, 4.0]]
+    assert pages[0]["next_key"] == (datetime.date(2023, 5, 2), 3)
+
+
+def test_filtered_pages_and_totals(many):
+    first = many.read_ledger_page(
+        where_and_to={"tag": "rent"}, limit=4, with_total=True
+    )
+    unfiltered = many.read_ledger_page(limit=4, with_total=True)
+
+    assert amounts_of(first) == [0.0, 3.0, 6.0, 9.0]
+    assert first["total_estimate"] == 9
+    assert unfiltered["total_estimate"] == 25
+    assert many.read_ledger_page(limit=4)["total_estimate"] == None
+
+
+def test_key_at_jumps_to_a_page(many):
+    key = many.key_at(model_class=Ledger, position=14)
+
+    assert key == (15,)
+    assert amounts_of(many.read_ledger_page(after_key=key, limit=3)) == [
+        15.0,
+        16.0,
+        17.0,
+    ]
+    assert many.key_at(model_class=Ledger, position=25) == None
@@ -0,0 +1,95 @@
+import os
+
+import pytest
+
+from simple_ledger._engine import EngineRegistry, engines
+from simple_ledger.db import LedgerDB
+
+
+def url_of(path):
+    return f"sqlite:///{path}"
+
+
+def test_ledger_dbs_of_one_database_share_an_engine(ledger_db):
+    other = LedgerDB()
+
+    assert other.engine is ledger_db.engine
+    assert engines.get_engine(ledger_db.engine_url) is ledger_db.engine
+
+
+def test_engines_are_kept_apart_by_database_and_settings(tmp_path):
+    registry = EngineRegistry()
+    first = registry.get_engine(url_of(tmp_path / "first.db"))
+
+    assert registry.get_engine(url_of(tmp_path / "first.db")) is first
+    assert registry.get_engine(url_of(tmp_path / "second.db")) is not first
+    assert (
+        registry.get_engine(url_of(tmp_path / "first.db"), profile="balanced")
+        is not first
+    )
+    registry.dispose()
+
+
+def test_the_schema_is_created_once_per_database(tmp_path):
+    registry = EngineRegistry()
+    created = []
+
+    def create():
+        created.append(1)
+        return len(created) > 1  # the first attempt fails and is retried
+
+    for _ in range(4):
+        registry.ensure_schema(url_of(tmp_path / "ledger.db"), create)
+
+    assert len(created) == 2
+    registry.dispose(url_of(tmp_path / "ledger.db"))
+    registry.ensure_schema(url_of(tmp_path / "ledger.db"), create)
+    assert len(created) == 3
+
+
+def test_dispose_forgets_only_the_engines_of_its_database(tmp_path):
+    registry = EngineRegistry()
+    first = registry.get_engine(url_of(tmp_path / "first.db"))
+    second = registry.get_engine(url_of(tmp_path / "second.db"))
+
+    registry.dispose(url_of(tmp_path / "first.db"))
+
+    assert registry.get_engine(url_of(tmp_path / "first.db")) is not first
+    assert registry.get_engine(url_of(tmp_path / "second.db")) is second
+    registry.dispose()
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs os.fork")
+def test_a_forked_child_gets_pools_of_its_own(tmp_path):
+    url = url_of(tmp_path / "ledger.db")
+    engine = engines.get_engine(url, profile="balanced")
+    with engine.connect() as connection:
+        connection.exec_driver_sql("CREATE TABLE t (x INTEGER)")
+        connection.exec_driver_sql("INSERT INTO t VALUES (1)")
+        connection.commit()
+    parent_pool = engine.pool
+    read_end, write_end = os.pipe()
+    try:
+        pid = os.fork()
+        if pid == 0:  # the child: reports its pool and a query through the pipe
+            try:
+                fresh = (engine.pool is not parent_pool) and (
+                    engine.pool.checkedin() == 0
+                )
+                with engine.connect() as connection:
+                    value = connection.exec_driver_sql("SELECT x FROM t").scalar()
+                os.write(write_end, f"{fresh} {value}".encode())
+            finally:
+                os._exit(0)
+        os.waitpid(pid, 0)
+        os.close(write_end)
+        reported = os.read(read_end, 100)
+
+        # the parent's pooled connection was left alone by the child
+        assert parent_pool.checkedin() == 1
+        with engine.connect() as connection:
+            assert connection.exec_driver_sql("SELECT x FROM t").scalar() == 1
+    finally:
+        engines.dispose(url)
+
+    assert reported == b"True 1"
@@ -0,0 +1,199 @@
+import datetime
+
+import pytest
+from sqlmodel import Session, and_, or_, select
+
+from simple_ledger._filters import compile_filter
+from simple_ledger.db import Ledger
+from tests.conftest import entry
+
+PEOPLE = ["Joan", "John", "Jo", "jon", "Ann", "Bo"]
+
+
+@pytest.fixture
+def seeded(ledger_db):
+    ledger_db.bulk_add_ledger_infos(
+        rows=[
+            entry(
+                transaction_noted_on=datetime.date(2023, 1, 1)
+                + datetime.timedelta(days=position % 40),
+                from_person=PEOPLE[position % len(PEOPLE)],
+                to_person=PEOPLE[(position * 7) % len(PEOPLE)],
+                description=f"entry {position}",
+                amount=float(position * 13 % 500),
+                tag=["DEBIT", "CREDIT", "FOOD"][position % 3],
+            )
+            for position in range(200)
+        ]
+    )
+    return ledger_db
+
+
+def ids_of(database, where_and_to):
+    return sorted(
+        ledger.id
+        for ledger in database.read_ledger_info(
+            where_and_to=where_and_to, how_many=None
+        )
+    )
+
+
+def ids_where(database, *clauses):
+    """The reference: the same query written by hand."""
+    with Session(database.engine) as session:
+        return sorted(session.exec(select(Ledger.id).where(*clauses)).all())
+
+
+@pytest.mark.parametrize(
+    "where_and_to, clauses",
+    [
+        ({"tag": "DEBIT"}, [Ledger.tag == "DEBIT"]),
+        (
+            {"amount__gte": 100, "amount__lt": 300, "tag__ne": "FOOD"},
+            [Ledger.amount >= 100, Ledger.amount < 300, Ledger.tag != "FOOD"],
+        ),
+        (
+            {
+                "transaction_noted_on__between": (
+                    datetime.date(2023, 1, 5),
+                    datetime.date(2023, 1, 9),
+                )
+            },
+            [
+                Ledger.transaction_noted_on >= datetime.date(2023, 1, 5),
+                Ledger.transaction_noted_on <= datetime.date(2023, 1, 9),
+            ],
+        ),
+        (
+            {"$or": [{"tag": "DEBIT", "amount__gt": 400}, {"from_person": "Bo"}]},
+            [
+                or_(
+                    and_(Ledger.tag == "DEBIT", Ledger.amount > 400),
+                    Ledger.from_person == "Bo",
+                )
+            ],
+        ),
+        (
+            {
+                "to_person": "Ann",
+                "$or": [
+                    {"tag": "FOOD"},
+                    {"$or": [{"amount__lte": 50}, {"amount__gte": 450}]},
+                ],
+            },
+            [
+                Ledger.to_person == "Ann",
+                or_(
+                    Ledger.tag == "FOOD",
+                    or_(Ledger.amount <= 50, Ledger.amount >= 450),
+                ),
+            ],
+        ),
+        ({"id": [3, 5, 8, 13]}, [Ledger.id.in_([3, 5, 8, 13])]),
+        ({"from_person__in": ("Jo", "Ann")}, [Ledger.from_person.in_(["Jo", "Ann"])]),
+        (
+            {"from_person__not_in": ["Jo", "Ann"]},
+            [Ledger.from_person.not_in(["Jo", "Ann"])],
+        ),
+        ({"description__ne": None}, [Ledger.description.is_not(None)]),
+    ],
+)
+def test_filters_match_the_hand_written_queries(seeded, where_and_to, clauses):
+    expected = ids_where(seeded, *clauses)
+
+    assert len(expected) > 0
+    assert ids_of(seeded, where_and_to) == expected
+
+
+def test_startswith_is_a_case_sensitive_prefix(seeded):
+    expected = [
+        ledger.id
+        for ledger in seeded.read_ledger_info(how_many=None)
+        if ledger.from_person.startswith("Jo")
+    ]
+
+    assert ids_of(seeded, {"from_person__startswith": "Jo"}) == sorted(expected)
+    assert ids_of(seeded, {"from_person__startswith": ""}) == ids_of(seeded, {})
+
+
+def test_startswith_compiles_to_a_range():
+    [clause] = compile_filter(Ledger, {"from_person__startswith": "Jo"})
+    sql = str(clause.compile(compile_kwargs={"literal_binds": True}))
+
+    assert "LIKE" not in sql.upper()
+    assert "ledger.from_person >= 'Jo'" in sql
+    assert "ledger.from_person < 'Jp'" in sql
+
+
+def test_startswith_uses_the_index(seeded):
+    [clause] = compile_filter(Ledger, {"tag__startswith": "DE"})
+    statement = select(Ledger.id).where(clause)
+    sql = str(statement.compile(compile_kwargs={"literal_binds": True}))
+
+    with seeded.engine.connect() as connection:
+        plan = str(connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}").all())
+
+    assert "ix_ledger_tag" in plan
+
+
+@pytest.mark.parametrize(
+    "where_and_to",
+    [
+        {"amount__between": 5},
+        {"id__in": 3},
+        {"from_person__startswith": 3},
+        {"amount__gt": [1, 2]},
+        {"$or": []},
+        {"nickname": "Jo"},
+    ],
+)
+def test_malformed_filters_are_refused(where_and_to):
+    with pytest.raises(ValueError):
+        compile_filter(Ledger, where_and_to)
+
+
+def cache_counts(database):
+    info = database.statement_cache_info()
+    return info["hits"], info["misses"]
+
+
+@pytest.mark.parametrize(
+    "first, second, clauses",
+    [
+        ({"tag": "DEBIT"}, {"tag": "CREDIT"}, [Ledger.tag == "CREDIT"]),
+        (
+            {"amount__gte": 10, "from_person__startswith": "Jo"},
+            {"amount__gte": 250, "from_person__startswith": "A"},
+            [Ledger.amount >= 250, Ledger.from_person.in_(["Ann"])],
+        ),
+        # an expanding IN parameter: lists of any length share the statement
+        ({"id": [1, 2]}, {"id": [4, 9, 16, 25]}, [Ledger.id.in_([4, 9, 16, 25])]),
+        (
+            {"$or": [{"tag": "FOOD"}, {"amount__lt": 5}]},
+            {"$or": [{"tag": "DEBIT"}, {"amount__lt": 100}]},
+            [or_(Ledger.tag == "DEBIT", Ledger.amount < 100)],
+        ),
+    ],
+)
+def test_the_same_shape_reuses_the_cached_statement(seeded, first, second, clauses):
+    ids_of(seeded, first)
+    hits, misses = cache_counts(seeded)
+
+    found = ids_of(seeded, second)
+
+    assert cache_counts(seeded) == (hits + 1, misses)
+    assert found == ids_where(seeded, *clauses)
+    assert found != ids_of(seeded, first)
+
+
+def test_another_shape_is_cached_apart(seeded):
+    ids_of(seeded, {"tag": "DEBIT"})
+    hits, misses = cache_counts(seeded)
+
+    assert ids_of(seeded, {"tag__ne": "DEBIT"}) == ids_where(
+        seeded, Ledger.tag != "DEBIT"
+    )
+    assert ids_of(seeded, {"tag": ["DEBIT"]}) == ids_where(
+        seeded, Ledger.tag == "DEBIT"
+    )
+    assert cache_counts(seeded) == (hits, misses + 2)
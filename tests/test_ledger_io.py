@@ -0,0 +1,190 @@
+import csv
+import datetime
+import json
+
+import pytest
+
+from simple_ledger.db import Ledger, LedgerImport
+from simple_ledger.ledger_io import (
+    LEDGER_EXPORT_FIELDS,
+    export_ledger,
+    import_ledger_file,
+)
+from tests.conftest import entry
+
+HEADER = "transaction_noted_on,from_person,to_person,description,amount,tag\n"
+
+
+def write_csv(path, amounts):
+    """One entry per amount; an amount of "bad" makes an entry that is rejected."""
+    path.write_text(
+        HEADER
+        + "".join(
+            f"2023-05-{day % 28 + 1:02d},ana,bob,entry {day},{amount},DEBIT\n"
+            for day, amount in enumerate(amounts)
+        )
+    )
+    return path
+
+
+def imported_amounts(database):
+    return sorted(
+        ledger.amount
+        for ledger in database.read_ledger_info(
+            where_and_to={"description__startswith": "entry"}, how_many=None
+        )
+    )
+
+
+def progress_rows(database):
+    return database.read_ledger_info(LedgerImport, how_many=None)
+
+
+def fail_on_call(database, monkeypatch, failing_call):
+    """Makes the `failing_call`-th batch of an import fail to commit."""
+    bulk_add = database.bulk_add_ledger_infos
+    calls = []
+
+    def flaky(**arguments):
+        calls.append(arguments)
+        if len(calls) == failing_call:
+            return None
+        return bulk_add(**arguments)
+
+    monkeypatch.setattr(database, "bulk_add_ledger_infos", flaky)
+
+
+def test_import_removes_its_progress_when_done(ledger_db, tmp_path):
+    path = write_csv(tmp_path / "bank.csv", range(1, 8))
+
+    stats = import_ledger_file(ledger_db, path, batch_size=3)
+
+    assert stats["imported"] == 7
+    assert imported_amounts(ledger_db) == list(range(1, 8))
+    assert progress_rows(ledger_db) == []
+
+
+def test_resume_after_a_failed_batch_with_concurrent_writes(
+    ledger_db, tmp_path, monkeypatch
+):
+    path = write_csv(tmp_path / "bank.csv", [1, 2, 3, 4, "bad", 6, 7])
+    fail_on_call(ledger_db, monkeypatch, 2)
+
+    with pytest.raises(RuntimeError):
+        import_ledger_file(ledger_db, path, batch_size=3)
+    [progress] = progress_rows(ledger_db)
+    assert (progress.read, progress.imported, progress.rejected) == (3, 3, 0)
+
+    # another writer adds entries between the runs, which must not fool the resume
+    ledger_db.add_ledger_info(
+        ledger=Ledger(
+            **entry(
+                transaction_noted_on=datetime.date(2023, 6, 1),
+                from_person="cy",
+                to_person="dee",
+                description="concurrent",
+                amount=100.0,
+                tag="DEBIT",
+            )
+        )
+    )
+    monkeypatch.undo()
+    stats = import_ledger_file(ledger_db, path, batch_size=3)
+
+    assert (stats["skipped"], stats["imported"], stats["rejected"]) == (3, 6, 1)
+    assert imported_amounts(ledger_db) == [1, 2, 3, 4, 6, 7]
+    assert ledger_db.count_ledger_info() == 7
+    # the reject written by the failed batch is not repeated
+    assert stats["reject_file"].read_text().count("entry 4,bad") == 1
+    assert progress_rows(ledger_db) == []
+
+
+def test_a_changed_file_is_imported_from_the_start(ledger_db, tmp_path, monkeypatch):
+    path = write_csv(tmp_path / "bank.csv", range(1, 8))
+    fail_on_call(ledger_db, monkeypatch, 2)
+    with pytest.raises(RuntimeError):
+        import_ledger_file(ledger_db, path, batch_size=3)
+    monkeypatch.undo()
+
+    write_csv(path, range(10, 14))
+    stats = import_ledger_file(ledger_db, path, batch_size=3)
+
+    assert (stats["skipped"], stats["imported"]) == (0, 4)
+    assert imported_amounts(ledger_db) == [1, 2, 3, 10, 11, 12, 13]
+
+
+def entries_of(database):
+    return [
+        ledger.dict(exclude={"id"})
+        for ledger in database.read_ledger_info(how_many=None)
+    ]
+
+
+@pytest.fixture
+def exported(ledger_db):
+    ledger_db.bulk_add_ledger_infos(
+        rows=[
+            entry(
+                transaction_noted_on=datetime.date(2023, 5, 1 + day),
+                to_person="cy" if day % 2 else "bob",
+                amount=float(day),
+                tag="CREDIT" if day % 3 == 0 else "DEBIT",
+            )
+            for day in range(10)
+        ]
+    )
+    return ledger_db
+
+
+def test_csv_export_round_trips_through_the_import(exported, tmp_path):
+    path = tmp_path / "ledger.csv"
+    entries = entries_of(exported)
+
+    stats = export_ledger(exported, path, chunk_size=3)
+
+    assert stats["rows"] == 10
+    with open(path, newline="") as exported_file:
+        rows = list(csv.DictReader(exported_file))
+    assert list(rows[0]) == list(LEDGER_EXPORT_FIELDS)
+    assert [row["amount"] for row in rows] == [str(float(day)) for day in range(10)]
+    assert rows[3]["transaction_noted_on"] == "2023-05-04"
+
+    exported.delete_ledger_records(where_and_to={"id__gte": 1}, delete_mode="all")
+    assert import_ledger_file(exported, path)["imported"] == 10
+    assert entries_of(exported) == entries
+
+
+def test_jsonl_export_is_filtered(exported, tmp_path):
+    path = tmp_path / "ledger.jsonl"
+
+    stats = export_ledger(
+        exported,
+        path,
+        from_=datetime.date(2023, 5, 2),
+        to_=datetime.date(2023, 5, 9),
+        person="cy",
+        tag="debit",
+    )
+
+    records = [json.loads(line) for line in path.read_text().splitlines()]
+    assert stats["rows"] == len(records) == 3
+    assert [record["amount"] for record in records] == [1.0, 5.0, 7.0]
+    assert records[0]["transaction_noted_time"] == "12:00:00"
+
+
+def test_parquet_export_writes_a_row_group_per_chunk(exported, tmp_path):
+    parquet = pytest.importorskip("pyarrow.parquet")
+    path = tmp_path / "ledger.parquet"
+
+    stats = export_ledger(exported, path, chunk_size=4)
+
+    table = parquet.read_table(path)
+    assert stats["rows"] == table.num_rows == 10
+    assert parquet.ParquetFile(path).num_row_groups == 3
+    assert table.column_names == list(LEDGER_EXPORT_FIELDS)
+    assert table.column("amount").to_pylist() == [float(day) for day in range(10)]
+
+
+def test_unknown_export_formats_are_refused(exported, tmp_path):
+    with pytest.raises(ValueError):
+        export_ledger(exported, tmp_path / "ledger.csv", file_format="xml")
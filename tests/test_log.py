@@ -0,0 +1,96 @@
+import logging
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+from simple_ledger._log import Logger
+
+
+def lines_of(path, expected, timeout=5.0):
+    """The lines of a log file, once it has `expected` of them (the listener writes them later)."""
+    deadline = time.monotonic() + timeout
+    while True:
+        lines = path.read_text().splitlines() if path.exists() else []
+        if (len(lines) >= expected) or (time.monotonic() > deadline):
+            return lines
+        time.sleep(0.01)
+
+
+def logger_of(name, log_dir, **options):
+    return Logger(
+        name=name, log_dir=log_dir, log_file="test.log", level=logging.INFO, **options
+    )
+
+
+def test_loggers_of_one_name_share_their_handlers(tmp_path):
+    first = logger_of("registry.same", tmp_path, asynchronous=False)
+    second = logger_of("registry.same", tmp_path, asynchronous=False)
+
+    second.info("once")
+
+    assert second.file_handler is first.file_handler
+    assert first.logger.handlers == [first.console_handler, first.file_handler]
+    assert lines_of(tmp_path / "test.log", 1)[0].endswith(" : once")
+
+
+def test_a_child_writes_through_the_handlers_of_its_parent(tmp_path):
+    child = logger_of("registry.tree.child", tmp_path, custom_name_to_message="Child")
+    parent = logger_of("registry.tree", tmp_path, custom_name_to_message="Parent")
+
+    child.info("from the child")
+    parent.info("from the parent")
+
+    assert child.logger.handlers == []
+    lines = lines_of(tmp_path / "test.log", 2)
+    assert len(lines) == 2
+    assert lines[0].endswith(" : Child >> from the child")
+    assert lines[1].endswith(" : Parent >> from the parent")
+
+
+def test_records_are_written_by_the_listener_in_order(tmp_path):
+    logger = logger_of("listener.order", tmp_path, asynchronous=True)
+    threads = []
+    logger.file_handler.addFilter(
+        lambda record: threads.append(threading.current_thread()) or True
+    )
+    arguments = ["before"]
+
+    for number in range(100):
+        logger.info("%s %s", number, arguments)
+    arguments[0] = "after"
+
+    lines = lines_of(tmp_path / "test.log", 100)
+    assert [line.rsplit(" : ", 1)[1] for line in lines] == [
+        f"{number} ['before']" for number in range(100)
+    ]
+    assert threading.current_thread() not in threads
+
+
+def test_queued_records_are_written_at_exit(tmp_path):
+    script = f"""
+import atexit, logging
+from simple_ledger._log import Logger
+
+# runs after the listener is stopped (exit handlers run last in, first out)
+atexit.register(lambda: logger.info("after the listener"))
+logger = Logger(
+    name="exit", log_dir={str(tmp_path)!r}, log_file="test.log", level=logging.INFO,
+    asynchronous=True,
+)
+for number in range(2000):
+    logger.info("record %s", number)
+"""
+    subprocess.run(
+        [sys.executable, "-c", script],
+        cwd=Path(__file__).resolve().parent.parent,
+        capture_output=True,
+        check=True,
+    )
+
+    lines = (tmp_path / "test.log").read_text().splitlines()
+    assert [line.rsplit(" : ", 1)[1] for line in lines] == [
+        *(f"record {number}" for number in range(2000)),
+        "after the listener",
+    ]
@@ -0,0 +1,98 @@
+import logging
+import os
+import shutil
+import time
+
+from simple_ledger._log_rotation import (
+    CompressingRotatingFileHandler,
+    _submit,
+    enforce_log_retention,
+)
+
+DAY: int = 24 * 60 * 60
+
+
+def age(path, seconds):
+    """Sets the modification time of a file or directory `seconds` into the past."""
+    then = time.time() - seconds
+    os.utime(path, (then, then))
+
+
+def wait_for_maintenance():
+    _submit(lambda: None).result()
+
+
+def test_retention_keeps_recent_empty_directories(tmp_path):
+    old = tmp_path / "2020" / "HOUR::1"
+    fresh = tmp_path / "2023" / "HOUR::2"
+    old.mkdir(parents=True)
+    fresh.mkdir(parents=True)
+    age(old, 2 * DAY)
+    age(old.parent, 2 * DAY)
+
+    enforce_log_retention(
+        tmp_path, max_bytes=10**9, max_age_days=1, grace_seconds=3600
+    )
+
+    assert not old.exists()
+    assert fresh.is_dir()
+
+
+def test_retention_deletes_old_files_but_not_recent_ones(tmp_path):
+    old = tmp_path / "old.log"
+    recent = tmp_path / "recent.log"
+    old.write_bytes(b"x" * 1000)
+    recent.write_bytes(b"x" * 1000)
+    age(old, 2 * 3600)
+
+    # over budget and past the maximum age, yet the recent file may be another process's
+    stats = enforce_log_retention(
+        tmp_path, max_bytes=10, max_age_days=0, grace_seconds=3600
+    )
+
+    assert not old.exists()
+    assert recent.exists()
+    assert stats["deleted"] == 1
+    assert stats["kept"] == 1000
+
+
+def test_retention_keeps_the_files_being_written(tmp_path):
+    path = tmp_path / "HOUR::1" / "app.log"
+    path.parent.mkdir()
+    handler = CompressingRotatingFileHandler(path, maxBytes=0, backupCount=1)
+    try:
+        age(path.parent, 2 * DAY)
+        enforce_log_retention(tmp_path, max_bytes=0, max_age_days=0, grace_seconds=0)
+        assert path.parent.is_dir()
+    finally:
+        handler.close()
+
+
+def test_handler_recreates_a_removed_directory(tmp_path):
+    path = tmp_path / "HOUR::1" / "app.log"
+    path.parent.mkdir()
+    handler = CompressingRotatingFileHandler(path, maxBytes=0, backupCount=1)
+    try:
+        shutil.rmtree(path.parent)
+        handler.emit(logging.makeLogRecord({"msg": "still logged"}))
+        handler.flush()
+        assert "still logged" in path.read_text()
+    finally:
+        handler.close()
+
+
+def test_rotation_compresses_and_keeps_backup_count_segments(tmp_path):
+    path = tmp_path / "app.log"
+    handler = CompressingRotatingFileHandler(
+        path, maxBytes=200, backupCount=2, compression="gzip"
+    )
+    try:
+        for number in range(100):
+            handler.emit(logging.makeLogRecord({"msg": f"record {number:04d}" * 4}))
+        wait_for_maintenance()
+    finally:
+        handler.close()
+
+    segments = sorted(tmp_path.glob("app.log.*"))
+    assert len(segments) == 2
+    assert all(segment.suffix == ".gz" for segment in segments)
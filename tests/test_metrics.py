@@ -0,0 +1,94 @@
+import atexit
+import os
+import time
+
+import pytest
+
+from simple_ledger._config import AppConfig as config
+from simple_ledger._metrics import (
+    DBMetrics,
+    load_snapshot,
+    metrics,
+    snapshot_file_of,
+    snapshot_files,
+)
+
+
+@pytest.fixture
+def snapshots(tmp_path, monkeypatch):
+    """Points the configured snapshot file into `tmp_path`, without a dump thread."""
+    monkeypatch.setitem(
+        config.APP_DB_METRICS, "snapshot_file", tmp_path / "metrics.json"
+    )
+    monkeypatch.setitem(config.APP_DB_METRICS, "dump_interval", None)
+    return tmp_path
+
+
+def recorded():
+    recorder = DBMetrics()
+    recorder.record("operations", "read", 0.001, rows=3)
+    return recorder
+
+
+def test_each_process_dumps_to_a_file_of_its_own(snapshots):
+    path = recorded().dump()
+
+    assert path == snapshots / f"metrics.{os.getpid()}.json"
+    assert load_snapshot()["pid"] == os.getpid()
+
+
+def test_the_most_recent_snapshot_is_loaded_unless_a_pid_is_given(snapshots):
+    other = snapshot_file_of(1)
+    other.write_text('{"pid": 1}')
+    old = time.time() - 60
+    os.utime(other, (old, old))
+
+    recorded().dump()
+
+    assert load_snapshot()["pid"] == os.getpid()
+    assert load_snapshot(pid=1) == {"pid": 1}
+    assert snapshot_files() == [snapshot_file_of(), other]
+
+
+def test_only_the_most_recent_snapshots_are_kept(snapshots, monkeypatch):
+    monkeypatch.setitem(config.APP_DB_METRICS, "keep_snapshots", 2)
+    for age, pid in enumerate((1, 2, 3)):
+        snapshot_file_of(pid).write_text("{}")
+        then = time.time() - 60 * (age + 1)
+        os.utime(snapshot_file_of(pid), (then, then))
+
+    recorded().dump()
+
+    assert snapshot_files() == [snapshot_file_of(), snapshot_file_of(1)]
+
+
+def test_no_snapshot_without_a_snapshot_file(monkeypatch):
+    monkeypatch.setitem(config.APP_DB_METRICS, "snapshot_file", None)
+
+    assert snapshot_files() == []
+    assert load_snapshot() == None
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs os.fork")
+def test_a_forked_child_dumps_once_at_exit(snapshots):
+    metrics.start_dumping()
+    read_end, write_end = os.pipe()
+    try:
+        pid = os.fork()
+        if pid == 0:  # the child: counts its exit dumps through the pipe
+            try:
+                metrics.dump = lambda *args, **kwargs: os.write(write_end, b"+")
+                metrics.start_dumping()
+                metrics.start_dumping()
+                metrics.record("operations", "read", 0.001)
+                atexit._run_exitfuncs()
+            finally:
+                os._exit(0)
+        os.waitpid(pid, 0)
+        os.close(write_end)
+        dumps = os.read(read_end, 100)
+    finally:
+        atexit.unregister(metrics._dump_at_exit)
+        metrics._dumping = False
+
+    assert dumps == b"+"
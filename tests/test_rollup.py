@@ -0,0 +1,123 @@
+import datetime
+
+import pytest
+from sqlmodel import Session, func, select
+
+from simple_ledger.db import ROLLUP_KEYS, Ledger, LedgerRollup
+from tests.conftest import entry
+
+DAY = entry()["transaction_noted_on"]
+
+
+def fresh_aggregate(database):
+    """The rollup computed from scratch out of the raw `Ledger` rows."""
+    keys = [getattr(Ledger, key) for key in ROLLUP_KEYS]
+    with Session(database.engine) as session:
+        rows = session.exec(
+            select(*keys, func.count(), func.sum(Ledger.amount)).group_by(*keys)
+        ).all()
+    return {tuple(key): (count, amount) for *key, count, amount in rows}
+
+
+def stored_rollup(database):
+    with Session(database.engine) as session:
+        rows = session.exec(select(LedgerRollup)).all()
+    return {
+        tuple(getattr(row, key) for key in ROLLUP_KEYS): (row.transactions, row.amount)
+        for row in rows
+    }
+
+
+def assert_rollup_is_fresh(database):
+    assert stored_rollup(database) == pytest.approx(fresh_aggregate(database))
+    assert database.check_rollup() == []
+
+
+@pytest.fixture
+def seeded(ledger_db):
+    ledger_db.bulk_add_ledger_infos(
+        rows=[
+            entry(),
+            entry(amount=5.5),
+            entry(to_person="cy", amount=3.0),
+            entry(tag="rent", amount=700.0),
+            entry(transaction_noted_on=DAY + datetime.timedelta(days=1), amount=2.0),
+        ]
+    )
+    return ledger_db
+
+
+def test_single_insert(ledger_db):
+    assert ledger_db.add_ledger_info(ledger=Ledger(**entry()))
+    assert ledger_db.add_ledger_info(ledger=Ledger(**entry(amount=1.25)))
+
+    assert stored_rollup(ledger_db) == {(DAY, "ana", "bob", "food"): (2, 11.25)}
+    assert_rollup_is_fresh(ledger_db)
+
+
+def test_bulk_insert(seeded):
+    assert len(stored_rollup(seeded)) == 4
+    assert_rollup_is_fresh(seeded)
+
+
+def test_update_of_the_amount(seeded):
+    assert (
+        seeded.update_ledger_info(
+            where_and_to={"tag": "rent"}, with_what={"amount": 650.0}
+        )
+        == 1
+    )
+
+    assert stored_rollup(seeded)[(DAY, "ana", "bob", "rent")] == (1, 650.0)
+    assert_rollup_is_fresh(seeded)
+
+
+def test_update_of_a_key_column_moves_the_rows(seeded):
+    updated = seeded.update_ledger_info(
+        where_and_to={"tag": "food", "to_person": "bob"}, with_what={"tag": "treats"}
+    )
+
+    assert updated == 3
+    rollup = stored_rollup(seeded)
+    assert (DAY, "ana", "bob", "food") not in rollup
+    assert rollup[(DAY, "ana", "bob", "treats")] == (2, 15.5)
+    assert_rollup_is_fresh(seeded)
+
+
+def test_delete_one(seeded):
+    assert (
+        seeded.delete_ledger_records(where_and_to={"tag": "food"}, delete_mode="one")
+        == 1
+    )
+
+    assert_rollup_is_fresh(seeded)
+
+
+def test_delete_all_drops_the_emptied_keys(seeded):
+    assert (
+        seeded.delete_ledger_records(where_and_to={"tag": "food"}, delete_mode="all")
+        == 4
+    )
+
+    assert list(stored_rollup(seeded)) == [(DAY, "ana", "bob", "rent")]
+    assert_rollup_is_fresh(seeded)
+
+
+def test_rebuild_repairs_a_stale_rollup(seeded):
+    with Session(seeded.engine) as session:
+        session.add(
+            LedgerRollup(
+                transaction_noted_on=DAY,
+                from_person="ghost",
+                to_person="bob",
+                tag="food",
+                transactions=3,
+                amount=1.0,
+            )
+        )
+        session.commit()
+    assert len(seeded.check_rollup()) == 1
+
+    assert seeded.rebuild_rollup()
+
+    assert_rollup_is_fresh(seeded)
@@ -0,0 +1,103 @@
+import datetime
+
+import pytest
+from sqlalchemy import event
+
+from tests.conftest import entry
+
+
+# a sunday, the monday after it, a thursday and a new year falling mid-week
+DAYS = [
+    datetime.date(2023, 5, 7),
+    datetime.date(2023, 5, 8),
+    datetime.date(2023, 5, 11),
+    datetime.date(2020, 12, 31),
+    datetime.date(2021, 1, 3),
+]
+
+
+def test_weeks_are_labelled_by_their_monday(ledger_db):
+    ledger_db.bulk_add_ledger_infos(
+        rows=[entry(transaction_noted_on=day) for day in DAYS]
+    )
+
+    buckets = ledger_db.summary(bucket="week")["buckets"]
+
+    assert sorted(buckets) == ["2020-12-28", "2023-05-01", "2023-05-08"]
+
+
+def test_credit_and_debit_are_counted_and_summed_apart(ledger_db):
+    ledger_db.bulk_add_ledger_infos(
+        rows=[
+            entry(amount=2.0, tag="DEBIT"),
+            entry(amount=3.0, tag="DEBIT"),
+            entry(amount=10.0, tag="CREDIT"),
+        ]
+    )
+
+    summary = ledger_db.summary()
+
+    assert (summary["total_credit"], summary["total_debit"]) == (1, 2)
+    assert (summary["credit_amount"], summary["debit_amount"]) == (10.0, 5.0)
+
+
+def test_summary_and_frame_share_the_week_labels(ledger_db):
+    frame = pytest.importorskip("simple_ledger.frame")
+    ledger_db.bulk_add_ledger_infos(
+        rows=[entry(transaction_noted_on=day) for day in DAYS]
+    )
+
+    counts = frame.LedgerFrame.from_db(ledger_db).count_by("week")
+    buckets = ledger_db.summary(bucket="week")["buckets"]
+
+    assert set(counts) == set(buckets)
+
+
+def plan_of(database, call):
+    """The query plans of the SELECT statements `call` runs on the database."""
+    statements = []
+
+    def collect(connection, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append((statement, parameters))
+
+    event.listen(database.engine, "before_cursor_execute", collect)
+    try:
+        call()
+    finally:
+        event.remove(database.engine, "before_cursor_execute", collect)
+    with database.engine.connect() as connection:
+        return [
+            str(
+                connection.exec_driver_sql(
+                    f"EXPLAIN QUERY PLAN {statement}", parameters
+                ).all()
+            )
+            for statement, parameters in statements
+        ]
+
+
+def test_date_ordered_pages_are_read_in_index_order(ledger_db):
+    ledger_db.bulk_add_ledger_infos(
+        rows=[entry(transaction_noted_on=day) for day in DAYS]
+    )
+    first = ledger_db.read_ledger_page(order_by="transaction_noted_on", limit=2)
+
+    [plan] = plan_of(
+        ledger_db,
+        lambda: ledger_db.read_ledger_page(
+            order_by="transaction_noted_on", after_key=first["next_key"], limit=2
+        ),
+    )
+
+    assert "ix_ledger_noted_on_id" in plan
+    assert "TEMP B-TREE" not in plan
+
+
+def test_date_ranges_use_the_date_index(ledger_db):
+    with ledger_db.engine.connect() as connection:
+        plan = connection.exec_driver_sql(
+            "EXPLAIN QUERY PLAN SELECT * FROM ledger WHERE transaction_noted_on >= '2023-05-01'"
+        ).all()
+
+    assert "ix_ledger_noted_on_id" in str(plan)
@@ -0,0 +1,139 @@
+import queue
+import subprocess
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+from simple_ledger._writer import WriteBehindQueue
+from simple_ledger.db import Ledger, LedgerDB
+from tests.conftest import entry
+
+
+class Writes:
+    """Records the batches written; batches holding "bad" fail, `hold` pauses the next write."""
+
+    def __init__(self):
+        self.batches = []
+        self.hold = None
+        self.writing = threading.Event()
+
+    def __call__(self, records):
+        self.writing.set()
+        if self.hold != None:
+            self.hold.wait()
+        self.batches.append(list(records))
+        return "bad" not in records
+
+
+@pytest.fixture
+def writes():
+    return Writes()
+
+
+def test_records_are_committed_in_batches_of_batch_size(writes):
+    writer = WriteBehindQueue(writes, batch_size=3, flush_interval=60)
+    futures = [writer.submit(record) for record in range(7)]
+
+    writer.flush()
+
+    assert writes.batches == [[0, 1, 2], [3, 4, 5], [6]]
+    assert [future.result() for future in futures] == [True] * 7
+    writer.close()
+
+
+def test_a_lone_record_is_committed_after_the_flush_interval(writes):
+    writer = WriteBehindQueue(writes, batch_size=100, flush_interval=0.01)
+
+    assert writer.submit("a").result(timeout=5) == True
+    assert writes.batches == [["a"]]
+    writer.close()
+
+
+def test_a_failed_batch_is_retried_record_by_record(writes):
+    writer = WriteBehindQueue(writes, batch_size=3, flush_interval=60)
+    futures = [writer.submit(record) for record in ("a", "bad", "c")]
+
+    assert [future.result(timeout=5) for future in futures] == [True, False, True]
+    assert writes.batches == [["a", "bad", "c"], ["a"], ["bad"], ["c"]]
+    writer.close()
+
+
+def test_an_exception_fails_the_futures_of_the_batch():
+    def write(records):
+        raise OSError("disk full")
+
+    writer = WriteBehindQueue(write, batch_size=2, flush_interval=60)
+    futures = [writer.submit(record) for record in ("a", "b")]
+
+    for future in futures:
+        with pytest.raises(OSError):
+            future.result(timeout=5)
+    writer.close()
+
+
+def test_submit_blocks_while_max_pending_records_wait(writes):
+    writes.hold = threading.Event()
+    writer = WriteBehindQueue(writes, batch_size=1, flush_interval=0, max_pending=1)
+    writer.submit("a")
+    writes.writing.wait()  # the writer took "a" and waits in `write`
+    writer.submit("b")
+
+    with pytest.raises(queue.Full):
+        writer.submit("c", timeout=0.05)
+    writes.hold.set()
+    writer.close()
+    assert writes.batches == [["a"], ["b"]]
+
+
+def test_close_commits_the_queued_records(writes):
+    writer = WriteBehindQueue(writes, batch_size=100, flush_interval=60)
+    futures = [writer.submit(record) for record in ("a", "b")]
+
+    writer.close()
+    writer.close()
+    writer.flush()
+
+    assert writes.batches == [["a", "b"]]
+    assert all(future.done() for future in futures)
+    with pytest.raises(RuntimeError):
+        writer.submit("c")
+
+
+def test_queued_records_are_committed_at_exit(tmp_path):
+    committed = tmp_path / "committed.txt"
+    script = f"""
+from simple_ledger._writer import WriteBehindQueue
+
+def write(records):
+    with open({str(committed)!r}, "a") as committed_file:
+        committed_file.write("".join(f"{{record}}\\n" for record in records))
+    return True
+
+writer = WriteBehindQueue(write, batch_size=100, flush_interval=60)
+for record in range(5):
+    writer.submit(record)
+"""
+    subprocess.run(
+        [sys.executable, "-c", script],
+        cwd=Path(__file__).resolve().parent.parent,
+        check=True,
+    )
+
+    assert committed.read_text().split() == ["0", "1", "2", "3", "4"]
+
+
+def test_write_behind_ledger_db(ledger_db):
+    database = LedgerDB(write_behind=True)
+    future = database.submit_ledger_info(ledger=Ledger(**entry(amount=1.0)))
+    assert database.add_ledger_info(ledger=Ledger(**entry(amount=2.0)))
+
+    database.flush()
+
+    assert future.result() == True
+    assert sorted(ledger.amount for ledger in ledger_db.read_ledger_info()) == [
+        1.0,
+        2.0,
+    ]
+    database.dispose()